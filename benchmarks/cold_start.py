@@ -0,0 +1,45 @@
+"""Cold start of the Docs client stack up to the first written batch.
+
+Run in a fresh interpreter by test_startup_benchmark.py with the writer
+settings as a JSON argument, so the test helpers are not imported into the
+measured start; prints the seconds from the first import to the end of the
+first batchUpdate.
+"""
+import time
+
+started = time.perf_counter()
+
+import asyncio
+import json
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+from loguru import logger
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.discovery import build_docs_service
+from src.google.transport import DocsTransport
+from src.telegram.models import MessageData
+
+from local_http import LocalHttp
+
+def main() -> None:
+    logger.remove()
+    settings = SimpleNamespace(**json.loads(sys.argv[1]))
+    transport = DocsTransport(None, settings.google_max_workers,
+                              service_factory=lambda: build_docs_service(LocalHttp()))
+    writer = GoogleDocsWriter(settings, transport=transport)
+    messages = [MessageData(id=1, text="Первый пост https://example.com", date=datetime(2024, 1, 1), channel_id=1)]
+    
+    async def first_write() -> bool:
+        await writer._sync_document_state()
+        return await writer.write_batch(messages)
+    
+    assert asyncio.run(first_write())
+    print(time.perf_counter() - started)
+    writer.close()
+    sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Общие фикстуры бенчмарков отрисовки."""
+import tracemalloc
+
+import pytest
+from loguru import logger
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.fake import FakeDocsService
+from src.utils.logger import setup_logging
+from tests.conftest import writer_settings
+
+from mixes import MIXES, make_messages
+
+@pytest.fixture(scope="session", autouse=True)
+def production_logging(tmp_path_factory):
+    """Log like the running archiver: INFO to the console, DEBUG to a file."""
+    setup_logging(tmp_path_factory.mktemp("logs") / "bench.log")
+    yield
+    logger.remove()
+
+@pytest.fixture(scope="session")
+def writer():
+    """Writer backed by the in-memory Docs service; rendering makes no calls."""
+    writer = GoogleDocsWriter(writer_settings(google_doc_id='bench'), service=FakeDocsService())
+    yield writer
+    writer.close()
+
+@pytest.fixture(scope="session", params=MIXES)
+def mix(request):
+    """(name, messages) for every generated message mix."""
+    return request.param, make_messages(request.param)
+
+@pytest.fixture
+def record_throughput(benchmark):
+    """Record messages per second of the finished benchmark.
+    
+    Under --benchmark-disable the callable runs once without timing and
+    benchmark.stats is None, so nothing is recorded.
+    """
+    def record(messages_count):
+        benchmark.extra_info['messages'] = messages_count
+        if benchmark.stats is None:
+            return
+        benchmark.extra_info['messages_per_sec'] = round(messages_count / benchmark.stats.stats.mean)
+    return record
+
+@pytest.fixture
+def measure(benchmark, record_throughput):
+    """Benchmark a callable over a number of messages and record throughput and allocations."""
+    def run(func, messages_count, *args):
+        result = benchmark(func, *args)
+        record_throughput(messages_count)
+        if benchmark.stats is None:
+            return result
+        
+        tracemalloc.start()
+        func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        
+        benchmark.extra_info['peak_kib'] = round(peak / 1024, 1)
+        benchmark.extra_info['allocated_blocks'] = sum(stat.count for stat in snapshot.statistics('filename'))
+        return result
+    return run
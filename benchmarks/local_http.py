@@ -0,0 +1,23 @@
+"""Local HTTP stand-in for the Docs API, for benchmarks of the real client stack."""
+import json
+
+import httplib2
+
+class LocalHttp:
+    """Answers Docs API calls in process, like httplib2.Http would after the network round trip."""
+    
+    def __init__(self, end_index: int = 10):
+        self.end_index = end_index
+        self.revision = 0
+    
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if uri.split('?')[0].endswith(':batchUpdate'):
+            self.revision += 1
+            requests = json.loads(body)['requests']
+            self.end_index += sum(len(request['insertText']['text']) for request in requests if 'insertText' in request)
+            content = {'replies': [{} for _ in requests],
+                       'writeControl': {'requiredRevisionId': f"rev-{self.revision}"}}
+        else:
+            content = {'title': "Archive", 'revisionId': f"rev-{self.revision}",
+                       'body': {'content': [{'endIndex': self.end_index}]}, 'namedRanges': {}}
+        return httplib2.Response({'status': '200'}), json.dumps(content).encode('utf-8')
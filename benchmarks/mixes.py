@@ -0,0 +1,65 @@
+"""Generated message mixes for the rendering benchmarks."""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from src.telegram.models import MessageData
+
+WORDS = "новости рынок обзор релиз подробнее источник обновление канал читать неделя итоги".split()
+DOMAINS = ["t.me/channel", "github.com/org/repo/pull", "example.com/news", "youtu.be/watch", "habr.com/ru/articles"]
+EMOJI = ["🚀", "🔥", "📈", "✅", "❗", "👉", "😀", "🎉", "💡", "📌"]
+MEDIA_TYPES = ["Photo", "Video", "Document", "Audio", "Voice"]
+
+MIXES = ["plain", "link_heavy", "forwarded", "media", "emoji"]
+
+def _prose(rng: random.Random, low: int = 20, high: int = 80) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+def _url(rng: random.Random, number: int) -> str:
+    return f"https://{rng.choice(DOMAINS)}/{number}"
+
+def make_message_data(kind: str, number: int, rng: random.Random) -> Dict:
+    """Build constructor arguments for one message of a mix."""
+    date = datetime(2024, 1, 1) + timedelta(minutes=number)
+    data = {
+        'id': number,
+        'text': _prose(rng),
+        'date': date,
+        'channel_id': -1001234567890,
+        'channel_name': "Тестовый канал",
+        'channel_username': "test_channel",
+        'original_link': f"https://t.me/test_channel/{number}",
+    }
+    
+    if kind == "link_heavy":
+        pieces = [_prose(rng, 3, 10)]
+        for link in range(rng.randint(3, 8)):
+            url = _url(rng, number * 10 + link)
+            pieces.append(f"[{rng.choice(WORDS)}]({url})" if link % 2 else url + rng.choice(["", ".", ",", ")"]))
+            pieces.append(_prose(rng, 2, 6))
+        data['text'] = " ".join(pieces)
+    elif kind == "forwarded":
+        data.update({
+            'forward_from_channel_name': "Исходный канал",
+            'forward_from_channel_username': "source_channel",
+            'forward_original_date': date - timedelta(days=1),
+            'forward_message_id': number + 1000,
+            'forward_original_link': f"https://t.me/source_channel/{number + 1000}",
+        })
+    elif kind == "media":
+        data.update({
+            'has_media': True,
+            'media_type': rng.choice(MEDIA_TYPES),
+            'media_caption': _prose(rng, 5, 15),
+        })
+    elif kind == "emoji":
+        data['text'] = " ".join(
+            rng.choice(EMOJI) if position % 3 == 0 else rng.choice(WORDS)
+            for position in range(rng.randint(20, 80))
+        )
+    return data
+
+def make_messages(kind: str, count: int = 200, seed: int = 42) -> List[MessageData]:
+    """Build a reproducible list of messages of one shape."""
+    rng = random.Random(seed)
+    return [MessageData(**make_message_data(kind, number, rng)) for number in range(1, count + 1)]
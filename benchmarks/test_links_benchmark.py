@@ -0,0 +1,46 @@
+"""Микробенчмарк разбора ссылок на тексте канала с большим числом ссылок.
+
+Запуск: pytest benchmarks/test_links_benchmark.py --benchmark-only --no-cov
+"""
+import random
+import re
+
+import pytest
+
+from src.utils.links import clean_url, extract_links
+
+WORDS = "новости рынок обзор релиз подробнее источник обновление канал читать".split()
+DOMAINS = ["t.me/channel", "github.com/org/repo/pull", "example.com/news", "youtu.be/watch", "habr.com/ru/articles"]
+
+def make_channel_text(posts: int = 200, seed: int = 42) -> str:
+    """Build channel-like text mixing prose, Markdown links and bare URLs."""
+    rng = random.Random(seed)
+    lines = []
+    for number in range(posts):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(10, 40))]
+        url = f"https://{rng.choice(DOMAINS)}/{number}"
+        if number % 3 == 0:
+            words.append(f"[{rng.choice(WORDS)}]({url})")
+        else:
+            words.append(url + rng.choice(["", ".", ",", ")", "!"]))
+        if number % 5 == 0:
+            words.append(f"https://t.me/channel/{number}?single")
+        lines.append(" ".join(words))
+    return "\n".join(lines)
+
+def legacy_extract_links(text: str):
+    """Two-pass extraction used before the shared tokenizer."""
+    links = []
+    for match in re.finditer(r'\[([^\]]+)\]\(([^)]+?)\)', text):
+        links.append((clean_url.__wrapped__(match.group(2)), match.start(), match.end()))
+    for match in re.finditer(r'https?://[^\s<>"{}|\\^`\[\]]+', text):
+        links.append((clean_url.__wrapped__(match.group()), match.start(), match.end()))
+    return links
+
+TEXT = make_channel_text()
+
+@pytest.mark.parametrize("extract", [legacy_extract_links, extract_links], ids=["two_pass", "single_pass"])
+def test_extract_links(benchmark, extract):
+    links = benchmark(extract, TEXT)
+    benchmark.extra_info['links'] = len(links)
+    assert links
@@ -0,0 +1,74 @@
+"""Бенчмарки горячего пути отрисовки сообщений.
+
+Запуск с сохранением результатов и сравнением с последним запуском:
+pytest benchmarks --benchmark-only --no-cov --benchmark-autosave --benchmark-compare
+"""
+from datetime import datetime
+
+from src.google.formatter import format_messages_for_gdocs
+from src.telegram.models import MessageData
+from src.utils.links import clean_url, extract_links
+
+def forget_renders(messages):
+    """Drop renders cached on the messages, so every round renders like for new messages."""
+    for message in messages:
+        message._rendered = None
+
+def test_formatted_message_requests(writer, mix, measure):
+    name, messages = mix
+    
+    def render():
+        forget_renders(messages)
+        return [writer._create_formatted_message_requests(message, 1) for message in messages]
+    
+    assert len(measure(render, len(messages))) == len(messages)
+
+def test_batch_segments(writer, mix, measure):
+    name, messages = mix
+    now = datetime(2024, 1, 1)
+    
+    def render():
+        forget_renders(messages)
+        return writer._chunk_segments(writer._create_batch_segments(messages, now, 1))
+    
+    assert measure(render, len(messages))
+
+def test_extract_links(mix, measure):
+    name, messages = mix
+    texts = [message.text for message in messages]
+    
+    def extract():
+        return [extract_links(text) for text in texts]
+    
+    measure(extract, len(messages))
+
+def test_clean_url(mix, measure):
+    name, messages = mix
+    urls = [url for message in messages for url in message.extract_all_links()] + [message.original_link for message in messages]
+    
+    def clean():
+        # Uncached, as for URLs seen for the first time
+        return [clean_url.__wrapped__(url) for url in urls]
+    
+    measure(clean, len(messages))
+
+def test_message_construction(mix, measure):
+    name, messages = mix
+    dumps = [message.model_dump() for message in messages]
+    
+    def construct():
+        return [MessageData(**data) for data in dumps]
+    
+    measure(construct, len(messages))
+
+def test_message_serialization(mix, measure):
+    name, messages = mix
+    
+    def serialize():
+        return [message.model_dump() for message in messages]
+    
+    measure(serialize, len(messages))
+
+def test_format_messages_for_gdocs(mix, measure):
+    name, messages = mix
+    assert measure(format_messages_for_gdocs, len(messages), messages)
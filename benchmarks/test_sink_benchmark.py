@@ -0,0 +1,44 @@
+"""Бенчмарки пропускной способности приёмников архива.
+
+Запуск:
+pytest benchmarks/test_sink_benchmark.py --benchmark-only --no-cov
+"""
+import asyncio
+
+import pytest
+
+from src.google.discovery import build_docs_service
+from src.google.docs_client import GoogleDocsWriter
+from src.google.transport import DocsTransport
+from src.sinks.local import LocalFileSink
+from tests.conftest import writer_settings
+
+from local_http import LocalHttp
+from mixes import make_messages
+
+BATCH_SIZE = 5
+
+def make_docs_sink():
+    """Docs writer on the real client stack, answered in process and without quota waits."""
+    settings = writer_settings(google_doc_id='bench', google_max_workers=4,
+                               google_read_quota_per_minute=10 ** 6, google_write_quota_per_minute=10 ** 6)
+    transport = DocsTransport(None, settings.google_max_workers,
+                              service_factory=lambda: build_docs_service(LocalHttp()))
+    writer = GoogleDocsWriter(settings, transport=transport)
+    asyncio.run(writer._sync_document_state())
+    return writer
+
+@pytest.mark.parametrize("sink", ["local", "gdocs"])
+def test_sink_throughput(benchmark, record_throughput, tmp_path, sink):
+    messages = make_messages("link_heavy")
+    batches = [messages[start:start + BATCH_SIZE] for start in range(0, len(messages), BATCH_SIZE)]
+    writer = LocalFileSink(tmp_path, 'bench') if sink == "local" else make_docs_sink()
+    
+    async def write():
+        for batch in batches:
+            assert await writer.write_batch(batch)
+    
+    benchmark(lambda: asyncio.run(write()))
+    # The Docs sink is also capped by the write quota: one batch per quota token
+    record_throughput(len(messages))
+    writer.close()
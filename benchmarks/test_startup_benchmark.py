@@ -0,0 +1,55 @@
+"""Бенчмарки запуска клиента Google Docs и накладных расходов на вызов API.
+
+Запуск:
+pytest benchmarks/test_startup_benchmark.py --benchmark-only --no-cov
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from googleapiclient.discovery import build
+
+from src.google.discovery import build_docs_service
+from src.google.transport import DocsTransport
+from tests.conftest import writer_settings
+
+from local_http import LocalHttp
+
+BENCHMARKS_DIR = Path(__file__).parent
+
+def test_cold_start_to_first_write(benchmark):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(BENCHMARKS_DIR.parent), str(BENCHMARKS_DIR)]))
+    settings = json.dumps(vars(writer_settings(google_doc_id='bench', google_max_workers=4)))
+    first_write = []
+    
+    def start():
+        output = subprocess.run(
+            [sys.executable, str(BENCHMARKS_DIR / "cold_start.py"), settings],
+            cwd=BENCHMARKS_DIR.parent, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        first_write.append(float(output.strip().splitlines()[-1]))
+    
+    benchmark.pedantic(start, rounds=5, iterations=1)
+    # Time from the first import to the first written batch, without interpreter startup
+    benchmark.extra_info['first_write_seconds'] = round(sorted(first_write)[len(first_write) // 2], 3)
+
+@pytest.mark.parametrize("factory", ["cached_resource", "build_per_call"])
+def test_api_call_overhead(benchmark, factory):
+    if factory == "cached_resource":
+        service_factory = lambda: build_docs_service(LocalHttp())
+    else:
+        # How services were built before: a new documents() resource on every call
+        service_factory = lambda: build('docs', 'v1', http=LocalHttp(), cache_discovery=False)
+    transport = DocsTransport(None, 1, service_factory=service_factory)
+    
+    async def calls():
+        for _ in range(10):
+            await transport.get_document('bench', fields='revisionId')
+    
+    benchmark(lambda: asyncio.run(calls()))
+    benchmark.extra_info['calls'] = 10
+    transport.close()
@@ -18,6 +18,17 @@ GDOCS_BODY_STYLE = {
 GOOGLE_API_QUOTA_PER_MINUTE = 60
 TELEGRAM_API_CALLS_PER_SECOND = 5
 
+# OAuth token
+GOOGLE_TOKEN_PATH = "data/state/token.pickle"
+GOOGLE_TOKEN_REFRESH_MARGIN = 300
+
+# Docs API discovery document, cached when the client library has no bundled copy
+GOOGLE_DISCOVERY_CACHE_PATH = "data/state/discovery/docs_v1.json"
+
+# batchUpdate limits
+GDOCS_MAX_REQUESTS_PER_BATCH = 500
+GDOCS_MAX_BATCH_BYTES = 1_000_000
+
 # Retry settings
 RETRY_EXPONENTIAL_BASE = 2
 RETRY_MAX_WAIT = 60
@@ -1,10 +1,14 @@
 """Configuration management with validation."""
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, List, Literal
 from pydantic_settings import BaseSettings
 from pydantic import validator, Field
 import os
 
+from src.config.constants import (
+    GOOGLE_API_QUOTA_PER_MINUTE, GDOCS_MAX_REQUESTS_PER_BATCH, GDOCS_MAX_BATCH_BYTES, GOOGLE_TOKEN_REFRESH_MARGIN
+)
+
 class Settings(BaseSettings):
     """Application settings with validation."""
     
@@ -14,14 +18,47 @@ class Settings(BaseSettings):
     telegram_channel_id: int = Field(..., description="Target Telegram channel ID")
     telegram_session_name: str = Field(default="archiver_bot", description="Session name")
     
+    # Archive sinks
+    archive_sinks: List[Literal['gdocs', 'local']] = Field(default_factory=lambda: ['gdocs'], min_length=1, description="Where messages are archived; every sink gets every batch")
+    local_sink_path: Path = Field(default="data/archive", description="Directory of local archives, one subdirectory per route")
+    local_sink_format: Literal['markdown', 'jsonl'] = Field(default="markdown", description="Format of local archive files")
+    local_sink_segment_bytes: int = Field(default=10_000_000, ge=1024, description="Start a new local archive file after this many bytes")
+    local_sink_fsync_interval: float = Field(default=1.0, gt=0, description="Seconds between fsyncs of local archive files")
+    
     # Google settings
     google_doc_id: str = Field(..., description="Google Document ID")
+    google_service_account_files: List[Path] = Field(default_factory=list, description="Service account key files; calls are spread across them")
     google_credentials_path: Path = Field(default="credentials.json", description="Path to Google credentials")
+    channel_routes: Dict[int, str] = Field(default_factory=dict, description="Extra channel ID to Google Doc ID routes")
+    google_max_workers: int = Field(default=4, ge=1, le=32, description="Worker threads for Google Docs API calls")
+    google_read_quota_per_minute: int = Field(default=GOOGLE_API_QUOTA_PER_MINUTE, ge=1, description="Docs read requests per minute")
+    google_write_quota_per_minute: int = Field(default=GOOGLE_API_QUOTA_PER_MINUTE, ge=1, description="Docs write requests per minute")
+    google_max_requests_per_batch: int = Field(default=GDOCS_MAX_REQUESTS_PER_BATCH, ge=1, description="Max requests per batchUpdate")
+    google_max_batch_bytes: int = Field(default=GDOCS_MAX_BATCH_BYTES, ge=1024, description="Max batchUpdate payload size in bytes")
+    google_token_refresh_margin: int = Field(default=GOOGLE_TOKEN_REFRESH_MARGIN, ge=30, description="Refresh the OAuth token this many seconds before it expires")
+    google_interactive_auth: bool = Field(default=True, description="Open a browser for OAuth when there is no valid token")
     
     # Processing settings
-    batch_size: int = Field(default=5, ge=1, le=50, description="Messages per batch")
+    batch_size: int = Field(default=100, ge=1, description="Max messages per batch; a backstop behind the size budgets")
+    batch_max_chars: int = Field(default=20000, ge=0, description="Flush once buffered messages render to this many characters (0 disables)")
+    batch_max_utf16_units: int = Field(default=20000, ge=0, description="Flush once buffered messages render to this many UTF-16 code units (0 disables)")
+    batch_max_requests: int = Field(default=250, ge=0, description="Flush once buffered messages need this many Docs requests (0 disables)")
     check_interval: int = Field(default=30, ge=10, description="Check interval in seconds")
     max_retries: int = Field(default=3, ge=1, description="Max retry attempts")
+    pipeline_depth: int = Field(default=1, ge=1, le=8, description="Batches rendered ahead per document while one is being written")
+    deferred_styling: bool = Field(default=False, description="Write plain text first and apply styles in the background")
+    style_idle_seconds: float = Field(default=2.0, gt=0, description="Idle time before queued styles are applied")
+    sync_edits: bool = Field(default=True, description="Rewrite archived messages when they are edited or deleted")
+    edit_debounce_seconds: float = Field(default=5.0, gt=0, description="Quiet time after the last edit of a message before it is rewritten")
+    
+    # Document rollover
+    rollover_max_chars: int = Field(default=0, ge=0, description="Start a new document after this many characters (0 disables)")
+    rollover_max_words: int = Field(default=0, ge=0, description="Start a new document after this many words (0 disables)")
+    rollover_title_template: str = Field(default="Telegram Archive - part {number}", description="Title of rolled over documents")
+    rollover_template_text: str = Field(
+        default="📚 Telegram Archive - part {number}\nContinued from https://docs.google.com/document/d/{previous_id}\n",
+        description="Initial text of rolled over documents"
+    )
     
     # Features
     enable_cache: bool = Field(default=True, description="Enable caching")
@@ -30,13 +67,32 @@ class Settings(BaseSettings):
     # Paths
     state_db_path: Path = Field(default="data/state/state.db", description="State database path")
     log_file_path: Path = Field(default="data/logs/archiver.log", description="Log file path")
+    record_batches_path: Optional[Path] = Field(default=None, description="Directory to record batchUpdate traffic to for replay (empty disables)")
+    
+    def get_routes(self) -> Dict[int, str]:
+        """Get all channel ID to Google Doc ID routes, including the default one."""
+        routes = {self.telegram_channel_id: self.google_doc_id}
+        routes.update(self.channel_routes)
+        return routes
+    
+    @validator('google_service_account_files')
+    def validate_service_account_files(cls, v):
+        for path in v:
+            if not path.exists():
+                raise ValueError(f"Service account key file not found: {path}")
+        return v
     
     @validator('google_credentials_path')
-    def validate_credentials_path(cls, v):
-        if not v.exists():
+    def validate_credentials_path(cls, v, values):
+        # The OAuth client file is not needed with service accounts or a local archive
+        if not v.exists() and not values.get('google_service_account_files') and 'gdocs' in values.get('archive_sinks', []):
             raise ValueError(f"Google credentials file not found: {v}")
         return v
     
+    @validator('record_batches_path', pre=True)
+    def empty_path_disables(cls, v):
+        return v or None
+    
     @validator('state_db_path', 'log_file_path', pre=True)
     def create_parent_dirs(cls, v):
         path = Path(v)
@@ -1,45 +1,323 @@
 """Google authentication utilities."""
+from google.auth import credentials as google_credentials
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, List, Optional
+import hashlib
+import os
 import pickle
+import threading
+import httplib2
 from loguru import logger
 
-def get_gdocs_service(credentials_path: str):
-    """Get Google Docs service instance."""
-    try:
-        # Token file path
-        token_path = Path('data/state/token.pickle')
+from src.config.constants import GOOGLE_TOKEN_PATH, GOOGLE_TOKEN_REFRESH_MARGIN
+from src.exceptions.custom import GoogleDocsError
+from src.google.discovery import build_docs_service
+
+class CredentialsProvider:
+    """OAuth credentials shared by all Google clients and refreshed ahead of expiry.
+    
+    The token is loaded, refreshed or obtained interactively once. After
+    that a daemon thread refreshes the same credentials object some time
+    before it expires, so API calls never refresh in the write path. A
+    failed background refresh is retried while the current token is still
+    valid. The token file is replaced atomically, so a crash never leaves
+    a truncated token behind.
+    
+    Without interactive authorization (headless servers) a missing or
+    unrefreshable token is an error instead of a browser prompt.
+    """
+    
+    SCOPES = ['https://www.googleapis.com/auth/documents']
+    
+    # Delay before retrying a failed background refresh
+    RETRY_SECONDS = 30.0
+    
+    def __init__(self, credentials_path: Path, token_path: Path = Path(GOOGLE_TOKEN_PATH),
+                 refresh_margin: float = GOOGLE_TOKEN_REFRESH_MARGIN, interactive: bool = True):
+        self.credentials_path = Path(credentials_path)
+        self.token_path = Path(token_path)
+        self.refresh_margin = refresh_margin
+        self.interactive = interactive
+        self.credentials: Optional[Credentials] = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def load(self) -> Credentials:
+        """Get valid credentials, refreshing or authorizing on first use."""
+        with self._lock:
+            if self.credentials is not None:
+                return self.credentials
+            
+            # Load existing token
+            if self.token_path.exists():
+                with open(self.token_path, 'rb') as token:
+                    self.credentials = pickle.load(token)
+            
+            # Refresh or create new token
+            if not self.credentials or not self.credentials.valid:
+                if self.credentials and self.credentials.expired and self.credentials.refresh_token:
+                    self._refresh()
+                elif not self.interactive:
+                    raise GoogleDocsError(
+                        f"No valid Google token at {self.token_path} and interactive authorization is disabled; "
+                        f"authorize once on a machine with a browser and copy the token file, "
+                        f"or configure GOOGLE_SERVICE_ACCOUNT_FILES"
+                    )
+                else:
+                    # Only needed for interactive authorization; slow to import
+                    from google_auth_oauthlib.flow import InstalledAppFlow
+                    flow = InstalledAppFlow.from_client_secrets_file(str(self.credentials_path), self.SCOPES)
+                    self.credentials = flow.run_local_server(port=0)
+                    self._save()
+            return self.credentials
+    
+    @property
+    def name(self) -> str:
+        """Name of the account in logs and metrics."""
+        return 'user'
+    
+    def _can_refresh(self) -> bool:
+        """Check whether the credentials can be refreshed without a user."""
+        return bool(getattr(self.credentials, 'refresh_token', None))
+    
+    def _save(self) -> None:
+        """Write the token to a temporary file and move it over the old one."""
+        self.token_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.token_path.with_name(self.token_path.name + '.tmp')
+        with open(temporary_path, 'wb') as token:
+            pickle.dump(self.credentials, token)
+            token.flush()
+            os.fsync(token.fileno())
+        os.replace(temporary_path, self.token_path)
+    
+    def _refresh(self) -> None:
+        """Refresh the token in place and persist it; the lock must be held."""
+        # Imported on first refresh, which usually happens in the background thread
+        from google.auth.transport.requests import Request
+        self.credentials.refresh(Request())
+        self.refreshes += 1
+        self._save()
+        logger.debug(f"Refreshed Google token, valid until {self.credentials.expiry}")
+    
+    def refresh(self, stale_token: Optional[str] = None) -> None:
+        """Refresh the token now.
         
-        # Load existing token
-        creds = None
-        if token_path.exists():
-            with open(token_path, 'rb') as token:
-                creds = pickle.load(token)
+        With stale_token, nothing is done if another thread has already
+        replaced that token with a valid one.
+        """
+        with self._lock:
+            if stale_token is not None and self.credentials.token != stale_token and self.credentials.valid:
+                return
+            self._refresh()
+    
+    def ensure_valid(self) -> None:
+        """Refresh the token if it is no longer valid."""
+        with self._lock:
+            if not self.credentials.valid:
+                self._refresh()
+    
+    def seconds_left(self) -> Optional[float]:
+        """Seconds until the token expires, None if it does not expire."""
+        if self.credentials is None or self.credentials.expiry is None:
+            return None
+        # google-auth keeps expiry as naive UTC
+        return (self.credentials.expiry - datetime.utcnow()).total_seconds()
+    
+    def _run(self) -> None:
+        """Refresh the token refresh_margin seconds before each expiry."""
+        while True:
+            seconds_left = self.seconds_left()
+            if seconds_left is None:
+                return
+            if self._stop.wait(max(0.0, seconds_left - self.refresh_margin)):
+                return
+            
+            try:
+                self.refresh()
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.warning(f"Background token refresh failed, retrying in {self.RETRY_SECONDS}s: {e}")
+                if self._stop.wait(self.RETRY_SECONDS):
+                    return
+    
+    def start(self) -> None:
+        """Start refreshing in the background."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if not self.credentials or not self._can_refresh():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='google-token-refresh', daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the background refresh."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get refresh counts and remaining token lifetime."""
+        seconds_left = self.seconds_left()
+        return {
+            'refreshes': self.refreshes,
+            'refresh_failures': self.refresh_failures,
+            'expires_in': round(seconds_left) if seconds_left is not None else None
+        }
+
+class LockedCredentials(google_credentials.Credentials):
+    """A provider's credentials as AuthorizedHttp sees them.
+    
+    AuthorizedHttp refreshes its credentials itself when they expire or a
+    call is answered with 401. Through this view every such refresh takes
+    the provider's lock, so worker threads never refresh the shared
+    credentials at the same time as each other or the background thread,
+    and a 401 seen by several threads refreshes the token only once.
+    """
+    
+    def __init__(self, provider: CredentialsProvider):
+        super().__init__()
+        self.provider = provider
+        # Token each thread last sent, to tell a stale token from a fresh one
+        self._local = threading.local()
+    
+    @property
+    def valid(self) -> bool:
+        return self.provider.credentials.valid
+    
+    @property
+    def expired(self) -> bool:
+        return self.provider.credentials.expired
+    
+    def apply(self, headers: Dict[str, str], token: Optional[str] = None) -> None:
+        """Put the current token into the request headers."""
+        credentials = self.provider.credentials
+        self._local.token = token or credentials.token
+        credentials.apply(headers, token=self._local.token)
+    
+    def before_request(self, request: Any, method: str, url: str, headers: Dict[str, str]) -> None:
+        """Refresh through the provider if needed, then authorize the request."""
+        self.provider.ensure_valid()
+        self.apply(headers)
+    
+    def refresh(self, request: Any) -> None:
+        """Replace the token this thread sent, unless another thread already did."""
+        self.provider.refresh(getattr(self._local, 'token', None))
+
+class ServiceAccountProvider(CredentialsProvider):
+    """Service account credentials, refreshed in the background like user tokens.
+    
+    Service accounts never need a browser, and every account has its own
+    per-minute quota. The key file is the only state; tokens are not saved.
+    Documents must be shared with the account's e-mail address.
+    """
+    
+    def __init__(self, key_path: Path, refresh_margin: float = GOOGLE_TOKEN_REFRESH_MARGIN):
+        super().__init__(key_path, key_path, refresh_margin, interactive=False)
+    
+    @property
+    def name(self) -> str:
+        """Name of the account in logs and metrics.
         
-        # Refresh or create new token
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    credentials_path, 
-                    ['https://www.googleapis.com/auth/documents']
+        Key files with the same name in different directories get
+        different names through a hash of the full path.
+        """
+        path_hash = hashlib.sha1(str(self.credentials_path.resolve()).encode()).hexdigest()[:8]
+        return f"{self.credentials_path.stem}-{path_hash}"
+    
+    def load(self) -> service_account.Credentials:
+        """Load the key file and get the first token."""
+        with self._lock:
+            if self.credentials is None:
+                self.credentials = service_account.Credentials.from_service_account_file(
+                    str(self.credentials_path), scopes=self.SCOPES
                 )
-                creds = flow.run_local_server(port=0)
-            
-            # Save token
-            token_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(token_path, 'wb') as token:
-                pickle.dump(creds, token)
+                self._refresh()
+            return self.credentials
+    
+    def _can_refresh(self) -> bool:
+        """Service accounts sign a new token request with their key."""
+        return True
+    
+    def _save(self) -> None:
+        """Nothing to persist; a new token is requested from the key file."""
+
+_providers: Dict[Path, CredentialsProvider] = {}
+_providers_lock = threading.Lock()
+
+def _check_shared(provider: CredentialsProvider, credentials_path: Path,
+                  refresh_margin: float, interactive: bool) -> None:
+    """Refuse to share a provider created with different settings."""
+    if (provider.credentials_path, provider.refresh_margin, provider.interactive) != \
+            (Path(credentials_path), refresh_margin, interactive):
+        raise GoogleDocsError(
+            f"Token file {provider.token_path} is already used with credentials {provider.credentials_path}, "
+            f"refresh margin {provider.refresh_margin}s and interactive={provider.interactive}"
+        )
+
+def get_credentials_provider(credentials_path: Path,
+                             refresh_margin: float = GOOGLE_TOKEN_REFRESH_MARGIN,
+                             interactive: bool = True) -> CredentialsProvider:
+    """Get the provider shared by every client using the same token file.
+    
+    Raises GoogleDocsError if the token file is already used with other
+    settings.
+    """
+    token_path = Path(GOOGLE_TOKEN_PATH)
+    with _providers_lock:
+        provider = _providers.get(token_path)
+        if provider is None:
+            provider = CredentialsProvider(credentials_path, token_path, refresh_margin, interactive)
+            _providers[token_path] = provider
+        else:
+            _check_shared(provider, credentials_path, refresh_margin, interactive)
+        return provider
+
+def get_credentials_providers(settings: Any) -> List[CredentialsProvider]:
+    """Get the shared providers of every configured identity.
+    
+    Service accounts are used when configured, otherwise the OAuth user.
+    """
+    if not settings.google_service_account_files:
+        return [get_credentials_provider(
+            settings.google_credentials_path,
+            settings.google_token_refresh_margin,
+            settings.google_interactive_auth
+        )]
+    
+    providers = []
+    with _providers_lock:
+        for key_path in settings.google_service_account_files:
+            key_path = Path(key_path)
+            provider = _providers.get(key_path)
+            if provider is None:
+                provider = ServiceAccountProvider(key_path, settings.google_token_refresh_margin)
+                _providers[key_path] = provider
+            else:
+                _check_shared(provider, key_path, settings.google_token_refresh_margin, False)
+            providers.append(provider)
+    return providers
+
+def get_gdocs_service(credentials_path: str):
+    """Get Google Docs service instance."""
+    try:
+        provider = get_credentials_provider(Path(credentials_path))
+        provider.load()
+        provider.start()
         
         # Build service
-        service = build('docs', 'v1', credentials=creds)
+        service = build_docs_service(AuthorizedHttp(LockedCredentials(provider), http=httplib2.Http()))
         logger.info("Google Docs service created successfully")
         return service
-        
+    
     except Exception as e:
         logger.error(f"Failed to create Google Docs service: {e}")
         raise
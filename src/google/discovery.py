@@ -0,0 +1,57 @@
+"""Docs API service construction from a local discovery document."""
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict
+
+import httplib2
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from loguru import logger
+
+from src.config.constants import GOOGLE_DISCOVERY_CACHE_PATH
+from src.exceptions.custom import GoogleDocsError
+
+DOCS_DISCOVERY_URL = 'https://docs.googleapis.com/$discovery/rest?version=v1'
+
+def _fetch_discovery_document(cache_path: Path) -> str:
+    """Download the discovery document and keep a copy for later starts."""
+    response, content = httplib2.Http(timeout=10).request(DOCS_DISCOVERY_URL)
+    if response.status != 200:
+        raise GoogleDocsError(f"Failed to fetch Docs discovery document: HTTP {response.status}")
+    content = content.decode('utf-8')
+    
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = cache_path.with_name(cache_path.name + '.tmp')
+    temporary_path.write_text(content, encoding='utf-8')
+    os.replace(temporary_path, cache_path)
+    logger.info(f"Cached Docs discovery document at {cache_path}")
+    return content
+
+@lru_cache(maxsize=None)
+def get_discovery_document(cache_path: str = GOOGLE_DISCOVERY_CACHE_PATH) -> Dict[str, Any]:
+    """Get the parsed Docs v1 discovery document, loaded once per process.
+    
+    The copy bundled with google-api-python-client is used when present,
+    then a copy cached by an earlier start; only without either is the
+    document downloaded.
+    """
+    content = discovery_cache.get_static_doc('docs', 'v1')
+    if content is None:
+        path = Path(cache_path)
+        if path.exists():
+            content = path.read_text(encoding='utf-8')
+        else:
+            content = _fetch_discovery_document(path)
+    return json.loads(content)
+
+def build_docs_service(http: Any) -> Any:
+    """Build a Docs service on an HTTP connection without fetching or re-parsing discovery."""
+    service = build_from_document(get_discovery_document(), http=http)
+    
+    # Every documents() call builds a new resource, including docstrings
+    # rendered from the schema, which costs tens of milliseconds; reuse one
+    documents = service.documents()
+    service.documents = lambda: documents
+    return service
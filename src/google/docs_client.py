@@ -1,26 +1,48 @@
 """Google Docs client implementation with enhanced visual formatting."""
 import asyncio
+import random
+from contextlib import nullcontext
 from typing import List, Dict, Any, Tuple, Optional
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from pathlib import Path
-import pickle
-import re
+import hashlib
+import uuid
+import json
+import time
 from datetime import datetime
 from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from src.config.settings import Settings
 from src.telegram.models import MessageData
+from src.storage.state import StateManager
+from src.google.auth import CredentialsProvider, LockedCredentials, get_credentials_providers
+from src.google.tracker import DocumentTracker
+from src.google.index import MessageIndex
+from src.google.lease import DocumentLease
+from src.google.transport import DocsTransport, Identity
+from src.google.ratelimit import DocsRateLimiter
+from src.google.optimizer import compact_requests, shift_requests
+from src.google.recorder import BatchRecorder
+from src.google.rollover import RolloverManager, DocsDocumentFactory
+from src.google.utf16 import utf16_len
+from src.google.templates import MessageTemplates, validate_color
 from src.exceptions.custom import GoogleDocsError
 
+# Rendered piece of a batch: (start, end, text, requests), positions in UTF-16 code units
+Segment = Tuple[int, int, str, List[Dict]]
+
 class GoogleDocsWriter:
-    """Handles Google Docs operations with visual enhancements."""
+    """Handles Google Docs operations with visual enhancements.
+    
+    Implements the Sink protocol for one archive document and its rollovers.
+    """
+    
+    SCOPES = CredentialsProvider.SCOPES
     
-    SCOPES = ['https://www.googleapis.com/auth/documents']
+    # Rebase-and-retry rounds for a write rejected by requiredRevisionId,
+    # with a jittered pause so competing writers do not collide again
+    MAX_CONFLICT_RETRIES = 5
+    CONFLICT_BACKOFF_SECONDS = 0.05
     
     # Эмодзи для разных типов контента
     MEDIA_EMOJIS = {
@@ -44,107 +66,95 @@ class GoogleDocsWriter:
         'batch_footer': {'red': 0.4, 'green': 0.6, 'blue': 0.4},  # Зеленый для футеров батчей
     }
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, state: Optional[StateManager] = None,
+                 document_id: Optional[str] = None, transport: Optional[DocsTransport] = None,
+                 service: Optional[Any] = None, recorder: Optional[BatchRecorder] = None):
+        """Create a writer.
+        
+        Args:
+            settings: Application settings
+            state: State database for tracked indices, checkpoints and rollover
+            document_id: Document to write to instead of settings.google_doc_id
+            transport: Shared transport; a new one is created when omitted
+            service: Docs service used instead of the real API, e.g. FakeDocsService
+            recorder: Log of sent batchUpdate calls; created from settings.record_batches_path
+                with the real API when omitted
+        """
         self.settings = settings
-        self.service = None
+        self.transport = transport
+        self.recorder = recorder
         self.creds = None
-        self._initialize_service()
-        
+        self.credentials_providers: List[CredentialsProvider] = []
+        self.state = state
+        self.document_id = document_id or settings.google_doc_id
+        self.requests_compacted = 0
+        self.styles_applied = 0
+        self.styles_discarded = 0
+        self.edits_applied = 0
+        self.duplicates_skipped = 0
+        self.revision_conflicts = 0
+        self.rollover = None
+        self.templates = MessageTemplates(self.COLORS, self.MEDIA_EMOJIS)
+        if not self.transport and service is not None:
+            self.transport = DocsTransport(None, self.settings.google_max_workers,
+                                           service_factory=lambda: service, limiter=self._create_limiter())
+        if not self.transport:
+            self._initialize_service()
+        
+        if state:
+            self.rollover = RolloverManager(settings, state, DocsDocumentFactory(self.transport), self.document_id)
+            self.document_id = self.rollover.active_document_id
+        self.tracker = DocumentTracker(self.document_id, state)
+        self.index = MessageIndex(self.document_id, state)
+        self.lease = self._create_lease(self.document_id)
+        
+    def _create_lease(self, document_id: str) -> Optional[DocumentLease]:
+        """Create the lease shared with other processes using the same state directory."""
+        if not self.state:
+            return None
+        return DocumentLease(self.state.db_path.parent / "leases", document_id)
+    
+    def _hold_lease(self):
+        """Hold the active document's lease for one write."""
+        if not self.lease:
+            return nullcontext()
+        return self.lease.hold(self.tracker)
+    
+    async def _conflict_backoff(self, attempt: int) -> None:
+        """Wait a jittered, growing pause before rebasing a rejected write."""
+        await asyncio.sleep(random.uniform(0, self.CONFLICT_BACKOFF_SECONDS * 2 ** attempt))
+    
+    def _create_limiter(self) -> DocsRateLimiter:
+        """Create the rate limiter for the configured read and write quotas."""
+        return DocsRateLimiter(
+            self.settings.google_read_quota_per_minute,
+            self.settings.google_write_quota_per_minute
+        )
+    
     def _initialize_service(self):
         """Initialize Google Docs service."""
         try:
-            # Token file path
-            token_path = Path('data/state/token.pickle')
-            
-            # Load existing token
-            if token_path.exists():
-                with open(token_path, 'rb') as token:
-                    self.creds = pickle.load(token)
-            
-            # Refresh or create new token
-            if not self.creds or not self.creds.valid:
-                if self.creds and self.creds.expired and self.creds.refresh_token:
-                    self.creds.refresh(Request())
-                else:
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        str(self.settings.google_credentials_path), 
-                        self.SCOPES
-                    )
-                    self.creds = flow.run_local_server(port=0)
-                
-                # Save token
-                token_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(token_path, 'wb') as token:
-                    pickle.dump(self.creds, token)
-            
-            # Build service
-            self.service = build('docs', 'v1', credentials=self.creds)
-            logger.info("Google Docs service initialized successfully")
+            # Credentials are shared and refreshed in the background;
+            # every identity gets its own quota
+            self.credentials_providers = get_credentials_providers(self.settings)
+            if self.recorder is None and self.settings.record_batches_path:
+                self.recorder = BatchRecorder(self.settings.record_batches_path)
+            identities = []
+            for provider in self.credentials_providers:
+                provider.load()
+                provider.start()
+                # Refreshes by the per-thread AuthorizedHttp go through the provider's lock
+                identities.append(Identity(provider.name, LockedCredentials(provider), self._create_limiter()))
+            self.creds = identities[0].credentials
+            
+            # Build transport; services are created per worker thread
+            self.transport = DocsTransport(self.creds, self.settings.google_max_workers, identities=identities)
+            logger.info(f"Google Docs service initialized successfully with {len(identities)} identities")
             
         except Exception as e:
             logger.error(f"Failed to initialize Google Docs service: {e}")
             raise GoogleDocsError(f"Initialization failed: {e}")
     
-    def _clean_url(self, url: str) -> str:
-        """Clean and validate URL."""
-        if not url:
-            return url
-            
-        # Remove trailing punctuation and whitespace
-        url = url.rstrip('.,;!? \t\n\r')
-        
-        # Remove trailing closing parenthesis if it's not part of the URL
-        if url.endswith(')'):
-            # Check if this is a valid URL with parentheses (like GitHub URLs with parentheses in path)
-            # If it's just a trailing ), remove it
-            if not any(char in url[:-1] for char in '()'):
-                url = url[:-1]
-        
-        # Fix common URL issues
-        if url.startswith('http https://'):
-            url = url.replace('http https://', 'https://')
-        
-        # Remove any remaining problematic characters at the end
-        url = url.rstrip('.,;!? \t\n\r)')
-        
-        # Ensure URL starts with http:// or https://
-        if not url.startswith(('http://', 'https://')):
-            if url.startswith('//'):
-                url = 'https:' + url
-            else:
-                url = 'https://' + url
-        
-        return url
-    
-    def _extract_links(self, text: str) -> List[Tuple[str, int, int]]:
-        """Extract all URLs from text with their positions.
-        
-        Returns:
-            List of tuples (url, start_pos, end_pos)
-        """
-        if not text:
-            return []
-            
-        links = []
-        
-        # Pattern for Markdown links: [text](url)
-        # More precise pattern that handles trailing punctuation
-        markdown_pattern = r'\[([^\]]+)\]\(([^)]+?)\)'
-        for match in re.finditer(markdown_pattern, text):
-            url = self._clean_url(match.group(2))
-            if url:  # Only add if URL is valid after cleaning
-                links.append((url, match.start(), match.end()))
-        
-        # Pattern for plain URLs (fallback)
-        # More precise pattern that doesn't capture trailing punctuation
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-        for match in re.finditer(url_pattern, text):
-            url = self._clean_url(match.group())
-            if url:  # Only add if URL is valid after cleaning
-                links.append((url, match.start(), match.end()))
-        
-        return links
-    
     def _create_insert_request(self, text: str, index: int) -> Dict[str, Any]:
         """Create insert text request."""
         return {
@@ -158,19 +168,7 @@ class GoogleDocsWriter:
         """Validate and normalize RGB color values (0.0 to 1.0)."""
         if not color:
             return color
-            
-        validated = {}
-        for component in ['red', 'green', 'blue']:
-            if component in color:
-                value = color[component]
-                # Ensure value is between 0.0 and 1.0
-                if isinstance(value, int):
-                    value = max(0.0, min(1.0, value / 255.0))
-                else:
-                    value = max(0.0, min(1.0, float(value)))
-                validated[component] = value
-        
-        return validated
+        return validate_color(color)
     
     def _create_format_request(self, start_index: int, end_index: int,
                              bold: bool = False, italic: bool = False,
@@ -215,317 +213,685 @@ class GoogleDocsWriter:
         
         return request
     
-    def _create_link_request(self, start_index: int, end_index: int, url: str) -> Dict[str, Any]:
-        """Create link request."""
+    def _create_formatted_message_requests(self, message: MessageData, start_index: int) -> Tuple[str, List[Dict], int]:
+        """Create formatted message with visual enhancements.
+        
+        The layout comes from the compiled template for the message's shape.
+        
+        Returns:
+            Tuple of (formatted_text, list_of_requests, end_index)
+        """
+        text, requests, units = self.render_message(message)
+        return text, self._shift_requests(requests, start_index - 1), start_index + units
+    
+    def render_message(self, message: MessageData) -> Tuple[str, List[Dict], int]:
+        """Render a message placed at index 1, once per message object.
+        
+        The rendering is cached on the message, so a message measured while
+        buffered is not rendered again when its batch is written.
+        
+        Returns:
+            Tuple of (formatted_text, list_of_requests, utf16_units)
+        """
+        if message._rendered is None:
+            text, requests, end = self.templates.render(message, 1)
+            message._rendered = (text, requests, end - 1)
+        return message._rendered
+    
+    async def _sync_document_state(self) -> None:
+        """Re-read end index, revision ID and message ranges with a narrow field mask."""
+        doc = await self.transport.get_document(
+            self.document_id,
+            fields=f"{DocumentTracker.SYNC_FIELDS},{MessageIndex.SYNC_FIELDS}"
+        )
+        self.tracker.sync_from_document(doc)
+        self.index.sync_from_document(doc)
+    
+    async def _get_insert_index(self) -> int:
+        """Get the append index, reading the document only when it is not tracked."""
+        if not self.tracker.is_synced:
+            await self._sync_document_state()
+        return self.tracker.insert_index
+    
+    async def locate_message(self, channel_id: int, message_id: int) -> Optional[Tuple[str, int, int]]:
+        """Find an archived message, newest document first.
+        
+        The lookup is served from the local index. If the active document was
+        changed outside the archiver, its index is rebuilt from the named
+        ranges first.
+        
+        Returns:
+            Tuple of (document_id, start_index, end_index), or None if the message is not indexed
+        """
+        if not self.tracker.is_synced:
+            await self._sync_document_state()
+        
+        for document_id in reversed(self._documents()):
+            index = self.index if document_id == self.document_id else MessageIndex(document_id, self.state)
+            entry = index.get(channel_id, message_id)
+            if entry:
+                return document_id, entry['start'], entry['end']
+        return None
+    
+    def _is_revision_conflict(self, error: HttpError) -> bool:
+        """Check whether a batchUpdate was rejected because of requiredRevisionId."""
+        return error.resp.status == 400 and 'revision' in str(error.reason).lower()
+    
+    async def _execute_batch_update(self, requests: List[Dict], inserted_text: str,
+                                    units: Optional[int] = None) -> Dict[str, Any]:
+        """Execute batchUpdate against the tracked revision and advance the tracker."""
+        requests, removed = compact_requests(requests)
+        self.requests_compacted += removed
+        
+        body = {'requests': requests}
+        write_control = self.tracker.write_control()
+        if write_control:
+            body['writeControl'] = write_control
+        
+        try:
+            result = await self._batch_update(self.document_id, body, self.tracker.end_index)
+        except HttpError as e:
+            if self._is_revision_conflict(e):
+                logger.warning("Document was modified by another writer, local end index invalidated")
+                self.revision_conflicts += 1
+                self.tracker.invalidate()
+            elif e.resp.status >= 500:
+                # The write may have been applied; re-read the document before the next one
+                self.tracker.invalidate()
+            raise
+        except Exception:
+            # The reply was lost, so whether the write was applied is unknown
+            self.tracker.invalidate()
+            raise
+        
+        self.tracker.apply_write(result, inserted_text, units)
+        return result
+    
+    async def _batch_update(self, document_id: str, body: Dict[str, Any],
+                            end_index: Optional[int] = None) -> Dict[str, Any]:
+        """Send a batchUpdate, recording the call when a recorder is set."""
+        if not self.recorder:
+            return await self.transport.batch_update(document_id, body)
+        
+        started = time.time()
+        clock = time.perf_counter()
+        try:
+            result = await self.transport.batch_update(document_id, body)
+        except HttpError as e:
+            self.recorder.record(document_id, body, started, time.perf_counter() - clock,
+                                 status=e.resp.status, error=str(e.reason), end_index=end_index)
+            raise
+        except Exception as e:
+            self.recorder.record(document_id, body, started, time.perf_counter() - clock,
+                                 status=0, error=repr(e), end_index=end_index)
+            raise
+        self.recorder.record(document_id, body, started, time.perf_counter() - clock, result, end_index=end_index)
+        return result
+    
+    def _shift_requests(self, requests: List[Dict], delta: int) -> List[Dict]:
+        """Copy requests with all indices moved by delta."""
+        return shift_requests(requests, delta)
+    
+    def _create_named_range_request(self, name: str, start_index: int, end_index: int) -> Dict[str, Any]:
+        """Create named range request."""
         return {
-            'updateTextStyle': {
-                'range': {
-                    'startIndex': start_index,
-                    'endIndex': end_index
-                },
-                'textStyle': {
-                    'link': {'url': url},
-                    'foregroundColor': {
-                        'color': {
-                            'rgbColor': self.COLORS['link']
-                        }
-                    }
-                },
-                'fields': 'link,foregroundColor'
+            'createNamedRange': {
+                'name': name,
+                'range': {'startIndex': start_index, 'endIndex': end_index}
             }
         }
     
-    def _create_formatted_message_requests(self, message: MessageData, start_index: int) -> Tuple[str, List[Dict]]:
-        """Create formatted message with visual enhancements.
+    def _create_message_segment(self, message: MessageData, start: int) -> Segment:
+        """Create a segment (start, end, text, requests) for one message.
+        
+        The last request creates the message's named range for the offset index.
+        """
+        formatted_text, format_requests, end = self._create_formatted_message_requests(message, start)
+        requests = [self._create_insert_request(formatted_text, start)]
+        requests.extend(format_requests)
+        requests.append(self._create_named_range_request(MessageIndex.range_name(message.channel_id, message.id), start, end))
+        return start, end, formatted_text, requests
+    
+    def _create_batch_segments(self, messages: List[MessageData], now: datetime,
+                               start_index: int = 0) -> List[Segment]:
+        """Create batch segments positioned from start_index.
+        
+        Each segment is a tuple (start, end, text, requests) for the batch
+        header, one message or the batch footer, with positions in UTF-16
+        code units. Segments are the units a batch may be split at.
+        """
+        segments = []
+        
+        # Prepare batch header
+        header = f"\n📦 BATCH UPDATE - {now.strftime('%Y-%m-%d %H:%M:%S')} - {len(messages)} messages\n"
+        header += "─" * 60 + "\n"
+        header_end = start_index + utf16_len(header)
+        segments.append((start_index, header_end, header, [
+            self._create_insert_request(header, start_index),
+            self._create_format_request(
+                start_index,
+                header_end,
+                bold=True,
+                font_size=12,
+                color=self.COLORS['batch_header']
+            )
+        ]))
+        
+        current_position = header_end
+        
+        # === PROCESS EACH MESSAGE ===
+        for message in messages:
+            segment = self._create_message_segment(message, current_position)
+            segments.append(segment)
+            current_position = segment[1]
+        
+        # === BATCH FOOTER ===
+        footer = f"\n{'─' * 60}\n✅ Batch completed at {now.strftime('%H:%M:%S')}\n\n"
+        footer_end = current_position + utf16_len(footer)
+        segments.append((current_position, footer_end, footer, [
+            self._create_insert_request(footer, current_position),
+            self._create_format_request(
+                current_position,
+                footer_end,
+                italic=True,
+                font_size=10,
+                color=self.COLORS['batch_footer']
+            )
+        ]))
+        
+        return segments
+    
+    def _chunk_segments(self, segments: List[Segment]) -> List[List[Segment]]:
+        """Split segments into chunks that fit the batchUpdate request and payload limits."""
+        max_requests = self.settings.google_max_requests_per_batch
+        max_bytes = self.settings.google_max_batch_bytes
+        
+        chunks = []
+        current = []
+        current_requests = 0
+        current_bytes = 0
+        
+        for segment in segments:
+            segment_requests = len(segment[3])
+            segment_bytes = len(json.dumps(segment[3]))
+            
+            if current and (current_requests + segment_requests > max_requests
+                            or current_bytes + segment_bytes > max_bytes):
+                chunks.append(current)
+                current = []
+                current_requests = 0
+                current_bytes = 0
+            
+            current.append(segment)
+            current_requests += segment_requests
+            current_bytes += segment_bytes
+        
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _queue_style_job(self, requests: List[Dict]) -> None:
+        """Persist style requests for text that has just been written."""
+        self.state.add_style_job(self.document_id, {
+            'job_id': uuid.uuid4().hex[:16],
+            'requests': requests,
+            'created_at': datetime.now().isoformat()
+        })
+    
+    async def _write_chunk(self, segments: List[Segment], commit_name: Optional[str] = None) -> bool:
+        """Write consecutive segments with one batchUpdate at the tracked end of the document.
+        
+        Segments may have been positioned from a predicted index; they are
+        rebased onto the actual end of the document before sending. With
+        deferred styling only the text is sent and the style requests are
+        queued for the background pass. Named ranges of messages are created
+        after all text is inserted and recorded in the message index.
+        
+        With a commit name the chunk also gets a commit marker range. If the
+        document had to be re-read, e.g. after a lost reply, and the marker
+        is already there, the chunk is not sent again.
+        
+        Each attempt holds the document lease, so processes sharing the
+        document take turns between reading its end and writing. A write
+        rejected by requiredRevisionId is rebased onto the re-read end and
+        retried; it never falls back to plain text.
         
         Returns:
-            Tuple of (formatted_text, list_of_requests)
+            True if written with formatting, False if the plain-text fallback was used
         """
-        from src.config.constants import DATE_FORMAT, MESSAGE_SEPARATOR
-        
-        requests = []
-        parts = []
-        
-        # === HEADER SECTION ===
-        date_str = message.date.strftime(DATE_FORMAT)
-        source = message.forward_from_channel_name or message.channel_name or "Unknown"
-        source_emoji = "📢" if not message.forward_from_channel_name else "🔄"
-        header_line = f"{date_str} | {source_emoji} {source}"
-        parts.append(header_line)
-        
-        # === FORWARD INFO SECTION ===
-        if message.forward_from_channel_name:
-            forward_text = f"↪️ Forwarded from: {message.forward_from_channel_name}"
-            parts.append(forward_text)
-            
-            if message.forward_original_date:
-                orig_date = f"📆 Original: {message.forward_original_date.strftime(DATE_FORMAT)}"
-                parts.append(orig_date)
+        chunk_start = segments[0][0]
+        chunk_units = segments[-1][1] - chunk_start
+        chunk_text = "".join(text for _, _, text, _ in segments)
+        chunk_requests = [request for _, _, _, requests in segments for request in requests]
+        # Kept out of the content requests so contiguous inserts can still be merged
+        range_requests = [request for request in chunk_requests if 'createNamedRange' in request]
+        content_requests = [request for request in chunk_requests if 'createNamedRange' not in request]
+        marker_requests = []
+        if commit_name:
+            marker_requests.append(self._create_named_range_request(commit_name, chunk_start, chunk_start + chunk_units))
+        
+        deferred = self.settings.deferred_styling and self.state is not None
+        if deferred:
+            style_requests = [request for request in content_requests if 'insertText' not in request]
+        
+        for attempt in range(self.MAX_CONFLICT_RETRIES + 1):
+            if attempt:
+                await self._conflict_backoff(attempt)
+            async with self._hold_lease():
+                insert_index = await self._get_insert_index()
+                landed_index = self.index.landed(commit_name) if commit_name else None
+                if landed_index is not None:
+                    logger.warning(f"Chunk {commit_name} is already in the document, not writing it again")
+                    self.duplicates_skipped += 1
+                    if deferred and style_requests:
+                        self._queue_style_job(self._shift_requests(style_requests, landed_index - chunk_start))
+                    return True
+                
+                delta = insert_index - chunk_start
+                if deferred:
+                    requests = [self._create_insert_request(chunk_text, insert_index)]
+                else:
+                    requests = self._shift_requests(content_requests, delta)
+                requests.extend(self._shift_requests(range_requests + marker_requests, delta))
+                
+                try:
+                    result = await self._execute_batch_update(requests, chunk_text, chunk_units)
+                    self.index.record_write(requests, result)
+                    self.index.save()
+                    if deferred and style_requests:
+                        self._queue_style_job(self._shift_requests(style_requests, delta))
+                    return True
+                except HttpError as e:
+                    if self._is_revision_conflict(e):
+                        if attempt < self.MAX_CONFLICT_RETRIES:
+                            continue
+                        # Never fall back to plain text over another writer's content
+                        raise
+                    if e.resp.status >= 500:
+                        # Possibly applied; the caller's retry checks the commit marker
+                        raise
+                    logger.error(f"Google Docs API error: {e}")
+                    # Fallback to simple text insertion without formatting
+                    fallback_index = await self._get_insert_index()
+                    fallback_requests = [self._create_insert_request(chunk_text, fallback_index)]
+                    fallback_requests.extend(self._shift_requests(marker_requests, fallback_index - chunk_start))
+                    result = await self._execute_batch_update(fallback_requests, chunk_text, chunk_units)
+                    self.index.record_write(fallback_requests, result)
+                    # Ranges are still known locally, only the named ranges are missing
+                    self.index.record_write(self._shift_requests(range_requests, fallback_index - chunk_start), {})
+                    self.index.save()
+                    return False
+            
+        return False
+    
+    def _documents(self) -> List[str]:
+        """Documents written by this writer, oldest first."""
+        if self.rollover:
+            return [document['document_id'] for document in self.rollover.get_documents()]
+        return [self.document_id]
+    
+    def pending_style_jobs(self) -> int:
+        """Number of queued style jobs across this writer's documents."""
+        if not self.state:
+            return 0
+        return sum(len(self.state.get_style_jobs(document_id)) for document_id in self._documents())
+    
+    async def _apply_style_job(self, document_id: str, job: Dict[str, Any]) -> None:
+        """Send one style job to the document its text was written to."""
+        if document_id != self.document_id:
+            # Rolled over documents are no longer tracked or appended to
+            await self._batch_update(document_id, {'requests': job['requests']})
+            return
+        
+        # Held like a chunk write, so another process's append is seen before styling
+        async with self._hold_lease():
+            if not self.tracker.is_synced:
+                await self._sync_document_state()
+            await self._execute_batch_update(job['requests'], "")
+    
+    async def apply_style_jobs(self, limit: int = 1) -> int:
+        """Apply queued style jobs, oldest first.
         
-        # Empty line before content
-        parts.append("")
+        A style job that the API rejects is discarded on its own; the text
+        it formats is already in the document. Conflicts and transient
+        errors leave the job queued for the next pass.
         
-        # === MEDIA SECTION ===
-        if message.has_media:
-            media_emoji = self.MEDIA_EMOJIS.get(message.media_type, '📎')
-            media_text = f"{media_emoji} {message.media_type}"
-            
-            if message.media_caption:
-                media_text += f": {message.media_caption}"
-            
-            parts.append(media_text)
+        Returns:
+            Number of jobs applied
+        """
+        if not self.state:
+            return 0
+        
+        applied = 0
+        for document_id in self._documents():
+            for job in self.state.get_style_jobs(document_id):
+                if applied >= limit:
+                    return applied
+                
+                try:
+                    await self._apply_style_job(document_id, job)
+                except HttpError as e:
+                    if e.resp.status == 400 and not self._is_revision_conflict(e):
+                        logger.warning(f"Discarding style job {job['job_id']}: {e}")
+                        self.state.remove_style_job(document_id, job['job_id'])
+                        self.styles_discarded += 1
+                        continue
+                    logger.warning(f"Style job {job['job_id']} postponed: {e}")
+                    return applied
+                
+                self.state.remove_style_job(document_id, job['job_id'])
+                self.styles_applied += 1
+                applied += 1
         
-        # === MAIN TEXT SECTION ===
-        if message.text:
-            parts.append(message.text)
+        return applied
+    
+    def _create_replace_requests(self, channel_id: int, message_id: int, start: int, end: int,
+                                 message: Optional[MessageData]) -> Tuple[List[Dict], int]:
+        """Create requests that replace an indexed message range, or remove it if message is None.
         
-        # === TELEGRAM LINK SECTION ===
-        if message.original_link:
-            parts.append("")  # Empty line
-            link_text = "🔗 View in Telegram"
-            parts.append(link_text)
-            
-            # If there's a forward link too
-            if hasattr(message, 'forward_original_link') and message.forward_original_link:
-                forward_link_text = "🔗 View Original"
-                parts.append(forward_link_text)
-        
-        # === SEPARATOR ===
-        parts.append("")
-        parts.append(MESSAGE_SEPARATOR)
-        parts.append("")
-        
-        # Create the complete text
-        formatted_text = "\n".join(parts)
-        
-        # Now calculate positions for formatting
-        current_pos = start_index
-        
-        # Format header
-        header_end = current_pos + len(header_line)
-        requests.append(self._create_format_request(
-            current_pos,
-            header_end,
-            bold=True,
-            font_size=12,
-            color=self.COLORS['header']
-        ))
-        current_pos = header_end + 1  # +1 for newline
-        
-        # Format forward info
-        if message.forward_from_channel_name:
-            forward_end = current_pos + len(forward_text)
-            requests.append(self._create_format_request(
-                current_pos,
-                forward_end,
-                italic=True,
-                color=self.COLORS['forward']
-            ))
-            current_pos = forward_end + 1
-            
-            if message.forward_original_date:
-                orig_date_end = current_pos + len(orig_date)
-                requests.append(self._create_format_request(
-                    current_pos,
-                    orig_date_end,
-                    italic=True,
-                    font_size=10,
-                    color=self.COLORS['date']
-                ))
-                current_pos = orig_date_end + 1
-        
-        # Skip empty line
-        current_pos += 1
-        
-        # Format media info
-        if message.has_media:
-            media_end = current_pos + len(media_text)
-            requests.append(self._create_format_request(
-                current_pos,
-                media_end,
-                bold=True,
-                color=self.COLORS['media']
-            ))
-            current_pos = media_end + 1
-        
-        # Format links in main text
-        if message.text:
-            text_start = current_pos
-            # Find and format URLs in text
-            links = self._extract_links(message.text)
-            logger.debug(f"Found {len(links)} links in message text: {links}")
-            for url, rel_start, rel_end in links:
-                abs_start = text_start + rel_start
-                abs_end = text_start + rel_end
-                logger.debug(f"Creating link request for URL: {url} at positions {abs_start}-{abs_end}")
-                requests.append(self._create_link_request(abs_start, abs_end, url))
-            current_pos += len(message.text) + 1
-        
-        # Format Telegram links
-        if message.original_link:
-            current_pos += 1  # Skip empty line
-            link_end = current_pos + len(link_text)
-            requests.append(self._create_link_request(
-                current_pos,
-                link_end,
-                message.original_link
-            ))
-            current_pos = link_end + 1
-            
-            if hasattr(message, 'forward_original_link') and message.forward_original_link:
-                forward_link_end = current_pos + len(forward_link_text)
-                requests.append(self._create_link_request(
-                    current_pos,
-                    forward_link_end,
-                    message.forward_original_link
-                ))
+        Returns:
+            Tuple of (requests, UTF-16 length of the new text)
+        """
+        requests = [
+            {'deleteNamedRange': {'name': MessageIndex.range_name(channel_id, message_id)}},
+            {'deleteContentRange': {'range': {'startIndex': start, 'endIndex': end}}}
+        ]
+        if message is None:
+            return requests, 0
+        
+        segment_start, segment_end, _, segment_requests = self._create_message_segment(message, start)
+        requests.extend(segment_requests)
+        return requests, segment_end - segment_start
+    
+    def _shift_style_jobs(self, document_id: str, edits: List[Tuple[int, int, int, int, int, bool]]) -> None:
+        """Move queued styles past rewritten messages and drop the styles of the rewritten text.
+        
+        Edits are (start, old_units, units, ...) sorted from the end of the
+        document backwards, as they were applied.
+        """
+        if not self.state:
+            return
+        jobs = self.state.get_style_jobs(document_id)
+        if not jobs:
+            return
+        
+        for job in jobs:
+            requests = job['requests']
+            for start, old_units, units, _, _, _ in edits:
+                kept = []
+                for request in requests:
+                    range_ = next(iter(request.values())).get('range')
+                    if range_ is None or range_['endIndex'] <= start:
+                        kept.append(request)
+                    elif range_['startIndex'] >= start + old_units:
+                        kept.extend(shift_requests([request], units - old_units))
+                    # Styles inside the old text are replaced with the new message's own
+                requests = kept
+            job['requests'] = requests
+        self.state.set_style_jobs(document_id, [job for job in jobs if job['requests']])
+    
+    async def _replace_in_document(self, document_id: str,
+                                   changes: List[Tuple[int, int, Optional[MessageData]]]) -> int:
+        """Apply replacements and removals to one document with a single batchUpdate.
+        
+        Ranges are rewritten from the end of the document backwards, so the
+        positions of the ranges still to be rewritten stay as indexed. In the
+        active document the write holds the lease; after another writer's
+        changes the index is rebuilt from the named ranges and the edit retried.
+        """
+        active = document_id == self.document_id
+        index = self.index if active else MessageIndex(document_id, self.state)
+        
+        for attempt in range(self.MAX_CONFLICT_RETRIES + 1):
+            if attempt:
+                await self._conflict_backoff(attempt)
+            async with self._hold_lease() if active else nullcontext():
+                if active and not self.tracker.is_synced:
+                    # Another writer changed the document; its named ranges are the current index
+                    await self._sync_document_state()
+                located = []
+                for channel_id, message_id, message in changes:
+                    entry = index.get(channel_id, message_id)
+                    if entry:
+                        located.append((entry['start'], entry['end'], channel_id, message_id, message))
+                if not located:
+                    return 0
+                located.sort(key=lambda item: item[0], reverse=True)
+                
+                requests = []
+                edits = []
+                for start, end, channel_id, message_id, message in located:
+                    message_requests, units = self._create_replace_requests(channel_id, message_id, start, end, message)
+                    requests.extend(message_requests)
+                    edits.append((start, end - start, units, channel_id, message_id, message is not None))
+                
+                try:
+                    if active:
+                        result = await self._execute_batch_update(
+                            requests, "", sum(units - old_units for _, old_units, units, _, _, _ in edits)
+                        )
+                    else:
+                        # Rolled over documents are no longer tracked or appended to
+                        result = await self._batch_update(document_id, {'requests': requests})
+                    break
+                except HttpError as e:
+                    if active and self._is_revision_conflict(e) and attempt < self.MAX_CONFLICT_RETRIES:
+                        continue
+                    raise
+            
+        self._shift_style_jobs(document_id, edits)
+        named_range_ids = iter([
+            reply['createNamedRange'].get('namedRangeId')
+            for reply in result.get('replies') or []
+            if reply and 'createNamedRange' in reply
+        ])
+        for start, old_units, units, channel_id, message_id, replaced in edits:
+            index.remove(channel_id, message_id)
+            index.shift(start, -old_units)
+            if replaced:
+                index.shift(start, units)
+                index.record(channel_id, message_id, start, start + units, next(named_range_ids, None))
+        index.save()
+        return len(edits)
+    
+    async def replace_messages(self, messages: List[MessageData],
+                               deleted: Optional[List[Tuple[int, int]]] = None) -> int:
+        """Rewrite edited messages and remove deleted ones where they were archived.
         
-        return formatted_text, requests
+        Messages are found through the offset index; messages that are not
+        indexed are skipped. Each affected document gets one batchUpdate.
+        
+        Args:
+            messages: Latest versions of edited messages
+            deleted: (channel_id, message_id) of deleted messages
+            
+        Returns:
+            Number of messages replaced or removed
+        """
+        changes: Dict[str, Tuple[int, int, Optional[MessageData]]] = {}
+        for message in messages:
+            changes[MessageIndex.key(message.channel_id, message.id)] = (message.channel_id, message.id, message)
+        for channel_id, message_id in deleted or []:
+            changes[MessageIndex.key(channel_id, message_id)] = (channel_id, message_id, None)
+        
+        by_document: Dict[str, List[Tuple[int, int, Optional[MessageData]]]] = {}
+        for channel_id, message_id, message in changes.values():
+            location = await self.locate_message(channel_id, message_id)
+            if location is None:
+                logger.debug(f"Message {message_id} from channel {channel_id} is not indexed, skipping")
+                continue
+            by_document.setdefault(location[0], []).append((channel_id, message_id, message))
+        
+        changed = 0
+        for document_id, document_changes in by_document.items():
+            changed += await self._replace_in_document(document_id, document_changes)
+        
+        self.edits_applied += changed
+        if changed:
+            logger.info(f"Updated {changed} archived messages in place")
+        return changed
+    
+    async def _maybe_rollover(self) -> None:
+        """Switch to a new document once the active one crosses a size threshold."""
+        if not self.rollover or not self.rollover.enabled:
+            return
+        if not self.rollover.needs_rollover(self.tracker.end_index, self.tracker.words):
+            return
+        
+        document_id = await self.rollover.rollover()
+        self.document_id = document_id
+        self.tracker = DocumentTracker(document_id, self.state)
+        self.index = MessageIndex(document_id, self.state)
+        if self.lease:
+            self.lease.close()
+        self.lease = self._create_lease(document_id)
+    
+    def _get_batch_id(self, messages: List[MessageData]) -> str:
+        """Build a stable ID for a batch from its target document and message IDs."""
+        key = self.document_id + ":" + ",".join(f"{m.channel_id}:{m.id}" for m in messages)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def write_message(self, message: MessageData) -> bool:
         """Write a single message to Google Docs with enhanced formatting."""
         try:
-            # Get document
-            doc = self.service.documents().get(documentId=self.settings.google_doc_id).execute()
-            current_length = doc['body']['content'][-1]['endIndex']
-            
-            # Create formatted message
-            formatted_text, format_requests = self._create_formatted_message_requests(message, current_length - 1)
-            
-            # Prepare all requests
-            all_requests = [
-                self._create_insert_request(formatted_text, current_length - 1)
-            ]
-            all_requests.extend(format_requests)
-            
-            # Execute batch update
-            if all_requests:
-                try:
-                    result = self.service.documents().batchUpdate(
-                        documentId=self.settings.google_doc_id,
-                        body={'requests': all_requests}
-                    ).execute()
-                    logger.info(f"Written message {message.id} with enhanced formatting")
-                except HttpError as e:
-                    logger.error(f"Google Docs API error: {e}")
-                    # Fallback to simple text insertion without formatting
-                    fallback_request = self._create_insert_request(formatted_text, current_length - 1)
-                    self.service.documents().batchUpdate(
-                        documentId=self.settings.google_doc_id,
-                        body={'requests': [fallback_request]}
-                    ).execute()
-                    logger.info(f"Written message {message.id} without formatting (fallback)")
+            start_index = self.tracker.insert_index if self.tracker.is_synced else 0
+            commit_name = MessageIndex.commit_name(self._get_batch_id([message]), 0)
+            if await self._write_chunk([self._create_message_segment(message, start_index)], commit_name):
+                logger.info(f"Written message {message.id} with enhanced formatting")
+            else:
+                logger.info(f"Written message {message.id} without formatting (fallback)")
             
+            await self._maybe_rollover()
             return True
             
         except Exception as e:
             logger.error(f"Failed to write message: {e}")
             raise GoogleDocsError(f"Write failed: {e}")
     
+    def prepare_batch(self, messages: List[MessageData], start_index: Optional[int] = None) -> 'PreparedBatch':
+        """Render a batch into chunks of requests without any API calls.
+        
+        Args:
+            messages: Messages to write
+            start_index: Predicted insert index; defaults to the tracked end of
+                the document. Wrong predictions are rebased when committing.
+        
+        Messages already in the active document's index, e.g. fetched again
+        by a catch-up, are left out. A batch that failed partway is the
+        exception: it is rendered in full again, so the commit resumes from
+        its checkpoint instead of starting a new batch.
+        """
+        if start_index is None:
+            start_index = self.tracker.insert_index if self.tracker.is_synced else 0
+        
+        # Identified by the submitted messages, before any are left out
+        batch_id = self._get_batch_id(messages)
+        checkpoint = self.state.get_batch_checkpoint(self.document_id) if self.state else None
+        
+        if checkpoint and checkpoint['batch_id'] == batch_id:
+            # Re-render with the original timestamp so chunks are identical
+            now = datetime.fromisoformat(checkpoint['created_at'])
+        else:
+            now = datetime.now()
+            fresh = [message for message in messages if self.index.get(message.channel_id, message.id) is None]
+            if len(fresh) < len(messages):
+                logger.info(f"Skipping {len(messages) - len(fresh)} messages already archived in {self.document_id}")
+                self.duplicates_skipped += len(messages) - len(fresh)
+            messages = fresh
+        
+        if not messages:
+            return PreparedBatch(messages, batch_id, now, start_index, [])
+        segments = self._create_batch_segments(messages, now, start_index)
+        chunks = self._chunk_segments(segments)
+        return PreparedBatch(messages, batch_id, now, start_index, chunks)
+    
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def write_batch(self, messages: List[MessageData]) -> bool:
-        """Write batch of messages with enhanced batch formatting."""
+    async def commit_batch(self, prepared: 'PreparedBatch') -> bool:
+        """Write a prepared batch.
+        
+        Oversized batches are split into several batchUpdates at message
+        boundaries. A checkpoint is stored after each chunk, so a retry of
+        the same batch resumes from the first chunk that did not commit.
+        Each chunk carries a commit marker, so a chunk whose reply was lost
+        is recognized instead of written twice, and committed batch IDs are
+        logged locally, so a batch submitted again is skipped without any
+        API calls.
+        """
         try:
-            # Get document
-            doc = self.service.documents().get(documentId=self.settings.google_doc_id).execute()
-            current_length = doc['body']['content'][-1]['endIndex']
-            
-            # Prepare batch header
-            now = datetime.now()
-            header = f"\n📦 BATCH UPDATE - {now.strftime('%Y-%m-%d %H:%M:%S')} - {len(messages)} messages\n"
-            header += "─" * 60 + "\n"
-            
-            all_requests = [
-                self._create_insert_request(header, current_length - 1)
-            ]
-            
-            # Format batch header
-            header_start = current_length - 1
-            header_end = header_start + len(header)
-            all_requests.append(self._create_format_request(
-                header_start,
-                header_end,
-                bold=True,
-                font_size=12,
-                color=self.COLORS['batch_header']
-            ))
-            
-            current_position = header_end
-            
-            # === PROCESS EACH MESSAGE ===
-            for i, message in enumerate(messages):
-                # Create formatted text and requests for this message
-                formatted_text, format_requests = self._create_formatted_message_requests(
-                    message, current_position
-                )
-                
-                # Add insert request
-                all_requests.append(self._create_insert_request(formatted_text, current_position))
-                
-                # Add formatting requests
-                all_requests.extend(format_requests)
-                
-                # Update position for next message
-                current_position += len(formatted_text)
-            
-            # === BATCH FOOTER ===
-            footer = f"\n{'─' * 60}\n✅ Batch completed at {now.strftime('%H:%M:%S')}\n\n"
-            all_requests.append(self._create_insert_request(footer, current_position))
-            
-            # Format footer
-            all_requests.append(self._create_format_request(
-                current_position,
-                current_position + len(footer),
-                italic=True,
-                font_size=10,
-                color=self.COLORS['batch_footer']
-            ))
-            
-            # Execute batch update
-            if all_requests:
-                try:
-                    result = self.service.documents().batchUpdate(
-                        documentId=self.settings.google_doc_id,
-                        body={'requests': all_requests}
-                    ).execute()
-                    logger.info(f"Written batch of {len(messages)} messages with enhanced formatting")
-                except HttpError as e:
-                    logger.error(f"Google Docs API error: {e}")
-                    # Fallback to simple text insertion without formatting
-                    fallback_requests = [self._create_insert_request(footer, current_position)]
-                    self.service.documents().batchUpdate(
-                        documentId=self.settings.google_doc_id,
-                        body={'requests': fallback_requests}
-                    ).execute()
-                    logger.info(f"Written batch of {len(messages)} messages without formatting (fallback)")
+            messages = prepared.messages
+            if not prepared.chunks:
+                logger.info("All messages of the batch are already archived")
+                return True
+            if self.state and prepared.batch_id in self.state.get_committed_batches(self.document_id):
+                logger.info(f"Batch {prepared.batch_id} was already committed, skipping")
+                self.duplicates_skipped += len(messages)
+                return True
+            
+            checkpoint = self.state.get_batch_checkpoint(self.document_id) if self.state else None
+            
+            committed = 0
+            if checkpoint and checkpoint['batch_id'] == prepared.batch_id:
+                committed = checkpoint['chunks_committed']
+                logger.info(f"Resuming batch {prepared.batch_id} from chunk {committed + 1}")
+            
+            chunks = prepared.chunks
+            if len(chunks) > 1:
+                logger.info(f"Splitting batch of {len(messages)} messages into {len(chunks)} chunks")
+            
+            formatted = True
+            for number in range(committed, len(chunks)):
+                commit_name = MessageIndex.commit_name(prepared.batch_id, number)
+                formatted = await self._write_chunk(chunks[number], commit_name) and formatted
+                if self.state and number + 1 < len(chunks):
+                    self.state.save_batch_checkpoint(self.document_id, {
+                        'batch_id': prepared.batch_id,
+                        'created_at': prepared.created_at.isoformat(),
+                        'chunks_committed': number + 1
+                    })
+            
+            if self.state:
+                self.state.clear_batch_checkpoint(self.document_id)
+                self.state.record_committed_batch(self.document_id, prepared.batch_id, self.tracker.revision_id)
+            
+            if formatted:
+                logger.info(f"Written batch of {len(messages)} messages with enhanced formatting")
+            else:
+                logger.info(f"Written batch of {len(messages)} messages without formatting (fallback)")
             
+            await self._maybe_rollover()
             return True
             
         except Exception as e:
             logger.error(f"Failed to write batch: {e}")
             raise GoogleDocsError(f"Batch write failed: {e}")
     
-    def test_connection(self) -> bool:
+    async def write_batch(self, messages: List[MessageData]) -> bool:
+        """Write batch of messages with enhanced batch formatting."""
+        return await self.commit_batch(self.prepare_batch(messages))
+    
+    async def test_connection(self) -> bool:
         """Test Google Docs connection with a simple test message."""
         try:
-            doc = self.service.documents().get(documentId=self.settings.google_doc_id).execute()
-            logger.info(f"Connected to document: {doc.get('title', 'Untitled')}")
-            
-            # Add a simple test message without formatting first
-            current_length = doc['body']['content'][-1]['endIndex']
-            insert_index = current_length - 1
-            
-            test_message = f"\n=== ARCHIVER TEST {datetime.now().strftime('%H:%M:%S')} ===\n"
-            
-            # Simple insert without formatting
-            request = self._create_insert_request(test_message, insert_index)
-            
-            # Execute test
-            self.service.documents().batchUpdate(
-                documentId=self.settings.google_doc_id,
-                body={'requests': [request]}
-            ).execute()
+            async with self._hold_lease():
+                doc = await self.transport.get_document(
+                    self.document_id,
+                    fields=f"title,{DocumentTracker.SYNC_FIELDS},{MessageIndex.SYNC_FIELDS}"
+                )
+                logger.info(f"Connected to document: {doc.get('title', 'Untitled')}")
+                
+                # Add a simple test message without formatting first
+                self.tracker.sync_from_document(doc)
+                self.index.sync_from_document(doc)
+                insert_index = self.tracker.insert_index
+                
+                test_message = f"\n=== ARCHIVER TEST {datetime.now().strftime('%H:%M:%S')} ===\n"
+                
+                # Simple insert without formatting
+                request = self._create_insert_request(test_message, insert_index)
+                
+                # Execute test
+                await self._execute_batch_update([request], test_message)
             
             logger.success("✅ Test connection successful - simple test message added")
             return True
@@ -533,3 +899,41 @@ class GoogleDocsWriter:
         except Exception as e:
             logger.error(f"Failed to connect to Google Doc: {e}")
             return False
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get rate limiter, request compaction, deferred styling and edit metrics."""
+        metrics = {
+            'requests_compacted': self.requests_compacted,
+            'styles_applied': self.styles_applied,
+            'styles_discarded': self.styles_discarded,
+            'styles_pending': self.pending_style_jobs(),
+            'edits_applied': self.edits_applied,
+            'duplicates_skipped': self.duplicates_skipped,
+            'revision_conflicts': self.revision_conflicts,
+            'lease_waits': self.lease.waits if self.lease else 0
+        }
+        quota = self.transport.get_quota_metrics() if self.transport else None
+        if quota:
+            metrics['quota'] = quota
+        return metrics
+    
+    def close(self) -> None:
+        """Release transport resources and finish the recording."""
+        if self.lease:
+            self.lease.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.transport:
+            self.transport.close()
+
+class PreparedBatch:
+    """A rendered batch waiting to be committed."""
+    
+    def __init__(self, messages: List[MessageData], batch_id: str, created_at: datetime,
+                 start_index: int, chunks: List[List[Segment]]):
+        self.messages = messages
+        self.batch_id = batch_id
+        self.created_at = created_at
+        self.start_index = start_index
+        self.chunks = chunks
+        self.units = chunks[-1][-1][1] - start_index if chunks else 0
@@ -0,0 +1,388 @@
+"""In-memory stand-in for the Google Docs API service.
+
+FakeDocsService exposes the same documents().get / batchUpdate / create
+call chain as a googleapiclient service, so it can be passed anywhere a
+real service is used (GoogleDocsWriter(service=...), DocsTransport
+service_factory). Requests are validated and applied to a local document
+model with UTF-16 indices, revisions, latency, per-minute quotas and
+payload limits, and errors are raised as HttpError like the real client.
+"""
+import copy
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import httplib2
+from googleapiclient.errors import HttpError
+
+# Request payload size accepted by the fake batchUpdate endpoint
+DEFAULT_MAX_PAYLOAD_BYTES = 10 * 1024 * 1024
+
+class FakeDocument:
+    """Body text, text styles and named ranges of one document.
+    
+    Text is stored as UTF-16-LE bytes, so every index is a UTF-16 code unit
+    exactly as in the Docs API. The body starts at index 1 and always ends
+    with a newline that cannot be deleted.
+    """
+    
+    def __init__(self, document_id: str, title: str = "Untitled", text: str = ""):
+        self.document_id = document_id
+        self.title = title
+        self.units = bytearray((text + "\n").encode('utf-16-le'))
+        self.styles: List[Tuple[int, int, Dict[str, Any]]] = []
+        self.named_ranges: Dict[str, Dict[str, Any]] = {}
+        self.revision = 1
+    
+    @property
+    def revision_id(self) -> str:
+        """Opaque revision ID of the current content."""
+        return f"{self.document_id}-rev{self.revision}"
+    
+    @property
+    def end_index(self) -> int:
+        """End index of the body, after the final newline."""
+        return len(self.units) // 2 + 1
+    
+    @property
+    def text(self) -> str:
+        """Body text including the final newline."""
+        return self.units.decode('utf-16-le')
+    
+    def text_at(self, start: int, end: int) -> str:
+        """Text of a UTF-16 range."""
+        return self.units[(start - 1) * 2:(end - 1) * 2].decode('utf-16-le')
+    
+    def styles_at(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """Text styles applied to ranges that overlap [start, end), oldest first."""
+        return [style for style_start, style_end, style in self.styles if style_start < end and start < style_end]
+    
+    def clone(self) -> 'FakeDocument':
+        """Copy the document so a batch can be applied all-or-nothing."""
+        clone = FakeDocument.__new__(FakeDocument)
+        clone.document_id = self.document_id
+        clone.title = self.title
+        clone.units = bytearray(self.units)
+        clone.styles = list(self.styles)
+        clone.named_ranges = copy.deepcopy(self.named_ranges)
+        clone.revision = self.revision
+        return clone
+    
+    def _splits_surrogate(self, index: int) -> bool:
+        """Check whether an index points between the halves of a surrogate pair."""
+        offset = (index - 1) * 2
+        if offset <= 0 or offset >= len(self.units):
+            return False
+        unit = int.from_bytes(self.units[offset:offset + 2], 'little')
+        return 0xDC00 <= unit <= 0xDFFF
+    
+    def _check_index(self, index: int, limit: int) -> Optional[str]:
+        """Validate an index; returns an API error message or None."""
+        if index < 1:
+            return f"Index {index} must be greater than or equal to 1."
+        if index > limit:
+            return f"Index {index} must be less than the end index of the referenced segment, {limit + 1}."
+        if self._splits_surrogate(index):
+            return f"The index {index} would split a surrogate pair."
+        return None
+    
+    def _check_range(self, range_: Dict[str, Any], limit: int) -> Optional[str]:
+        """Validate a range; returns an API error message or None."""
+        start, end = range_.get('startIndex'), range_.get('endIndex')
+        if start is None or end is None:
+            return "The range must have both startIndex and endIndex."
+        if start >= end:
+            return f"The range startIndex {start} must be less than the endIndex {end}."
+        return self._check_index(start, limit) or self._check_index(end, limit + 1)
+    
+    def _shift(self, index: int, delta: int) -> None:
+        """Move styles and named ranges after an insert (delta > 0) or delete (delta < 0) at index."""
+        def move(position: int, is_end: bool) -> int:
+            if delta > 0:
+                # Text inserted at the end of a range is not added to it
+                return position + delta if position > index or (position == index and not is_end) else position
+            return max(index, position + delta) if position > index else position
+        
+        styles = []
+        for start, end, style in self.styles:
+            start, end = move(start, False), move(end, True)
+            if start < end:
+                styles.append((start, end, style))
+        self.styles = styles
+        
+        for named in self.named_ranges.values():
+            ranges = []
+            for range_ in named['ranges']:
+                start, end = move(range_['startIndex'], False), move(range_['endIndex'], True)
+                if start < end:
+                    ranges.append({'startIndex': start, 'endIndex': end})
+            named['ranges'] = ranges
+    
+    def apply(self, request: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Apply one request.
+        
+        Returns:
+            Tuple of (error message or None, reply)
+        """
+        (kind, params), = request.items()
+        
+        if kind == 'insertText':
+            text = params.get('text', '')
+            if 'endOfSegmentLocation' in params:
+                index = self.end_index - 1
+            else:
+                index = params.get('location', {}).get('index', 0)
+                error = self._check_index(index, self.end_index - 1)
+                if error:
+                    return error, {}
+            encoded = text.encode('utf-16-le')
+            offset = (index - 1) * 2
+            self.units[offset:offset] = encoded
+            self._shift(index, len(encoded) // 2)
+            return None, {}
+        
+        if kind == 'updateTextStyle':
+            range_ = params.get('range', {})
+            error = self._check_range(range_, self.end_index - 1)
+            if error:
+                return error, {}
+            if not params.get('fields'):
+                return "The fields mask must be set.", {}
+            style = {key: params.get('textStyle', {}).get(key) for key in params['fields'].split(',')}
+            self.styles.append((range_['startIndex'], range_['endIndex'], style))
+            return None, {}
+        
+        if kind == 'deleteContentRange':
+            range_ = params.get('range', {})
+            # The final newline of the body cannot be deleted
+            error = self._check_range(range_, self.end_index - 2)
+            if error:
+                return error, {}
+            start, end = range_['startIndex'], range_['endIndex']
+            del self.units[(start - 1) * 2:(end - 1) * 2]
+            self._shift(start, start - end)
+            return None, {}
+        
+        if kind == 'createNamedRange':
+            range_ = params.get('range', {})
+            error = self._check_range(range_, self.end_index - 1)
+            if error:
+                return error, {}
+            named_range_id = f"kix.{uuid.uuid4().hex[:12]}"
+            self.named_ranges[named_range_id] = {
+                'namedRangeId': named_range_id,
+                'name': params['name'],
+                'ranges': [{'startIndex': range_['startIndex'], 'endIndex': range_['endIndex']}]
+            }
+            return None, {'createNamedRange': {'namedRangeId': named_range_id}}
+        
+        if kind == 'deleteNamedRange':
+            if 'namedRangeId' in params:
+                if params['namedRangeId'] not in self.named_ranges:
+                    return f"Named range {params['namedRangeId']} not found.", {}
+                del self.named_ranges[params['namedRangeId']]
+            else:
+                for named_range_id in [key for key, named in self.named_ranges.items() if named['name'] == params.get('name')]:
+                    del self.named_ranges[named_range_id]
+            return None, {}
+        
+        return f"Unsupported request: {kind}.", {}
+    
+    def to_resource(self) -> Dict[str, Any]:
+        """Render the document like documents().get does."""
+        content: List[Dict[str, Any]] = [{'endIndex': 1, 'sectionBreak': {}}]
+        position = 1
+        for line in self.text.split("\n")[:-1]:
+            line_end = position + len(line.encode('utf-16-le')) // 2 + 1
+            content.append({
+                'startIndex': position,
+                'endIndex': line_end,
+                'paragraph': {'elements': [{
+                    'startIndex': position,
+                    'endIndex': line_end,
+                    'textRun': {'content': line + "\n"}
+                }]}
+            })
+            position = line_end
+        
+        named_ranges: Dict[str, Dict[str, Any]] = {}
+        for named in self.named_ranges.values():
+            entry = named_ranges.setdefault(named['name'], {'name': named['name'], 'namedRanges': []})
+            entry['namedRanges'].append(copy.deepcopy(named))
+        
+        return {
+            'documentId': self.document_id,
+            'title': self.title,
+            'revisionId': self.revision_id,
+            'body': {'content': content},
+            'namedRanges': named_ranges
+        }
+
+class FakeRequest:
+    """Unexecuted call, mirroring googleapiclient's HttpRequest."""
+    
+    def __init__(self, call: Callable[[], Any]):
+        self._call = call
+    
+    def execute(self) -> Any:
+        """Run the call."""
+        return self._call()
+
+class FakeDocumentsResource:
+    """documents() resource of FakeDocsService."""
+    
+    def __init__(self, service: 'FakeDocsService'):
+        self._service = service
+    
+    def get(self, documentId: str, fields: Optional[str] = None) -> FakeRequest:
+        """Get a document; the field mask is accepted but not applied."""
+        return FakeRequest(lambda: self._service._get(documentId))
+    
+    def batchUpdate(self, documentId: str, body: Dict[str, Any]) -> FakeRequest:
+        """Apply requests atomically."""
+        return FakeRequest(lambda: self._service._batch_update(documentId, body))
+    
+    def create(self, body: Dict[str, Any]) -> FakeRequest:
+        """Create an empty document."""
+        return FakeRequest(lambda: self._service._create(body))
+
+class FakeDocsService:
+    """Thread-safe in-memory Google Docs service.
+    
+    Args:
+        latency: Seconds every call blocks, like a network round trip
+        jitter: Extra random latency up to this many seconds
+        read_quota_per_minute: Reads allowed per rolling minute (None is unlimited)
+        write_quota_per_minute: Writes allowed per rolling minute (None is unlimited)
+        max_payload_bytes: Largest accepted batchUpdate body
+        seed: Seed for the latency jitter
+    """
+    
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 read_quota_per_minute: Optional[int] = None,
+                 write_quota_per_minute: Optional[int] = None,
+                 max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.quotas = {'read': read_quota_per_minute, 'write': write_quota_per_minute}
+        self.max_payload_bytes = max_payload_bytes
+        self.documents_by_id: Dict[str, FakeDocument] = {}
+        self.calls = {'read': 0, 'write': 0, 'throttled': 0, 'rejected': 0}
+        self.batches: List[Dict[str, Any]] = []
+        self._windows: Dict[str, Deque[float]] = {'read': deque(), 'write': deque()}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def documents(self) -> FakeDocumentsResource:
+        """Return the documents() resource."""
+        return FakeDocumentsResource(self)
+    
+    def create_document(self, document_id: Optional[str] = None, text: str = "", title: str = "Untitled") -> FakeDocument:
+        """Add a document with initial body text."""
+        document_id = document_id or uuid.uuid4().hex
+        document = FakeDocument(document_id, title, text)
+        with self._lock:
+            self.documents_by_id[document_id] = document
+        return document
+    
+    def get_text(self, document_id: str) -> str:
+        """Body text of a document including the final newline."""
+        return self.documents_by_id[document_id].text
+    
+    def _error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> HttpError:
+        """Build an HttpError shaped like a Docs API error response."""
+        resp = httplib2.Response({'status': status, **(headers or {})})
+        content = json.dumps({'error': {'code': status, 'message': message}}).encode('utf-8')
+        return HttpError(resp, content, uri='https://docs.googleapis.com/v1/documents')
+    
+    def _wait(self) -> None:
+        """Simulate network latency outside the lock."""
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+    
+    def _take_quota(self, kind: str) -> None:
+        """Count a call against the rolling per-minute quota or raise 429."""
+        self.calls[kind] += 1
+        quota = self.quotas[kind]
+        if quota is None:
+            return
+        
+        now = time.monotonic()
+        window = self._windows[kind]
+        while window and window[0] <= now - 60:
+            window.popleft()
+        if len(window) >= quota:
+            self.calls['throttled'] += 1
+            retry_after = max(1, int(window[0] + 60 - now) + 1)
+            raise self._error(
+                429,
+                f"Quota exceeded for quota metric '{kind.title()} requests' and limit "
+                f"'{kind.title()} requests per minute per user'.",
+                {'retry-after': str(retry_after)}
+            )
+        window.append(now)
+    
+    def _document(self, document_id: str) -> FakeDocument:
+        """Look up a document or raise 404."""
+        document = self.documents_by_id.get(document_id)
+        if document is None:
+            raise self._error(404, "Requested entity was not found.")
+        return document
+    
+    def _get(self, document_id: str) -> Dict[str, Any]:
+        self._wait()
+        with self._lock:
+            self._take_quota('read')
+            return self._document(document_id).to_resource()
+    
+    def _create(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self._wait()
+        with self._lock:
+            self._take_quota('write')
+        document = self.create_document(title=body.get('title', "Untitled"))
+        return document.to_resource()
+    
+    def _batch_update(self, document_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        self._wait()
+        with self._lock:
+            self._take_quota('write')
+            document = self._document(document_id)
+            
+            size = len(json.dumps(body).encode('utf-8'))
+            if size > self.max_payload_bytes:
+                self.calls['rejected'] += 1
+                raise self._error(400, f"Request payload size exceeds the limit: {self.max_payload_bytes} bytes.")
+            
+            required = body.get('writeControl', {}).get('requiredRevisionId')
+            if required and required != document.revision_id:
+                self.calls['rejected'] += 1
+                raise self._error(
+                    400,
+                    f"The required revision ID '{required}' does not match the latest revision "
+                    f"'{document.revision_id}'."
+                )
+            
+            # Apply to a copy so a failing request leaves the document untouched
+            working = document.clone()
+            replies = []
+            for number, request in enumerate(body.get('requests', [])):
+                error, reply = working.apply(request)
+                if error:
+                    self.calls['rejected'] += 1
+                    kind = next(iter(request), 'request')
+                    raise self._error(400, f"Invalid requests[{number}].{kind}: {error}")
+                replies.append(reply)
+            
+            working.revision += 1
+            self.documents_by_id[document_id] = working
+            self.batches.append(body)
+            return {
+                'documentId': document_id,
+                'replies': replies,
+                'writeControl': {'requiredRevisionId': working.revision_id}
+            }
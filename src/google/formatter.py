@@ -2,6 +2,9 @@
 from typing import List
 from src.telegram.models import MessageData
 
+# Between formatted messages, also when they are streamed to a file
+MESSAGE_JOINER = "\n\n"
+
 def format_messages_for_gdocs(messages: List[MessageData]) -> str:
     """Format messages for Google Docs insertion."""
     if not messages:
@@ -11,4 +14,4 @@ def format_messages_for_gdocs(messages: List[MessageData]) -> str:
     for message in messages:
         formatted_parts.append(message.to_formatted_text())
     
-    return "\n\n".join(formatted_parts)
+    return MESSAGE_JOINER.join(formatted_parts)
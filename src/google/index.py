@@ -0,0 +1,180 @@
+"""Message-to-document offset index.
+
+Every archived message gets a named range in the document and an entry in a
+local persisted table, so a message can be found without reading the
+document. Named ranges are moved by Google Docs itself and are used to
+rebuild the table after edits made outside the archiver.
+
+Every written chunk also gets a commit marker range named after its batch,
+so a write whose reply was lost can be recognized in the document.
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from src.storage.state import StateManager
+
+class MessageIndex:
+    """Ranges of archived messages in one document, keyed by "channel_id:message_id"."""
+    
+    # Prefix of named range names created for messages
+    NAME_PREFIX = 'tg'
+    
+    # Prefix of commit markers, one per written chunk
+    COMMIT_PREFIX = 'tgc'
+    
+    # Field mask used when the index is rebuilt from the document
+    SYNC_FIELDS = 'namedRanges'
+    
+    def __init__(self, document_id: str, state: Optional[StateManager] = None):
+        self.document_id = document_id
+        self.state = state
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # Commit marker name -> start index, as last seen in the document
+        self.commits: Dict[str, int] = {}
+        # Keys changed since the last save; only these are written
+        self._changed: Set[str] = set()
+        if state:
+            self.entries = state.get_message_index(document_id)
+    
+    @staticmethod
+    def key(channel_id: int, message_id: int) -> str:
+        """Index key of a message."""
+        return f"{channel_id}:{message_id}"
+    
+    @classmethod
+    def range_name(cls, channel_id: int, message_id: int) -> str:
+        """Name of the named range created for a message."""
+        return f"{cls.NAME_PREFIX}:{channel_id}:{message_id}"
+    
+    @classmethod
+    def commit_name(cls, batch_id: str, chunk: int) -> str:
+        """Name of the commit marker of a batch's chunk."""
+        return f"{cls.COMMIT_PREFIX}:{batch_id}:{chunk}"
+    
+    @classmethod
+    def parse_range_name(cls, name: str) -> Optional[Tuple[int, int]]:
+        """Get (channel_id, message_id) from a named range name, None for foreign ranges."""
+        prefix, _, rest = name.partition(':')
+        channel_id, _, message_id = rest.rpartition(':')
+        if prefix != cls.NAME_PREFIX or not channel_id:
+            return None
+        try:
+            return int(channel_id), int(message_id)
+        except ValueError:
+            return None
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get(self, channel_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """Get the entry of a message: start, end and named_range_id."""
+        return self.entries.get(self.key(channel_id, message_id))
+    
+    def landed(self, commit_name: str) -> Optional[int]:
+        """Get where a chunk was written, None if its commit marker was not seen."""
+        return self.commits.get(commit_name)
+    
+    def record(self, channel_id: int, message_id: int, start: int, end: int,
+               named_range_id: Optional[str] = None) -> None:
+        """Record where a message was written."""
+        key = self.key(channel_id, message_id)
+        self.entries[key] = {
+            'start': start,
+            'end': end,
+            'named_range_id': named_range_id
+        }
+        self._changed.add(key)
+    
+    def remove(self, channel_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """Forget a message, returning its entry."""
+        key = self.key(channel_id, message_id)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._changed.add(key)
+        return entry
+    
+    def shift(self, index: int, delta: int) -> None:
+        """Move ranges after an insert (delta > 0) or delete (delta < 0) at index.
+        
+        Text inserted inside a range grows it, text inserted at its end does
+        not. Ranges that are deleted completely are dropped.
+        """
+        if not delta:
+            return
+        
+        def move(position: int, is_end: bool) -> int:
+            if delta > 0:
+                if position > index or (position == index and not is_end):
+                    return position + delta
+                return position
+            return max(index, position + delta) if position > index else position
+        
+        for key, entry in list(self.entries.items()):
+            if entry['end'] < index or (entry['end'] == index and delta > 0):
+                continue
+            start = move(entry['start'], False)
+            end = move(entry['end'], True)
+            if start >= end:
+                del self.entries[key]
+            else:
+                self.entries[key] = {**entry, 'start': start, 'end': end}
+            self._changed.add(key)
+    
+    def sync_from_document(self, document: Dict[str, Any]) -> None:
+        """Rebuild the index from the named ranges of a documents().get response."""
+        entries = {}
+        commits = {}
+        for name, group in document.get('namedRanges', {}).items():
+            if name.startswith(self.COMMIT_PREFIX + ':'):
+                ranges = [r for named in group.get('namedRanges', []) for r in named.get('ranges') or []]
+                if ranges:
+                    commits[name] = ranges[0]['startIndex']
+                continue
+            ids = self.parse_range_name(name)
+            if not ids:
+                continue
+            for named in group.get('namedRanges', []):
+                ranges = named.get('ranges') or []
+                if not ranges:
+                    continue
+                entries[self.key(*ids)] = {
+                    'start': ranges[0]['startIndex'],
+                    'end': ranges[-1]['endIndex'],
+                    'named_range_id': named.get('namedRangeId')
+                }
+        self._changed.update(key for key in set(self.entries) | set(entries) if self.entries.get(key) != entries.get(key))
+        self.entries = entries
+        self.commits = commits
+        self.save()
+        logger.debug(f"Rebuilt message index for {self.document_id}: {len(entries)} messages")
+    
+    def record_write(self, requests: List[Dict], reply: Dict[str, Any]) -> None:
+        """Record the message named ranges and commit markers created by a batchUpdate.
+        
+        Replies come back in request order, so the n-th createNamedRange
+        request gets the ID from the n-th createNamedRange reply.
+        """
+        named_range_ids = [
+            reply_item['createNamedRange'].get('namedRangeId')
+            for reply_item in reply.get('replies') or []
+            if reply_item and 'createNamedRange' in reply_item
+        ]
+        created = [request['createNamedRange'] for request in requests if 'createNamedRange' in request]
+        for number, params in enumerate(created):
+            if params['name'].startswith(self.COMMIT_PREFIX + ':'):
+                self.commits[params['name']] = params['range']['startIndex']
+                continue
+            ids = self.parse_range_name(params['name'])
+            if not ids:
+                continue
+            named_range_id = named_range_ids[number] if number < len(named_range_ids) else None
+            self.record(*ids, params['range']['startIndex'], params['range']['endIndex'], named_range_id)
+    
+    def save(self) -> None:
+        """Persist the entries changed since the last save."""
+        if not self.state or not self._changed:
+            return
+        self.state.set_message_index_entries(
+            self.document_id, {key: self.entries.get(key) for key in self._changed}
+        )
+        self._changed.clear()
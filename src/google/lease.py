@@ -0,0 +1,100 @@
+"""Per-document lease files shared by archiver processes on one host."""
+import asyncio
+import os
+import re
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from loguru import logger
+
+from src.google.tracker import DocumentTracker
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: concurrent writers rely on revision checks alone
+    fcntl = None
+
+class DocumentLease:
+    """Exclusive lease on one document for the span of a single write.
+    
+    Processes that write the same document (e.g. a backfill next to the
+    live daemon) take the lease only around reading the end of the document
+    and sending one batchUpdate, so rendering and writes to other documents
+    stay parallel. The lease is an flock, so a crashed holder releases it.
+    
+    The file holds the revision written by the last holder. A writer whose
+    tracked revision differs knows another process has written since and
+    re-reads the document instead of sending a write that would be rejected.
+    Writers elsewhere are still caught by requiredRevisionId.
+    """
+    
+    # First and longest wait between attempts to take a busy lease
+    POLL_SECONDS = 0.005
+    MAX_POLL_SECONDS = 0.05
+    
+    def __init__(self, directory: Path, document_id: str):
+        name = re.sub(r'[^\w.-]', '_', document_id)
+        self.path = Path(directory) / f"{name}.lease"
+        self.waits = 0
+        self._fd: Optional[int] = None
+    
+    def _open(self) -> int:
+        """Open the lease file once per writer."""
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+    
+    async def acquire(self) -> Optional[str]:
+        """Wait for the lease without blocking the event loop.
+        
+        Returns:
+            Revision written by the previous holder, None if unknown
+        """
+        if fcntl is None:
+            return None
+        fd = self._open()
+        delay = self.POLL_SECONDS
+        waited = False
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                waited = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.MAX_POLL_SECONDS)
+        if waited:
+            self.waits += 1
+        return os.pread(fd, 256, 0).decode('utf-8').strip() or None
+    
+    def release(self, revision_id: Optional[str]) -> None:
+        """Record the revision the holder left the document at and release the lease."""
+        if fcntl is None or self._fd is None:
+            return
+        try:
+            if revision_id:
+                data = revision_id.encode('utf-8')
+                os.pwrite(self._fd, data, 0)
+                os.ftruncate(self._fd, len(data))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+    
+    @asynccontextmanager
+    async def hold(self, tracker: DocumentTracker) -> AsyncIterator[None]:
+        """Hold the lease for one write, invalidating the tracker if another process wrote."""
+        revision_id = await self.acquire()
+        try:
+            if revision_id and tracker.revision_id and revision_id != tracker.revision_id:
+                logger.debug(f"Document {tracker.document_id} was written by another process, re-reading")
+                tracker.invalidate()
+            yield
+        finally:
+            self.release(tracker.revision_id)
+    
+    def close(self) -> None:
+        """Close the lease file."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
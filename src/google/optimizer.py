@@ -0,0 +1,148 @@
+"""Compaction pass for Google Docs batchUpdate requests."""
+from typing import List, Dict, Any, Tuple, Optional
+from loguru import logger
+
+from src.google.utf16 import utf16_len
+
+# How far back a style request may be merged into an earlier one
+MERGE_LOOKBACK = 16
+
+def _style_range(request: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Get (start, end) of an updateTextStyle request."""
+    style = request.get('updateTextStyle')
+    if not style or 'range' not in style:
+        return None
+    return style['range']['startIndex'], style['range']['endIndex']
+
+def _is_link(request: Dict[str, Any]) -> bool:
+    """Check whether a style request sets a link."""
+    return 'link' in request['updateTextStyle'].get('textStyle', {})
+
+def _overlaps(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+    """Check whether two half-open ranges share at least one index."""
+    return a[0] < b[1] and b[0] < a[1]
+
+def _same_style(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Check whether two style requests set the same fields to the same values."""
+    a_style, b_style = a['updateTextStyle'], b['updateTextStyle']
+    return a_style.get('fields') == b_style.get('fields') and a_style.get('textStyle') == b_style.get('textStyle')
+
+def _with_range(request: Dict[str, Any], start: int, end: int) -> Dict[str, Any]:
+    """Copy a style request with a new range."""
+    style = dict(request['updateTextStyle'])
+    style['range'] = {**style['range'], 'startIndex': start, 'endIndex': end}
+    return {'updateTextStyle': style}
+
+def _compact_styles(styles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop overlapping link styles and merge touching ranges with equal styles."""
+    result: List[Dict[str, Any]] = []
+    links: List[Tuple[int, int]] = []
+    
+    for request in styles:
+        current = _style_range(request)
+        
+        # A URL inside a Markdown link is matched twice; keep the first link only
+        if _is_link(request):
+            if any(_overlaps(current, link) for link in links):
+                continue
+            links.append(current)
+        
+        # Merge into an earlier equal style if nothing in between touches this range
+        merged = False
+        for pos in range(len(result) - 1, max(-1, len(result) - 1 - MERGE_LOOKBACK), -1):
+            candidate = result[pos]
+            candidate_range = _style_range(candidate)
+            if _same_style(candidate, request) and candidate_range[0] <= current[1] and current[0] <= candidate_range[1]:
+                result[pos] = _with_range(
+                    candidate,
+                    min(candidate_range[0], current[0]),
+                    max(candidate_range[1], current[1])
+                )
+                merged = True
+                break
+            if _overlaps(candidate_range, current):
+                break
+        
+        if not merged:
+            result.append(request)
+    
+    return result
+
+def compact_requests(requests: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """Compact a batchUpdate request list without changing its effect.
+    
+    - Contiguous insertText requests are merged into one insert. Style
+      requests that end at or before the next insertion point are moved
+      after the merged insert, which does not change the text they cover.
+    - Style requests with equal textStyle and fields and touching or
+      overlapping ranges are merged.
+    - Link styles that overlap an earlier link are dropped.
+    
+    Requests of any other type act as barriers and keep their position.
+    
+    Returns:
+        Tuple of (compacted_requests, number_of_requests_removed)
+    """
+    result: List[Dict[str, Any]] = []
+    pending_insert: Optional[Dict[str, Any]] = None
+    pending_end = 0
+    deferred: List[Dict[str, Any]] = []
+    
+    def flush() -> None:
+        nonlocal pending_insert
+        if pending_insert:
+            result.append(pending_insert)
+            pending_insert = None
+        result.extend(_compact_styles(deferred))
+        deferred.clear()
+    
+    for request in requests:
+        insert = request.get('insertText')
+        if insert and 'location' in insert:
+            index = insert['location']['index']
+            if (pending_insert and index == pending_end
+                    and all(_style_range(style)[1] <= index for style in deferred)):
+                pending_insert['insertText']['text'] += insert['text']
+                pending_end += utf16_len(insert['text'])
+                continue
+            
+            flush()
+            pending_insert = {
+                'insertText': {
+                    'location': dict(insert['location']),
+                    'text': insert['text']
+                }
+            }
+            pending_end = index + utf16_len(insert['text'])
+        elif _style_range(request):
+            deferred.append(request)
+        else:
+            flush()
+            result.append(request)
+    
+    flush()
+    
+    removed = len(requests) - len(result)
+    if removed:
+        logger.debug(f"Compacted batchUpdate from {len(requests)} to {len(result)} requests")
+    return result, removed
+
+def shift_requests(requests: List[Dict[str, Any]], delta: int) -> List[Dict[str, Any]]:
+    """Copy requests with all indices moved by delta."""
+    if not delta:
+        return list(requests)
+    
+    shifted = []
+    for request in requests:
+        (kind, params), = request.items()
+        params = dict(params)
+        if 'location' in params:
+            params['location'] = {**params['location'], 'index': params['location']['index'] + delta}
+        if 'range' in params:
+            params['range'] = {
+                **params['range'],
+                'startIndex': params['range']['startIndex'] + delta,
+                'endIndex': params['range']['endIndex'] + delta
+            }
+        shifted.append({kind: params})
+    return shifted
@@ -0,0 +1,261 @@
+"""Pool of Google Docs writers with one serialized actor per document."""
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from loguru import logger
+
+from src.config.settings import Settings
+from src.telegram.models import MessageData
+from src.storage.state import StateManager
+from src.google.docs_client import GoogleDocsWriter
+from src.google.ratelimit import DocsRateLimiter
+from src.exceptions.custom import GoogleDocsError
+
+class DocumentActor:
+    """Owns one document's writer and applies its batches strictly in order.
+    
+    Batches are rendered when they are submitted, using indices predicted
+    from the tracked end of the document plus everything already queued, so
+    building batch N+1 overlaps with batch N's batchUpdate. If a write fails
+    or the document changes, the queued batches are rebased at commit time.
+    Edits of archived messages go through the same queue, so they never
+    interleave with a batch write. When a batch fails, the batches queued
+    behind it fail without being written, so the caller can retry them in
+    order instead of finding them in the archive ahead of the failed one.
+    
+    With deferred styling the actor applies queued style jobs whenever it
+    has been idle for a while and the write quota has room to spare.
+    """
+    
+    # Unused share of the write burst required before styling in the background
+    STYLE_SPARE_FRACTION = 0.5
+    
+    def __init__(self, writer: GoogleDocsWriter, depth: int = 1):
+        self.writer = writer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        self._task: Optional[asyncio.Task] = None
+        self._submit_lock = asyncio.Lock()
+        self._predicted_end: Optional[int] = None
+        self._in_flight = 0
+        self._failed_batches = 0
+    
+    @property
+    def document_id(self) -> str:
+        """Document currently written by this actor (changes on rollover)."""
+        return self.writer.document_id
+    
+    def _ensure_started(self) -> None:
+        """Start the actor loop on first use."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def _predict_insert_index(self) -> Optional[int]:
+        """Predict where the next submitted batch will start."""
+        if self._predicted_end is None and self.writer.tracker.is_synced:
+            self._predicted_end = self.writer.tracker.end_index
+        if self._predicted_end is None:
+            return None
+        return self._predicted_end - 1
+    
+    async def _apply_styles(self) -> None:
+        """Apply one queued style job if the write quota is not busy."""
+        transport = self.writer.transport
+        if transport and not transport.has_spare(DocsRateLimiter.WRITE, self.STYLE_SPARE_FRACTION):
+            return
+        try:
+            await self.writer.apply_style_jobs()
+        except Exception as e:
+            logger.warning(f"Background styling failed for document {self.document_id}: {e}")
+    
+    async def _next_batch(self) -> Tuple[Callable[[], Awaitable[Any]], asyncio.Future, Optional[int]]:
+        """Wait for the next queued operation, styling in the background while idle."""
+        if not self.writer.settings.deferred_styling:
+            return await self.queue.get()
+        
+        while True:
+            try:
+                return await asyncio.wait_for(self.queue.get(), timeout=self.writer.settings.style_idle_seconds)
+            except asyncio.TimeoutError:
+                if self.writer.pending_style_jobs():
+                    await self._apply_styles()
+    
+    async def _run(self) -> None:
+        """Apply queued operations one at a time."""
+        while True:
+            operation, future, failed_batches = await self._next_batch()
+            superseded = failed_batches is not None and failed_batches != self._failed_batches
+            try:
+                if superseded:
+                    raise GoogleDocsError("Not written because a batch queued before it failed")
+                result = await operation()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if failed_batches is not None and not superseded:
+                    self._failed_batches += 1
+                # Later batches were predicted on top of this one; re-derive from the tracker
+                self._predicted_end = None
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._in_flight -= 1
+                if not self._in_flight:
+                    self._predicted_end = None
+                self.queue.task_done()
+    
+    async def enqueue(self, messages: List[MessageData]) -> asyncio.Future:
+        """Render a batch and queue it, waiting only while the pipeline is full.
+        
+        Returns:
+            Future resolved with the write result
+        """
+        self._ensure_started()
+        async with self._submit_lock:
+            start_index = self._predict_insert_index()
+            prepared = self.writer.prepare_batch(messages, start_index)
+            if start_index is not None:
+                self._predicted_end = start_index + 1 + prepared.units
+            
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight += 1
+            await self.queue.put((lambda: self.writer.commit_batch(prepared), future, self._failed_batches))
+        return future
+    
+    async def enqueue_edits(self, messages: List[MessageData],
+                            deleted: Optional[List[Tuple[int, int]]] = None) -> asyncio.Future:
+        """Queue in-place replacement of edited messages and removal of deleted ones.
+        
+        Returns:
+            Future resolved with the number of messages changed
+        """
+        self._ensure_started()
+        async with self._submit_lock:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight += 1
+            await self.queue.put((lambda: self.writer.replace_messages(messages, deleted), future, None))
+        return future
+    
+    async def submit(self, messages: List[MessageData]) -> bool:
+        """Queue a batch and wait until it is written."""
+        return await (await self.enqueue(messages))
+    
+    async def close(self) -> None:
+        """Stop the actor loop after pending batches are written."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self.queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+class WriterPool:
+    """Routes batches to per-document actors that write concurrently.
+    
+    All writers share one transport, so they share its worker threads,
+    credentials and rate limiter. Ordering and index state stay private to
+    each actor, so a slow or throttled document only delays its own queue.
+    Implements the SinkPool protocol.
+    """
+    
+    def __init__(self, settings: Settings, state: Optional[StateManager] = None, service: Optional[Any] = None):
+        self.settings = settings
+        self.state = state
+        self.actors: Dict[str, DocumentActor] = {}
+        
+        # The default document's writer owns the shared transport
+        default_writer = GoogleDocsWriter(settings, state, service=service)
+        self.transport = default_writer.transport
+        self.credentials_providers = default_writer.credentials_providers
+        self.recorder = default_writer.recorder
+        self.actors[settings.google_doc_id] = DocumentActor(default_writer, settings.pipeline_depth)
+    
+    def render_message(self, message: MessageData) -> Tuple[str, List[Dict[str, Any]], int]:
+        """Render a message as every document's writer would, caching it on the message."""
+        return self.actors[self.settings.google_doc_id].writer.render_message(message)
+    
+    def get_actor(self, document_id: str) -> DocumentActor:
+        """Get or create the actor for a document."""
+        actor = self.actors.get(document_id)
+        if actor is None:
+            writer = GoogleDocsWriter(self.settings, self.state, document_id=document_id,
+                                      transport=self.transport, recorder=self.recorder)
+            actor = DocumentActor(writer, self.settings.pipeline_depth)
+            self.actors[document_id] = actor
+            logger.info(f"Created writer for document {document_id}")
+        return actor
+    
+    async def submit_batch(self, document_id: str, messages: List[MessageData]) -> asyncio.Future:
+        """Render and queue a batch for a document without waiting for the write."""
+        return await self.get_actor(document_id).enqueue(messages)
+    
+    async def write_batch(self, document_id: str, messages: List[MessageData]) -> bool:
+        """Write a batch to a document through its actor."""
+        return await self.get_actor(document_id).submit(messages)
+    
+    async def replace_messages(self, document_id: str, messages: List[MessageData],
+                               deleted: Optional[List[Tuple[int, int]]] = None) -> int:
+        """Apply edits and deletions to a document through its actor."""
+        return await (await self.get_actor(document_id).enqueue_edits(messages, deleted))
+    
+    async def test_connection(self, document_ids: Optional[List[str]] = None) -> bool:
+        """Test every routed document concurrently."""
+        document_ids = document_ids or list(self.actors)
+        results = await asyncio.gather(*(
+            self.get_actor(document_id).writer.test_connection() for document_id in document_ids
+        ))
+        return all(results)
+    
+    def start(self, document_ids: Optional[List[str]] = None) -> None:
+        """Start actors ahead of the first batch so queued styles are applied."""
+        for document_id in document_ids or list(self.actors):
+            self.get_actor(document_id)._ensure_started()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get shared quota metrics and per-document compaction, edit, duplicate, conflict and styling counts."""
+        metrics: Dict[str, Any] = {
+            'requests_compacted': {
+                document_id: actor.writer.requests_compacted for document_id, actor in self.actors.items()
+            }
+        }
+        metrics['edits_applied'] = {
+            document_id: actor.writer.edits_applied for document_id, actor in self.actors.items()
+        }
+        metrics['duplicates_skipped'] = {
+            document_id: actor.writer.duplicates_skipped for document_id, actor in self.actors.items()
+        }
+        metrics['revision_conflicts'] = {
+            document_id: actor.writer.revision_conflicts for document_id, actor in self.actors.items()
+        }
+        if self.settings.deferred_styling:
+            metrics['styles'] = {
+                document_id: {
+                    'applied': actor.writer.styles_applied,
+                    'discarded': actor.writer.styles_discarded,
+                    'pending': actor.writer.pending_style_jobs()
+                }
+                for document_id, actor in self.actors.items()
+            }
+        quota = self.transport.get_quota_metrics() if self.transport else None
+        if quota:
+            metrics['quota'] = quota
+        if self.credentials_providers:
+            metrics['credentials'] = {
+                provider.name: provider.get_metrics() for provider in self.credentials_providers
+            }
+        return metrics
+    
+    async def close(self) -> None:
+        """Drain all actors and release their writers, the shared transport, recording and token refresh."""
+        await asyncio.gather(*(actor.close() for actor in self.actors.values()))
+        # Only once every actor is drained, as the default writer closes the shared transport
+        for actor in self.actors.values():
+            actor.writer.close()
+        if self.transport:
+            self.transport.close()
+        if self.recorder:
+            self.recorder.close()
+        for provider in self.credentials_providers:
+            provider.stop()
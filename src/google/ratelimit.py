@@ -0,0 +1,133 @@
+"""Token-bucket rate limiting for Google Docs API calls."""
+import asyncio
+import time
+from typing import Dict, Any, Optional
+from loguru import logger
+
+class TokenBucket:
+    """Async token bucket refilled continuously from a per-minute quota.
+    
+    The rate is halved when the API answers 429 and recovers additively on
+    success, so the bucket settles just below the quota actually granted.
+    """
+    
+    # Burst size as a fraction of the per-minute quota
+    BURST_FRACTION = 0.1
+    # Rate never drops below this fraction of the configured quota
+    MIN_RATE_FRACTION = 0.1
+    # Fraction of the configured rate recovered after each successful call
+    RECOVERY_FRACTION = 0.05
+    
+    def __init__(self, per_minute: int):
+        self.configured_rate = per_minute / 60.0
+        self.rate = self.configured_rate
+        self.capacity = max(1.0, per_minute * self.BURST_FRACTION)
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self, now: float) -> None:
+        """Add tokens accumulated since the last update."""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    async def acquire(self) -> float:
+        """Wait for a token.
+        
+        Returns:
+            Seconds spent waiting in the queue
+        """
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        return time.monotonic() - started
+    
+    def available(self) -> float:
+        """Tokens that can be spent right now without waiting."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return 0.0
+        self._refill(now)
+        return self.tokens
+    
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """Slow down after a 429 and pause for Retry-After if given."""
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = max(self.configured_rate * self.MIN_RATE_FRACTION, self.rate / 2)
+        self.tokens = 0.0
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self.blocked_until = max(self.blocked_until, now + pause)
+    
+    def reward(self) -> None:
+        """Recover rate after a successful call."""
+        if self.rate < self.configured_rate:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate * self.RECOVERY_FRACTION)
+
+class DocsRateLimiter:
+    """Shared limiter with separate read and write quotas."""
+    
+    READ = 'read'
+    WRITE = 'write'
+    
+    def __init__(self, reads_per_minute: int, writes_per_minute: int):
+        self.buckets = {
+            self.READ: TokenBucket(reads_per_minute),
+            self.WRITE: TokenBucket(writes_per_minute),
+        }
+        self._metrics = {
+            kind: {'calls': 0, 'throttled': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+            for kind in self.buckets
+        }
+    
+    async def acquire(self, kind: str) -> float:
+        """Wait until a call of the given kind is allowed."""
+        waited = await self.buckets[kind].acquire()
+        metrics = self._metrics[kind]
+        metrics['calls'] += 1
+        metrics['total_wait'] += waited
+        metrics['max_wait'] = max(metrics['max_wait'], waited)
+        if waited > 1:
+            logger.debug(f"Google Docs {kind} call waited {waited:.2f}s for quota")
+        return waited
+    
+    def has_spare(self, kind: str, fraction: float) -> bool:
+        """Check whether at least this fraction of the burst is unused."""
+        bucket = self.buckets[kind]
+        return bucket.available() >= max(1.0, bucket.capacity * fraction)
+    
+    def on_success(self, kind: str) -> None:
+        """Record a successful call."""
+        self.buckets[kind].reward()
+    
+    def on_throttled(self, kind: str, retry_after: Optional[float] = None) -> None:
+        """Record a 429 response."""
+        bucket = self.buckets[kind]
+        bucket.penalize(retry_after)
+        self._metrics[kind]['throttled'] += 1
+        logger.warning(
+            f"Google Docs {kind} quota exceeded, rate lowered to {bucket.rate * 60:.1f}/min"
+            + (f", retrying after {retry_after:.1f}s" if retry_after is not None else "")
+        )
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-kind call counts, throttles and queue wait times."""
+        result = {}
+        for kind, metrics in self._metrics.items():
+            calls = metrics['calls']
+            result[kind] = {
+                **metrics,
+                'avg_wait': metrics['total_wait'] / calls if calls else 0.0,
+                'rate_per_minute': self.buckets[kind].rate * 60,
+            }
+        return result
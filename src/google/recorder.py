@@ -0,0 +1,91 @@
+"""Recording of batchUpdate traffic for offline replay and profiling."""
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from loguru import logger
+
+class BatchRecorder:
+    """Appends every batchUpdate body with its timing and outcome to a gzip log.
+    
+    Each process writes its own file, so concurrent archivers never
+    interleave records. The stream is flushed at most once per
+    FLUSH_SECONDS to keep compression effective; records since the last
+    flush are lost if the process is killed. Recordings contain message
+    text, so keep them as private as the archive itself.
+    """
+    
+    FLUSH_SECONDS = 1.0
+    
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"batches-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+        self.records = 0
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+        self._last_flush = time.monotonic()
+        logger.info(f"Recording batchUpdate traffic to {self.path}")
+    
+    def record(self, document_id: str, body: Dict[str, Any], started: float, duration: float,
+               result: Optional[Dict[str, Any]] = None, status: int = 200,
+               error: Optional[str] = None, end_index: Optional[int] = None) -> None:
+        """Append one batchUpdate call.
+        
+        Args:
+            document_id: Document the body was sent to
+            body: Request body as sent, including writeControl
+            started: Wall-clock time the call started (seconds since the epoch)
+            duration: Seconds until the reply or error, including rate limiting
+            result: Response, of which only metadata is kept
+            status: HTTP status, 0 if no reply was received
+            error: Error message of a failed call
+            end_index: Tracked end of the document before the call, if known
+        """
+        if self._file is None:
+            return
+        record = {
+            'started': round(started, 6),
+            'duration': round(duration, 6),
+            'document_id': document_id,
+            'end_index': end_index,
+            'status': status,
+            'error': error,
+            'replies': len(result.get('replies') or []) if result else None,
+            'revision_id': (result.get('writeControl') or {}).get('requiredRevisionId') if result else None,
+            'body': body
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.records += 1
+        now = time.monotonic()
+        if now - self._last_flush >= self.FLUSH_SECONDS:
+            self._file.flush()
+            self._last_flush = now
+    
+    def close(self) -> None:
+        """Finish the gzip stream."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.debug(f"Recorded {self.records} batchUpdate calls to {self.path}")
+
+def read_recordings(paths: List[Path]) -> Iterator[Dict[str, Any]]:
+    """Read recorded calls from log files or directories of them, oldest file first.
+    
+    A log that is still being written ends without a gzip trailer; its
+    records up to the last flush are returned.
+    """
+    files: List[Path] = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("batches-*.jsonl.gz")) if path.is_dir() else [path])
+    
+    for path in files:
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as log:
+                for line in log:
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+        except EOFError:
+            logger.debug(f"Recording {path} is not closed, read up to its last flush")
@@ -0,0 +1,130 @@
+"""Replay of recorded batchUpdate traffic against a Docs service."""
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+from googleapiclient.errors import HttpError
+from loguru import logger
+
+from src.google.optimizer import shift_requests
+from src.google.tracker import DocumentTracker
+from src.google.transport import DocsTransport
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile in milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+class BatchReplayer:
+    """Sends recorded batchUpdate bodies again, in recorded order.
+    
+    Recorded indices point into the recorded documents. The requests of each
+    recorded document are moved by the difference between the target's end
+    and the recorded end before its first replayed write, so traffic recorded
+    against a large archive replays onto an empty document. Revision checks
+    are dropped, since the target has its own revisions.
+    
+    Calls that failed when recorded did not change the document and are
+    skipped unless include_failed is set, e.g. to reproduce a rejection.
+    """
+    
+    def __init__(self, transport: DocsTransport, document_id: Optional[str] = None,
+                 original_speed: bool = False, include_failed: bool = False):
+        """Create a replayer.
+        
+        Args:
+            transport: Transport of the service to replay against
+            document_id: Single target document; recorded document IDs when omitted
+            original_speed: Space calls as recorded instead of sending them back to back
+            include_failed: Also replay calls that failed when recorded
+        """
+        self.transport = transport
+        self.document_id = document_id
+        self.original_speed = original_speed
+        self.include_failed = include_failed
+        self.deltas: Dict[str, int] = {}
+        self.calls = 0
+        self.skipped = 0
+        self.failed = 0
+        self.status_mismatches = 0
+        self.requests = 0
+        self.statuses: Counter = Counter()
+        self.recorded_durations: List[float] = []
+        self.durations: List[float] = []
+        self.seconds = 0.0
+    
+    async def _get_delta(self, record: Dict[str, Any], target: str) -> int:
+        """Offset from recorded to target indices for the record's document."""
+        source = record['document_id']
+        if source not in self.deltas and record.get('end_index') is not None:
+            doc = await self.transport.get_document(target, fields=DocumentTracker.SYNC_FIELDS)
+            self.deltas[source] = doc['body']['content'][-1]['endIndex'] - record['end_index']
+        # Writes before the first one with a known end are assumed to line up
+        return self.deltas.get(source, 0)
+    
+    async def _send(self, record: Dict[str, Any]) -> None:
+        """Replay one recorded call."""
+        target = self.document_id or record['document_id']
+        requests = shift_requests(record['body']['requests'], await self._get_delta(record, target))
+        
+        started = time.perf_counter()
+        try:
+            await self.transport.batch_update(target, {'requests': requests})
+            status = 200
+        except HttpError as e:
+            status = e.resp.status
+            self.failed += 1
+            logger.warning(f"Replayed call to {target} failed with {status}: {e.reason}")
+        self.durations.append(time.perf_counter() - started)
+        self.recorded_durations.append(record['duration'])
+        
+        self.calls += 1
+        self.requests += len(requests)
+        self.statuses[status] += 1
+        if status != record['status']:
+            self.status_mismatches += 1
+    
+    async def replay(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Replay recorded calls one at a time.
+        
+        Returns:
+            Replay metrics, see get_metrics
+        """
+        clock = time.perf_counter()
+        first_started = None
+        for record in records:
+            if record['status'] != 200 and not self.include_failed:
+                self.skipped += 1
+                continue
+            
+            if self.original_speed:
+                if first_started is None:
+                    first_started = record['started']
+                delay = record['started'] - first_started - (time.perf_counter() - clock)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._send(record)
+        
+        self.seconds = time.perf_counter() - clock
+        return self.get_metrics()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get call counts, outcomes and recorded versus replayed latency."""
+        return {
+            'calls': self.calls,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'status_mismatches': self.status_mismatches,
+            'statuses': dict(self.statuses),
+            'requests': self.requests,
+            'seconds': round(self.seconds, 3),
+            'calls_per_second': round(self.calls / self.seconds, 1) if self.seconds else None,
+            'latency_ms': {
+                'recorded': {'p50': _percentile(self.recorded_durations, 0.5),
+                             'p95': _percentile(self.recorded_durations, 0.95)},
+                'replayed': {'p50': _percentile(self.durations, 0.5),
+                             'p95': _percentile(self.durations, 0.95)}
+            }
+        }
@@ -0,0 +1,114 @@
+"""Document rollover: shard the archive across several Google Docs."""
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+from loguru import logger
+
+from src.config.settings import Settings
+from src.storage.state import StateManager
+from src.google.ratelimit import DocsRateLimiter
+from src.google.transport import DocsTransport
+
+class DocumentFactory(ABC):
+    """Creates new archive documents."""
+    
+    @abstractmethod
+    async def create_document(self, title: str, template_text: str) -> str:
+        """Create a document seeded with template text and return its ID."""
+
+class DocsDocumentFactory(DocumentFactory):
+    """Creates documents through the Google Docs API."""
+    
+    def __init__(self, transport: DocsTransport):
+        self.transport = transport
+    
+    async def create_document(self, title: str, template_text: str) -> str:
+        """Create a document seeded with template text and return its ID."""
+        doc = await self.transport.execute(
+            lambda service: service.documents().create(body={'title': title}),
+            kind=DocsRateLimiter.WRITE
+        )
+        document_id = doc['documentId']
+        
+        if template_text:
+            await self.transport.batch_update(document_id, {'requests': [{
+                'insertText': {'location': {'index': 1}, 'text': template_text}
+            }]})
+        
+        return document_id
+
+class RolloverManager:
+    """Tracks the ordered list of archive documents and switches to a new one by size.
+    
+    The first document is the configured root document. The list is kept in
+    the state database and the new document becomes active only after the
+    updated list has been stored.
+    """
+    
+    def __init__(self, settings: Settings, state: StateManager, factory: DocumentFactory,
+                 root_document_id: Optional[str] = None):
+        self.settings = settings
+        self.state = state
+        self.factory = factory
+        self.root_document_id = root_document_id or settings.google_doc_id
+        
+        self.documents = self.state.get_document_index(self.root_document_id)
+        if not self.documents:
+            self.documents = [{
+                'document_id': self.root_document_id,
+                'number': 1,
+                'created_at': datetime.now().isoformat()
+            }]
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether any rollover threshold is configured."""
+        return bool(self.settings.rollover_max_chars or self.settings.rollover_max_words)
+    
+    @property
+    def active_document_id(self) -> str:
+        """Document new content is written to."""
+        return self.documents[-1]['document_id']
+    
+    def get_documents(self) -> List[Dict[str, Any]]:
+        """Get archive documents in order."""
+        return list(self.documents)
+    
+    def needs_rollover(self, chars: Optional[int], words: int = 0) -> bool:
+        """Check whether the active document crossed a size threshold."""
+        if self.settings.rollover_max_chars and chars is not None and chars >= self.settings.rollover_max_chars:
+            return True
+        if self.settings.rollover_max_words and words >= self.settings.rollover_max_words:
+            return True
+        return False
+    
+    async def rollover(self) -> str:
+        """Create the next document and make it active.
+        
+        Returns:
+            ID of the new active document
+        """
+        previous_id = self.active_document_id
+        number = self.documents[-1]['number'] + 1
+        now = datetime.now()
+        fields = {
+            'number': number,
+            'previous_id': previous_id,
+            'date': now.strftime('%Y-%m-%d'),
+        }
+        
+        title = self.settings.rollover_title_template.format(**fields)
+        template_text = self.settings.rollover_template_text.format(**fields)
+        document_id = await self.factory.create_document(title, template_text)
+        
+        documents = self.documents + [{
+            'document_id': document_id,
+            'number': number,
+            'title': title,
+            'created_at': now.isoformat()
+        }]
+        self.state.set_document_index(self.root_document_id, documents)
+        self.documents = documents
+        
+        logger.info(f"Rolled over from document {previous_id} to {document_id} ({title})")
+        return document_id
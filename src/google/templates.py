@@ -0,0 +1,231 @@
+"""Compiled render templates for archived messages.
+
+A message is rendered from a fixed layout that only depends on its shape:
+whether it is forwarded, has media, text, links and so on. Each shape is
+compiled once into static text, UTF-16 widths and style request bodies,
+so rendering a message only fills in and measures the variable slices.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from src.config.constants import DATE_FORMAT, MESSAGE_SEPARATOR
+from src.google.utf16 import utf16_len, utf16_offsets
+from src.telegram.models import MessageData
+from src.utils.links import extract_links
+
+class MessageShape(NamedTuple):
+    """Layout-relevant features of a message."""
+    
+    forwarded: bool
+    has_original_date: bool
+    has_media: bool
+    has_caption: bool
+    has_text: bool
+    has_link: bool
+    has_forward_link: bool
+    
+    @classmethod
+    def of(cls, message: MessageData) -> 'MessageShape':
+        """Get the shape of a message."""
+        forwarded = bool(message.forward_from_channel_name)
+        has_link = bool(message.original_link)
+        return cls(
+            forwarded=forwarded,
+            has_original_date=forwarded and bool(message.forward_original_date),
+            has_media=bool(message.has_media),
+            has_caption=bool(message.has_media and message.media_caption),
+            has_text=bool(message.text),
+            has_link=has_link,
+            has_forward_link=has_link and bool(message.forward_original_link),
+        )
+
+class TemplateLine(NamedTuple):
+    """One line of a template: a format string with named slots and how it is styled."""
+    
+    fmt: str
+    slots: Tuple[str, ...]
+    static_width: int
+    style: Optional[str]
+
+# Line styles: text style body and field mask, keyed by name
+STYLE_SPECS = {
+    'header': {'bold': True, 'font_size': 12, 'color': 'header'},
+    'forward': {'italic': True, 'color': 'forward'},
+    'date': {'italic': True, 'font_size': 10, 'color': 'date'},
+    'media': {'bold': True, 'color': 'media'},
+}
+
+# Lines styled as links to a message attribute
+LINK_STYLES = {
+    'original_link': "🔗 View in Telegram",
+    'forward_original_link': "🔗 View Original",
+}
+
+def validate_color(color: Dict) -> Dict:
+    """Normalize RGB values to 0.0..1.0 (ints are read as 0..255)."""
+    validated = {}
+    for component in ['red', 'green', 'blue']:
+        if component in color:
+            value = color[component]
+            if isinstance(value, int):
+                value = max(0.0, min(1.0, value / 255.0))
+            else:
+                value = max(0.0, min(1.0, float(value)))
+            validated[component] = value
+    return validated
+
+def _line(fmt: str, slots: Tuple[str, ...] = (), style: Optional[str] = None) -> TemplateLine:
+    """Compile a line, measuring its static text once."""
+    static_text = fmt.format_map({slot: "" for slot in slots})
+    return TemplateLine(fmt, slots, utf16_len(static_text), style)
+
+def compile_template(shape: MessageShape) -> List[TemplateLine]:
+    """Build the line layout for a message shape."""
+    source_emoji = "🔄" if shape.forwarded else "📢"
+    lines = [_line(f"{{date}} | {source_emoji} {{source}}", ('date', 'source'), 'header')]
+    
+    if shape.forwarded:
+        lines.append(_line("↪️ Forwarded from: {forward_name}", ('forward_name',), 'forward'))
+        if shape.has_original_date:
+            lines.append(_line("📆 Original: {original_date}", ('original_date',), 'date'))
+    
+    # Empty line before content
+    lines.append(_line(""))
+    
+    if shape.has_media:
+        if shape.has_caption:
+            lines.append(_line("{media_label}: {caption}", ('media_label', 'caption'), 'media'))
+        else:
+            lines.append(_line("{media_label}", ('media_label',), 'media'))
+    
+    if shape.has_text:
+        lines.append(_line("{text}", ('text',), 'text_links'))
+    
+    if shape.has_link:
+        lines.append(_line(""))
+        lines.append(_line(LINK_STYLES['original_link'], style='original_link'))
+        if shape.has_forward_link:
+            lines.append(_line(LINK_STYLES['forward_original_link'], style='forward_original_link'))
+    
+    # Separator
+    lines.append(_line(""))
+    lines.append(_line(MESSAGE_SEPARATOR))
+    lines.append(_line(""))
+    return lines
+
+class MessageTemplates:
+    """Renders messages into text and style requests from per-shape compiled templates.
+    
+    Style bodies are built once with validated colors and shared between
+    the requests created from them, so they must be treated as read-only.
+    """
+    
+    def __init__(self, colors: Dict[str, Dict[str, float]], media_emojis: Dict[str, str]):
+        self.media_emojis = media_emojis
+        self.templates: Dict[MessageShape, List[TemplateLine]] = {}
+        self.styles = {
+            name: self._compile_style(colors[spec['color']], spec.get('bold', False),
+                                      spec.get('italic', False), spec.get('font_size'))
+            for name, spec in STYLE_SPECS.items()
+        }
+        self.link_color = {'color': {'rgbColor': validate_color(colors['link'])}}
+    
+    def _compile_style(self, color: Dict, bold: bool, italic: bool,
+                       font_size: Optional[int]) -> Tuple[Dict[str, Any], str]:
+        """Build a text style body and its field mask."""
+        text_style: Dict[str, Any] = {}
+        fields = []
+        if bold:
+            text_style['bold'] = True
+            fields.append('bold')
+        if italic:
+            text_style['italic'] = True
+            fields.append('italic')
+        if font_size:
+            text_style['fontSize'] = {'magnitude': font_size, 'unit': 'PT'}
+            fields.append('fontSize')
+        text_style['foregroundColor'] = {'color': {'rgbColor': validate_color(color)}}
+        fields.append('foregroundColor')
+        return text_style, ','.join(fields)
+    
+    def get_template(self, shape: MessageShape) -> List[TemplateLine]:
+        """Get the compiled template for a shape, compiling it on first use."""
+        template = self.templates.get(shape)
+        if template is None:
+            template = compile_template(shape)
+            self.templates[shape] = template
+        return template
+    
+    def _link_request(self, start: int, end: int, url: str) -> Dict[str, Any]:
+        return {
+            'updateTextStyle': {
+                'range': {'startIndex': start, 'endIndex': end},
+                'textStyle': {'link': {'url': url}, 'foregroundColor': self.link_color},
+                'fields': 'link,foregroundColor'
+            }
+        }
+    
+    def _slot_values(self, message: MessageData, shape: MessageShape) -> Dict[str, str]:
+        """Variable slices of a message."""
+        values = {
+            'date': message.date.strftime(DATE_FORMAT),
+            'source': message.forward_from_channel_name or message.channel_name or "Unknown",
+        }
+        if shape.forwarded:
+            values['forward_name'] = message.forward_from_channel_name
+            if shape.has_original_date:
+                values['original_date'] = message.forward_original_date.strftime(DATE_FORMAT)
+        if shape.has_media:
+            values['media_label'] = f"{self.media_emojis.get(message.media_type, '📎')} {message.media_type}"
+            if shape.has_caption:
+                values['caption'] = message.media_caption
+        if shape.has_text:
+            values['text'] = message.text
+        return values
+    
+    def render(self, message: MessageData, start_index: int) -> Tuple[str, List[Dict], int]:
+        """Render a message placed at start_index.
+        
+        Returns:
+            Tuple of (formatted_text, list_of_requests, end_index)
+        """
+        shape = MessageShape.of(message)
+        values = self._slot_values(message, shape)
+        
+        texts = []
+        requests = []
+        position = start_index
+        for line in self.get_template(shape):
+            if line.slots:
+                text = line.fmt.format_map(values)
+                width = line.static_width + sum(utf16_len(values[slot]) for slot in line.slots)
+            else:
+                text = line.fmt
+                width = line.static_width
+            
+            style = line.style
+            if style in self.styles:
+                text_style, fields = self.styles[style]
+                requests.append({
+                    'updateTextStyle': {
+                        'range': {'startIndex': position, 'endIndex': position + width},
+                        'textStyle': text_style,
+                        'fields': fields
+                    }
+                })
+            elif style == 'text_links':
+                links = extract_links(text)
+                offsets = utf16_offsets(text, [offset for _, start, end in links for offset in (start, end)])
+                for number, (url, _, _) in enumerate(links):
+                    requests.append(self._link_request(
+                        position + offsets[2 * number],
+                        position + offsets[2 * number + 1],
+                        url
+                    ))
+            elif style is not None:
+                requests.append(self._link_request(position, position + width, getattr(message, style)))
+            
+            texts.append(text)
+            position += width + 1
+        
+        # No newline after the last line
+        return "\n".join(texts), requests, position - 1
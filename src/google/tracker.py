@@ -0,0 +1,101 @@
+"""Local tracking of Google Docs document length and revision."""
+from typing import Optional, Dict, Any
+from datetime import datetime
+from loguru import logger
+
+from src.storage.state import StateManager
+from src.google.utf16 import utf16_len
+
+class DocumentTracker:
+    """Keeps a persisted local copy of a document's end index and revision ID.
+    
+    The end index is advanced from the text we insert ourselves, and the revision
+    ID is taken from each batchUpdate reply. Edits made outside the archiver are
+    caught by sending the revision as writeControl.requiredRevisionId.
+    """
+    
+    # Narrow field mask used when the document has to be re-read
+    SYNC_FIELDS = 'revisionId,body.content(endIndex)'
+    
+    def __init__(self, document_id: str, state: Optional[StateManager] = None):
+        self.document_id = document_id
+        self.state = state
+        self.end_index: Optional[int] = None
+        self.revision_id: Optional[str] = None
+        # Words written by the archiver; not re-read from the document
+        self.words = 0
+        self._load()
+    
+    def _load(self) -> None:
+        """Load tracked values from persistent state."""
+        if not self.state:
+            return
+        
+        data = self.state.get_document_state(self.document_id)
+        if data:
+            self.end_index = data.get('end_index')
+            self.revision_id = data.get('revision_id')
+            self.words = data.get('words', 0)
+            logger.debug(f"Loaded document state for {self.document_id}: end index {self.end_index}")
+    
+    def _save(self) -> None:
+        """Persist tracked values."""
+        if not self.state:
+            return
+        
+        self.state.set_document_state(self.document_id, {
+            'end_index': self.end_index,
+            'revision_id': self.revision_id,
+            'words': self.words,
+            'updated_at': datetime.now().isoformat()
+        })
+    
+    @property
+    def is_synced(self) -> bool:
+        """Whether the end index is known without reading the document."""
+        return self.end_index is not None
+    
+    @property
+    def insert_index(self) -> int:
+        """Index where new content is appended (before the final newline)."""
+        if self.end_index is None:
+            raise ValueError(f"Document {self.document_id} is not synced")
+        return self.end_index - 1
+    
+    def write_control(self) -> Optional[Dict[str, Any]]:
+        """Build writeControl for the next batchUpdate."""
+        if not self.revision_id:
+            return None
+        return {'requiredRevisionId': self.revision_id}
+    
+    def sync_from_document(self, document: Dict[str, Any]) -> None:
+        """Update tracked values from a documents().get response."""
+        content = document['body']['content']
+        self.end_index = content[-1]['endIndex']
+        self.revision_id = document.get('revisionId')
+        self._save()
+        logger.debug(f"Synced document {self.document_id}: end index {self.end_index}")
+    
+    def apply_write(self, reply: Dict[str, Any], inserted_text: str, units: Optional[int] = None) -> None:
+        """Advance tracked values after a successful batchUpdate.
+        
+        Args:
+            reply: batchUpdate response
+            inserted_text: Text appended by the update
+            units: UTF-16 length of inserted_text when the caller already knows it
+        """
+        self.words += len(inserted_text.split())
+        if self.end_index is None:
+            self._save()
+            return
+        
+        self.end_index += units if units is not None else utf16_len(inserted_text)
+        self.revision_id = reply.get('writeControl', {}).get('requiredRevisionId')
+        self._save()
+    
+    def invalidate(self) -> None:
+        """Forget tracked values so the next write re-reads the document."""
+        self.end_index = None
+        self.revision_id = None
+        self._save()
+        logger.debug(f"Invalidated document state for {self.document_id}")
@@ -0,0 +1,164 @@
+"""Non-blocking transport for Google Docs API calls."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
+from loguru import logger
+
+from src.google.ratelimit import DocsRateLimiter
+from src.google.discovery import build_docs_service
+
+class Identity:
+    """A Google account the archiver can call the API as, with its own quota."""
+    
+    def __init__(self, name: str, credentials: Any, limiter: Optional[DocsRateLimiter] = None,
+                 service_factory: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.credentials = credentials
+        self.limiter = limiter
+        self.service_factory = service_factory or self._build_service
+        self.calls = 0
+    
+    def _build_service(self) -> Any:
+        """Build a Docs service with a dedicated HTTP connection."""
+        http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+        return build_docs_service(http)
+
+class DocsTransport:
+    """Runs blocking googleapiclient calls in a bounded thread pool.
+    
+    httplib2 is not thread-safe, so every worker thread builds its own
+    service with its own pooled connection and reuses it for later calls.
+    Every call first takes a token from a rate limiter; 429 answers are fed
+    back to the limiter and retried here instead of surfacing to the
+    caller's generic retry.
+    
+    With several identities, each call goes out as the identity with the
+    most unused quota of its kind, so throughput adds up across identities.
+    """
+    
+    # Extra attempts for a call rejected with 429
+    MAX_THROTTLE_RETRIES = 5
+    
+    def __init__(self, credentials: Any, max_workers: int = 4,
+                 service_factory: Optional[Callable[[], Any]] = None,
+                 limiter: Optional[DocsRateLimiter] = None,
+                 identities: Optional[List[Identity]] = None):
+        self.credentials = credentials
+        self.max_workers = max_workers
+        self.identities = identities or [Identity('default', credentials, limiter, service_factory)]
+        self.limiter = self.identities[0].limiter
+        self._next_identity = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gdocs')
+        self._local = threading.local()
+    
+    def _get_service(self, identity: Identity) -> Any:
+        """Get the service owned by the current worker thread for an identity."""
+        services = getattr(self._local, 'services', None)
+        if services is None:
+            services = self._local.services = {}
+        service = services.get(identity.name)
+        if service is None:
+            service = identity.service_factory()
+            services[identity.name] = service
+            logger.debug(f"Created Google Docs service for {identity.name} in {threading.current_thread().name}")
+        return service
+    
+    def _execute(self, build_request: Callable[[Any], Any], identity: Identity) -> Any:
+        """Build and execute a request in the current worker thread."""
+        return build_request(self._get_service(identity)).execute()
+    
+    def _choose_identity(self, kind: str) -> Identity:
+        """Pick the identity with the most unused quota, rotating between equals."""
+        if len(self.identities) == 1:
+            return self.identities[0]
+        
+        count = len(self.identities)
+        order = [self.identities[(self._next_identity + offset) % count] for offset in range(count)]
+        identity = max(order, key=lambda candidate: candidate.limiter.buckets[kind].available() if candidate.limiter else 0.0)
+        self._next_identity = (self.identities.index(identity) + 1) % count
+        return identity
+    
+    def has_spare(self, kind: str, fraction: float) -> bool:
+        """Check whether any identity has at least this fraction of its burst unused."""
+        return any(
+            identity.limiter is None or identity.limiter.has_spare(kind, fraction)
+            for identity in self.identities
+        )
+    
+    def get_quota_metrics(self) -> Optional[Dict[str, Any]]:
+        """Get rate limiter metrics, per identity when there are several."""
+        if len(self.identities) == 1:
+            return self.limiter.get_metrics() if self.limiter else None
+        return {
+            identity.name: {
+                'calls': identity.calls,
+                **(identity.limiter.get_metrics() if identity.limiter else {})
+            }
+            for identity in self.identities
+        }
+    
+    def _get_retry_after(self, error: HttpError) -> Optional[float]:
+        """Parse the Retry-After header of a 429 response."""
+        value = error.resp.get('retry-after') if error.resp else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+    
+    async def execute(self, build_request: Callable[[Any], Any], kind: str = DocsRateLimiter.READ) -> Any:
+        """Execute a request without blocking the event loop.
+        
+        Args:
+            build_request: Callable that takes a Docs service and returns an
+                unexecuted googleapiclient request.
+            kind: Quota the call counts against (read or write).
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.MAX_THROTTLE_RETRIES + 1):
+            identity = self._choose_identity(kind)
+            limiter = identity.limiter
+            if limiter:
+                await limiter.acquire(kind)
+            identity.calls += 1
+            try:
+                result = await loop.run_in_executor(self._executor, self._execute, build_request, identity)
+            except HttpError as e:
+                if e.resp.status != 429 or not limiter or attempt == self.MAX_THROTTLE_RETRIES:
+                    raise
+                limiter.on_throttled(kind, self._get_retry_after(e))
+                continue
+            if limiter:
+                limiter.on_success(kind)
+            return result
+    
+    async def get_document(self, document_id: str, fields: Optional[str] = None) -> Dict[str, Any]:
+        """Get a document, optionally restricted by a field mask."""
+        return await self.execute(
+            lambda service: service.documents().get(documentId=document_id, fields=fields),
+            kind=DocsRateLimiter.READ
+        )
+    
+    async def batch_update(self, document_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply a batchUpdate body to a document."""
+        return await self.execute(
+            lambda service: service.documents().batchUpdate(documentId=document_id, body=body),
+            kind=DocsRateLimiter.WRITE
+        )
+    
+    def close(self) -> None:
+        """Cancel queued calls and join the worker threads once running calls return."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        logger.debug("Google Docs transport closed")
@@ -0,0 +1,48 @@
+"""UTF-16 helpers for Google Docs index arithmetic.
+
+Docs indices count UTF-16 code units, while Python strings count code
+points. Characters outside the Basic Multilingual Plane (most emoji) take
+two units, so every position sent to the API goes through this module.
+"""
+import re
+from bisect import bisect_left
+from typing import List, Tuple
+
+# Characters that take a surrogate pair in UTF-16
+_ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+
+def utf16_len(text: str) -> int:
+    """Length of text in UTF-16 code units, the unit Google Docs indices count in."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+def utf16_lens(parts: List[str]) -> List[int]:
+    """UTF-16 lengths of several strings, skipping the encoding when all are ASCII."""
+    if "".join(parts).isascii():
+        return [len(part) for part in parts]
+    return [utf16_len(part) for part in parts]
+
+def line_spans(lines: List[str], start: int) -> Tuple[List[Tuple[int, int]], int]:
+    """Positions of lines joined with "\\n" and inserted at start.
+    
+    Returns:
+        Tuple of ((start, end) per line, end of the joined text)
+    """
+    spans = []
+    position = start
+    for width in utf16_lens(lines):
+        spans.append((position, position + width))
+        position += width + 1
+    # No newline after the last line
+    return spans, position - 1 if lines else start
+
+def utf16_offsets(text: str, offsets: List[int]) -> List[int]:
+    """Convert code point offsets in text to UTF-16 offsets."""
+    if text.isascii():
+        return list(offsets)
+    astral = [match.start() for match in _ASTRAL.finditer(text)]
+    if not astral:
+        return list(offsets)
+    # Each astral character before an offset adds one extra unit
+    return [offset + bisect_left(astral, offset) for offset in offsets]
@@ -1,8 +1,9 @@
 """Main application entry point."""
 import asyncio
+import json
 import signal
 import sys
-from typing import Optional
+from typing import Optional, List, Tuple, Dict, Any, Iterator
 from pathlib import Path
 from loguru import logger
 import click
@@ -10,7 +11,17 @@ import click
 from src.config.settings import Settings
 from src.telegram.client import TelegramClient
 from src.telegram.models import MessageData  
+from src.telegram.edits import EditDebouncer
+from src.google.pool import WriterPool
 from src.google.docs_client import GoogleDocsWriter
+from src.google.fake import FakeDocsService
+from src.google.recorder import read_recordings
+from src.google.replay import BatchReplayer
+from src.google.transport import DocsTransport
+from src.sinks.base import SinkPool
+from src.sinks.budget import BatchBudget
+from src.sinks.fanout import SinkFanOut
+from src.sinks.local import LocalSinkPool
 from src.storage.state import StateManager
 from src.utils.logger import setup_logging
 from src.utils.decorators import measure_time
@@ -32,10 +43,15 @@ class TelegramToGDocsArchiver:
             # Initialize components
             self.state = StateManager(self.settings.state_db_path)
             self.telegram = TelegramClient(self.settings)
-            self.gdocs = GoogleDocsWriter(self.settings)
+            self.routes = self.settings.get_routes()
+            self.fanout = SinkFanOut(self._create_sinks(), self.state)
+            self.edits = EditDebouncer(self.settings.edit_debounce_seconds, self.apply_edits)
             
-            # Message buffer
-            self.message_buffer = []
+            # Message buffers per channel, flushed when any batch budget is reached
+            self.message_buffers = {}
+            gdocs = self.fanout.sinks.get('gdocs')
+            self.budget = BatchBudget(self.settings, gdocs.render_message if gdocs else None)
+            self._flush_locks = {}
             self.running = False
             self._shutdown_event = asyncio.Event()
             
@@ -47,6 +63,17 @@ class TelegramToGDocsArchiver:
             logger.error(f"Failed to initialize archiver: {e}")
             raise ArchiverError(f"Initialization failed: {e}")
     
+    def _create_sinks(self) -> Dict[str, SinkPool]:
+        """Create the configured archive sinks."""
+        sinks: Dict[str, SinkPool] = {}
+        for name in self.settings.archive_sinks:
+            if name == 'local':
+                logger.info(f"Archiving to local files in {self.settings.local_sink_path}")
+                sinks[name] = LocalSinkPool(self.settings)
+            else:
+                sinks[name] = WriterPool(self.settings, self.state)
+        return sinks
+    
     def _handle_shutdown(self, signum, frame):
         """Handle shutdown signal."""
         logger.info(f"Received signal {signum}, shutting down...")
@@ -56,55 +83,127 @@ class TelegramToGDocsArchiver:
     async def process_message(self, message: MessageData) -> None:
         """Process a single message."""
         try:
-            logger.debug(f"Processing message {message.id}")
+            logger.debug(f"Processing message {message.id} from channel {message.channel_id}")
             
-            # Add to buffer
-            self.message_buffer.append(message)
+            # Add to the channel's buffer
+            self.message_buffers.setdefault(message.channel_id, []).append(message)
+            self.budget.add(message.channel_id, message)
             
-            # Check if we should flush
-            if len(self.message_buffer) >= self.settings.batch_size:
-                await self.flush_buffer()
+            # Check if we should flush; the write continues in the background
+            if self.budget.is_full(message.channel_id):
+                await self.flush_channel(message.channel_id, wait=False)
                 
         except Exception as e:
             logger.error(f"Failed to process message {message.id}: {e}")
     
-    @measure_time
-    async def flush_buffer(self) -> None:
-        """Flush message buffer to Google Docs."""
-        if not self.message_buffer:
-            return
+    def _replace_buffered(self, channel_id: int, message_id: int, message: Optional[MessageData]) -> bool:
+        """Update or drop a message that has not been flushed yet.
         
+        Returns:
+            True if the message was still in its channel's buffer
+        """
+        buffer = self.message_buffers.get(channel_id, [])
+        for position, buffered in enumerate(buffer):
+            if buffered.id == message_id:
+                self.budget.remove(channel_id, buffered)
+                if message is None:
+                    del buffer[position]
+                else:
+                    buffer[position] = message
+                    self.budget.add(channel_id, message)
+                return True
+        return False
+    
+    async def process_edit(self, message: MessageData) -> None:
+        """Process an edited message."""
         try:
-            logger.info(f"Flushing buffer with {len(self.message_buffer)} messages")
+            logger.debug(f"Message {message.id} edited in channel {message.channel_id}")
+            if not self._replace_buffered(message.channel_id, message.id, message):
+                self.edits.add_edit(message)
+        except Exception as e:
+            logger.error(f"Failed to process edit of message {message.id}: {e}")
+    
+    async def process_delete(self, channel_id: int, message_ids: List[int]) -> None:
+        """Process messages deleted from a channel."""
+        for message_id in message_ids:
+            logger.debug(f"Message {message_id} deleted in channel {channel_id}")
+            if not self._replace_buffered(channel_id, message_id, None):
+                self.edits.add_delete(channel_id, message_id)
+    
+    async def apply_edits(self, messages: List[MessageData], deleted: List[Tuple[int, int]]) -> None:
+        """Queue debounced edits and deletions for every sink, one change set per channel."""
+        by_channel = {}
+        for message in messages:
+            by_channel.setdefault(message.channel_id, ([], []))[0].append(message)
+        for channel_id, message_id in deleted:
+            by_channel.setdefault(channel_id, ([], []))[1].append((channel_id, message_id))
+        
+        for channel_id, (channel_messages, channel_deleted) in by_channel.items():
+            document_id = self.routes.get(channel_id, self.settings.google_doc_id)
+            await self.fanout.replace_messages(channel_id, document_id, channel_messages, channel_deleted)
+    
+    def _save_pending(self) -> None:
+        """Persist all unflushed messages so they survive a restart."""
+        pending = [message for buffer in self.message_buffers.values() for message in buffer]
+        if pending:
+            self.state.save_pending_batch(pending)
+        else:
+            self.state.clear_pending_batch()
+    
+    async def flush_channel(self, channel_id: int, wait: bool = True) -> None:
+        """Flush one channel's buffer to every archive sink.
+        
+        The batch is journaled under the channel lock, which makes it
+        durable; each sink then writes it in the background at its own pace.
+        
+        Args:
+            channel_id: Channel whose buffer is flushed
+            wait: Wait until every sink has written the channel's batches
+                (or is waiting to retry a failed one)
+        """
+        lock = self._flush_locks.setdefault(channel_id, asyncio.Lock())
+        async with lock:
+            if not self.message_buffers.get(channel_id):
+                return
             
-            # Write to Google Docs
-            success = await self.gdocs.write_batch(self.message_buffer)
+            # Take the batch out of the buffer so intake keeps going while it is written
+            batch = self.message_buffers[channel_id]
+            self.message_buffers[channel_id] = []
+            usage = self.budget.get_usage(channel_id)
+            self.budget.reset(channel_id)
+            document_id = self.routes.get(channel_id, self.settings.google_doc_id)
             
-            if success:
-                # Update state
-                last_message = self.message_buffer[-1]
-                self.state.set_last_message_id(
-                    self.settings.telegram_channel_id,
-                    last_message.id
-                )
-                
-                # Update stats
-                self.state.update_stats(processed=len(self.message_buffer))
-                
-                # Clear buffer
-                self.message_buffer.clear()
-                self.state.clear_pending_batch()
-                
-                logger.info("Buffer flushed successfully")
-            else:
-                # Save to pending for retry
-                self.state.save_pending_batch(self.message_buffer)
-                logger.warning("Failed to flush buffer, saved to pending")
-                
-        except Exception as e:
-            logger.error(f"Error flushing buffer: {e}")
-            self.state.save_pending_batch(self.message_buffer)
-            self.state.update_stats(error=True)
+            try:
+                logger.info(f"Flushing {len(batch)} messages ({usage['chars']} chars, {usage['requests']} requests) "
+                            f"from channel {channel_id} to document {document_id}")
+                await self.fanout.publish(channel_id, document_id, batch)
+            except Exception as e:
+                logger.error(f"Error flushing buffer for channel {channel_id}: {e}")
+                self.message_buffers[channel_id] = batch + self.message_buffers[channel_id]
+                self.budget.reset(channel_id, self.message_buffers[channel_id])
+                self._save_pending()
+                self.state.update_stats(error=True)
+                return
+            
+            # Journaled batches are delivered by the sinks, also after a restart
+            self.state.set_last_message_id(channel_id, batch[-1].id)
+            self.state.update_stats(processed=len(batch))
+            self._save_pending()
+        
+        if wait:
+            await self.fanout.flush([channel_id])
+    
+    @measure_time
+    async def flush_buffer(self) -> None:
+        """Flush all channel buffers and wait for the sinks to write them."""
+        channel_ids = [channel_id for channel_id, buffer in self.message_buffers.items() if buffer]
+        if channel_ids:
+            await asyncio.gather(*(self.flush_channel(channel_id, wait=False) for channel_id in channel_ids))
+        await self.fanout.flush()
+    
+    def _buffered_count(self) -> int:
+        """Number of messages waiting in all buffers."""
+        return sum(len(buffer) for buffer in self.message_buffers.values())
     
     async def process_pending(self) -> None:
         """Process pending messages from previous run."""
@@ -113,38 +212,45 @@ class TelegramToGDocsArchiver:
             logger.info(f"Found {len(pending)} pending messages from previous run")
             
             # Convert back to MessageData objects
-            self.message_buffer = [MessageData(**msg) for msg in pending]
+            for msg in pending:
+                message = MessageData(**msg)
+                self.message_buffers.setdefault(message.channel_id, []).append(message)
+                self.budget.add(message.channel_id, message)
             
             # Try to flush
             await self.flush_buffer()
     
-    async def catch_up(self) -> None:
-        """Catch up on missed messages."""
+    async def catch_up_channel(self, channel_id: int) -> None:
+        """Catch up on missed messages in one channel."""
         try:
-            last_id = self.state.get_last_message_id(self.settings.telegram_channel_id)
+            last_id = self.state.get_last_message_id(channel_id)
             
             if last_id:
-                logger.info(f"Catching up from message ID {last_id}")
+                logger.info(f"Catching up channel {channel_id} from message ID {last_id}")
                 
                 # Get missed messages
                 messages = await self.telegram.get_messages_batch(
-                    self.settings.telegram_channel_id,
+                    channel_id,
                     limit=100,
                     min_id=last_id
                 )
                 
                 if messages:
-                    logger.info(f"Found {len(messages)} missed messages")
+                    logger.info(f"Found {len(messages)} missed messages in channel {channel_id}")
                     for msg in reversed(messages):  # Process in chronological order
                         await self.process_message(msg)
                     
-                    # Flush any remaining
-                    await self.flush_buffer()
+                    # Flush any remaining and wait for the sinks to write the channel's batches
+                    await self.flush_channel(channel_id)
             else:
-                logger.info("No previous message ID found, starting fresh")
+                logger.info(f"No previous message ID found for channel {channel_id}, starting fresh")
                 
         except Exception as e:
-            logger.error(f"Failed to catch up: {e}")
+            logger.error(f"Failed to catch up channel {channel_id}: {e}")
+    
+    async def catch_up(self) -> None:
+        """Catch up on missed messages in all routed channels."""
+        await asyncio.gather(*(self.catch_up_channel(channel_id) for channel_id in self.routes))
     
     async def periodic_flush(self) -> None:
         """Periodically flush buffer."""
@@ -158,8 +264,8 @@ class TelegramToGDocsArchiver:
                 break  # Shutdown signal received
             except asyncio.TimeoutError:
                 # Normal timeout, continue with flush
-                if self.message_buffer:
-                    logger.debug(f"Periodic flush triggered, {len(self.message_buffer)} messages in buffer")
+                if self._buffered_count():
+                    logger.debug(f"Periodic flush triggered, {self._buffered_count()} messages in buffers")
                     await self.flush_buffer()
     
     async def run(self) -> None:
@@ -168,9 +274,10 @@ class TelegramToGDocsArchiver:
             self.running = True
             logger.info("Starting archiver...")
             
-            # Test Google Docs connection
-            if not self.gdocs.test_connection():
-                raise ArchiverError("Failed to connect to Google Docs")
+            # Test archive connections; sinks that are down catch up from the journal later
+            if not await self.fanout.test_connection(list(self.routes.values())):
+                raise ArchiverError("Failed to connect to any archive sink")
+            self.fanout.start(self.routes)
             
             # Start Telegram client
             await self.telegram.start()
@@ -185,13 +292,15 @@ class TelegramToGDocsArchiver:
             flush_task = asyncio.create_task(self.periodic_flush())
             
             # Listen for new messages with timeout
-            logger.info(f"Listening to channel {self.settings.telegram_channel_id}")
+            logger.info(f"Listening to channels {list(self.routes)}")
             
             # Create a task for listening to messages
             listen_task = asyncio.create_task(
                 self.telegram.listen_channel(
-                    self.settings.telegram_channel_id,
-                    self.process_message
+                    list(self.routes),
+                    self.process_message,
+                    on_edit=self.process_edit if self.settings.sync_edits else None,
+                    on_delete=self.process_delete if self.settings.sync_edits else None
                 )
             )
             
@@ -220,21 +329,32 @@ class TelegramToGDocsArchiver:
         logger.info("Cleaning up...")
         
         # Final flush
-        if self.message_buffer:
-            logger.info(f"Final flush of {len(self.message_buffer)} messages")
+        if self._buffered_count():
+            logger.info(f"Final flush of {self._buffered_count()} messages")
             await self.flush_buffer()
         
+        # Apply edits still waiting for their debounce
+        if self.edits.pending:
+            logger.info(f"Applying {len(self.edits.pending)} pending edits")
+        await self.edits.close()
+        
+        logger.info(f"Archive metrics: {self.fanout.get_metrics()}")
+        
         # Stop components
         await self.telegram.stop()
+        await self.fanout.close()
         self.state.close()
         
         logger.info("Cleanup completed")
 
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option('--debug', is_flag=True, help='Enable debug mode')
 @click.option('--test', is_flag=True, help='Test connections and exit')
-def main(debug: bool, test: bool):
+@click.pass_context
+def main(ctx: click.Context, debug: bool, test: bool):
     """Telegram to Google Docs Archiver."""
+    if ctx.invoked_subcommand is not None:
+        return
     try:
         # Create archiver
         archiver = TelegramToGDocsArchiver()
@@ -243,11 +363,12 @@ def main(debug: bool, test: bool):
             # Test mode
             logger.info("Running in test mode")
             
-            # Test Google Docs
-            if archiver.gdocs.test_connection():
-                logger.success("✓ Google Docs connection successful")
-            else:
-                logger.error("✗ Google Docs connection failed")
+            # Test archive sinks
+            for name, sink in archiver.fanout.sinks.items():
+                if asyncio.run(sink.test_connection(list(archiver.routes.values()))):
+                    logger.success(f"✓ Archive sink {name} connection successful")
+                else:
+                    logger.error(f"✗ Archive sink {name} connection failed")
             
             # Show stats
             stats = archiver.state.get_stats()
@@ -264,5 +385,55 @@ def main(debug: bool, test: bool):
         logger.error(f"Fatal error: {e}")
         sys.exit(1)
 
+@main.command()
+@click.argument('recordings', nargs=-1, required=True, type=click.Path(exists=True, path_type=Path))
+@click.option('--target', type=click.Choice(['fake', 'gdocs']), default='fake', show_default=True,
+              help='Replay against an in-process fake or the real Docs API')
+@click.option('--document-id', help='Document to replay into; required with --target gdocs')
+@click.option('--speed', type=click.Choice(['max', 'original']), default='max', show_default=True,
+              help='Send calls back to back or spaced as recorded')
+@click.option('--include-failed', is_flag=True, help='Also replay calls that failed when recorded')
+@click.option('--latency', type=float, default=0.0, show_default=True,
+              help='Simulated round trip of the fake service in seconds')
+def replay(recordings: Tuple[Path, ...], target: str, document_id: Optional[str], speed: str,
+           include_failed: bool, latency: float):
+    """Replay recorded batchUpdate traffic (RECORD_BATCHES_PATH) for profiling."""
+    records: Iterator[Dict[str, Any]] = read_recordings(list(recordings))
+    writer: Optional[GoogleDocsWriter] = None
+    if target == 'gdocs':
+        if not document_id:
+            raise click.UsageError("--document-id is required with --target gdocs; never replay into the archive")
+        # Replayed calls are not recorded again
+        settings = Settings().model_copy(update={'record_batches_path': None})
+        writer = GoogleDocsWriter(settings, document_id=document_id)
+        transport = writer.transport
+    else:
+        service = FakeDocsService(latency=latency)
+        transport = DocsTransport(None, 1, service_factory=lambda: service)
+        records = _with_fake_documents(service, records, document_id)
+    
+    replayer = BatchReplayer(transport, document_id, original_speed=speed == 'original',
+                             include_failed=include_failed)
+    try:
+        metrics = asyncio.run(replayer.replay(records))
+    finally:
+        if writer is not None:
+            # Released like WriterPool.close: lease, transport and token refresh threads
+            writer.close()
+            for provider in writer.credentials_providers:
+                provider.stop()
+        else:
+            transport.close()
+    click.echo(json.dumps(metrics, indent=2))
+
+def _with_fake_documents(service: FakeDocsService, records: Iterator[Dict[str, Any]],
+                         document_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Create each target document in the fake service before its first record."""
+    for record in records:
+        target = document_id or record['document_id']
+        if target not in service.documents_by_id:
+            service.create_document(target)
+        yield record
+
 if __name__ == "__main__":
     main()
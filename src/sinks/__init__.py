@@ -0,0 +1 @@
+"""Archive sinks package."""
@@ -0,0 +1,63 @@
+"""Interfaces shared by archive sinks."""
+import asyncio
+from typing import Any, Dict, List, Optional, Protocol, Tuple, runtime_checkable
+
+from src.telegram.models import MessageData
+
+@runtime_checkable
+class Sink(Protocol):
+    """One archive stream that messages are appended to, e.g. a Google Doc."""
+    
+    async def write_batch(self, messages: List[MessageData]) -> bool:
+        """Append a batch of messages in order."""
+        ...
+    
+    async def replace_messages(self, messages: List[MessageData],
+                               deleted: Optional[List[Tuple[int, int]]] = None) -> int:
+        """Apply edits of archived messages and deletions; returns how many changed."""
+        ...
+    
+    async def test_connection(self) -> bool:
+        """Check that the archive can be written."""
+        ...
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get counters for logging at shutdown."""
+        ...
+    
+    def close(self) -> None:
+        """Flush and release resources."""
+        ...
+
+@runtime_checkable
+class SinkPool(Protocol):
+    """Routes batches to the sink of each archive, as the application uses them."""
+    
+    async def submit_batch(self, document_id: str, messages: List[MessageData]) -> asyncio.Future:
+        """Queue a batch and get a future resolved once it is written.
+        
+        Batches are written in submission order. If one fails, the batches
+        queued behind it must fail too rather than be written ahead of it.
+        """
+        ...
+    
+    async def replace_messages(self, document_id: str, messages: List[MessageData],
+                               deleted: Optional[List[Tuple[int, int]]] = None) -> int:
+        """Apply edits and deletions to one archive."""
+        ...
+    
+    async def test_connection(self, document_ids: Optional[List[str]] = None) -> bool:
+        """Check every archive."""
+        ...
+    
+    def start(self, document_ids: Optional[List[str]] = None) -> None:
+        """Start background work ahead of the first batch."""
+        ...
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get counters for logging at shutdown."""
+        ...
+    
+    async def close(self) -> None:
+        """Finish pending writes and release resources."""
+        ...
@@ -0,0 +1,85 @@
+"""Flush budgets for buffered messages, measured on their rendered form."""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.telegram.models import MessageData
+
+# Renders a message into (text, requests, UTF-16 units), e.g. WriterPool.render_message
+Render = Callable[[MessageData], Tuple[str, List[Dict[str, Any]], int]]
+
+# Requests a message adds besides its text styles: the insert and its named range
+FIXED_REQUESTS_PER_MESSAGE = 2
+
+class BatchBudget:
+    """Tracks how big each channel's buffer is and when it should be flushed.
+    
+    Message count alone is a poor proxy for payload size: five long posts can
+    outweigh fifty one-liners. Every buffered message is rendered once by
+    the render callable, which caches the result on the message for the
+    write, and the buffer is full as soon as its message count, characters,
+    UTF-16 code units or Docs requests reach a limit. A single message over
+    a size limit is flushed on its own. Without a render callable (no Docs
+    sink) only the message count applies.
+    """
+    
+    def __init__(self, settings: Any, render: Optional[Render] = None):
+        self.max_messages = settings.batch_size
+        self.max_chars = settings.batch_max_chars
+        self.max_units = settings.batch_max_utf16_units
+        self.max_requests = settings.batch_max_requests
+        self.render = render
+        # channel ID -> [messages, chars, units, requests]
+        self.usage: Dict[int, List[int]] = {}
+    
+    @property
+    def measures_size(self) -> bool:
+        """Whether any size limit is enabled, which is when messages are rendered."""
+        return self.render is not None and bool(self.max_chars or self.max_units or self.max_requests)
+    
+    def measure(self, message: MessageData) -> Tuple[int, int, int]:
+        """Rendered size of a message.
+        
+        Returns:
+            Tuple of (characters, utf16_units, requests)
+        """
+        if not self.measures_size:
+            return 0, 0, 0
+        text, requests, units = self.render(message)
+        return len(text), units, len(requests) + FIXED_REQUESTS_PER_MESSAGE
+    
+    def _update(self, channel_id: int, message: MessageData, sign: int) -> None:
+        """Add a message's size to a channel's usage, or subtract it with sign -1."""
+        usage = self.usage.setdefault(channel_id, [0, 0, 0, 0])
+        chars, units, requests = self.measure(message)
+        usage[0] += sign
+        usage[1] += sign * chars
+        usage[2] += sign * units
+        usage[3] += sign * requests
+    
+    def add(self, channel_id: int, message: MessageData) -> None:
+        """Count a message added to a channel's buffer."""
+        self._update(channel_id, message, 1)
+    
+    def remove(self, channel_id: int, message: MessageData) -> None:
+        """Stop counting a message that left the buffer, e.g. deleted before the flush."""
+        self._update(channel_id, message, -1)
+    
+    def reset(self, channel_id: int, messages: Iterable[MessageData] = ()) -> None:
+        """Recount a channel's buffer, empty after a flush."""
+        self.usage[channel_id] = [0, 0, 0, 0]
+        for message in messages:
+            self.add(channel_id, message)
+    
+    def is_full(self, channel_id: int) -> bool:
+        """Check whether a channel's buffer reached any of the limits."""
+        messages, chars, units, requests = self.usage.get(channel_id, [0, 0, 0, 0])
+        return (
+            messages >= self.max_messages
+            or bool(self.max_chars and chars >= self.max_chars)
+            or bool(self.max_units and units >= self.max_units)
+            or bool(self.max_requests and requests >= self.max_requests)
+        )
+    
+    def get_usage(self, channel_id: int) -> Dict[str, int]:
+        """Get the buffered size of a channel."""
+        messages, chars, units, requests = self.usage.get(channel_id, [0, 0, 0, 0])
+        return {'messages': messages, 'chars': chars, 'utf16_units': units, 'requests': requests}
@@ -0,0 +1,312 @@
+"""Fan-out of journaled batches to several archive sinks."""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from src.exceptions.custom import ArchiverError
+from src.sinks.base import SinkPool
+from src.storage.state import StateManager
+from src.telegram.models import MessageData
+
+class SinkLane:
+    """Delivers one channel's journaled batches to one sink at the sink's own pace.
+    
+    The lane reads batches from the journal after its persisted cursor, so a
+    sink that is slow, failing or newly added catches up on its own without
+    holding back the others. Batches are submitted without waiting for the
+    previous write; the sink's queue limit is the backpressure. A failed
+    batch pauses the lane and is retried with exponential backoff, and the
+    cursor only moves past batches written without gaps.
+    
+    After a failure nothing new is submitted: the failed batch and the ones
+    that came back failed behind it are retried one at a time, each after
+    the previous one is written, so the sink receives them in journal order.
+    
+    Edits are applied once every batch journaled before them is written, so
+    they never reach a sink ahead of the message they change.
+    """
+    
+    # Backoff after a failed batch, doubled on every consecutive failure
+    RETRY_BASE_SECONDS = 1.0
+    RETRY_MAX_SECONDS = 60.0
+    
+    def __init__(self, name: str, sink: SinkPool, channel_id: int, document_id: str,
+                 state: StateManager, on_advance: Callable[[int], None],
+                 published: Optional[Dict[int, List[MessageData]]] = None):
+        self.name = name
+        self.sink = sink
+        self.channel_id = channel_id
+        self.document_id = document_id
+        self.state = state
+        self.on_advance = on_advance
+        # Recently published batches, shared by the channel's lanes
+        self.published = published if published is not None else {}
+        cursor = state.get_sink_cursor(name, channel_id)
+        # A new sink starts with the batches the other sinks have not written yet
+        self.cursor = cursor if cursor is not None else state.get_journal_tail(channel_id) - 1
+        self.delivered = 0
+        self.failures = 0
+        self._next = self.cursor + 1
+        self._written = set()
+        self._retry: List[int] = []
+        self._retry_at = 0.0
+        # Earliest failed batch; later batches wait until it is written
+        self._blocked_on: Optional[int] = None
+        self._consecutive_failures = 0
+        self._in_flight = 0
+        self._edits: List[Tuple[int, List[MessageData], List[Tuple[int, int]]]] = []
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def lag(self) -> int:
+        """Journaled batches this sink has not written yet."""
+        return self.state.get_journal_head(self.channel_id) - self.cursor
+    
+    def start(self) -> None:
+        """Start delivering on first use."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def notify(self) -> None:
+        """Wake the lane after a batch or edit was added."""
+        self._idle.clear()
+        self._wakeup.set()
+    
+    def add_edits(self, messages: List[MessageData], deleted: List[Tuple[int, int]]) -> None:
+        """Apply edits after every batch journaled so far."""
+        self._edits.append((self.state.get_journal_head(self.channel_id), messages, deleted))
+        self.notify()
+    
+    def _take(self) -> Optional[int]:
+        """Next batch to submit, None while waiting for a retry or new batches."""
+        if self._blocked_on is not None:
+            if self._blocked_on not in self._retry or time.monotonic() < self._retry_at:
+                # In flight or backing off; nothing after it may go first
+                return None
+            self._retry.remove(self._blocked_on)
+            return self._blocked_on
+        if self._next <= self.state.get_journal_head(self.channel_id):
+            self._next += 1
+            return self._next - 1
+        return None
+    
+    def _mark_written(self, sequence: int) -> None:
+        """Record a written batch and move the cursor past the batches written without gaps."""
+        self._written.add(sequence)
+        self._consecutive_failures = 0
+        self.delivered += 1
+        if sequence == self._blocked_on:
+            self._blocked_on = self._retry[0] if self._retry else None
+        
+        cursor = self.cursor
+        while cursor + 1 in self._written:
+            cursor += 1
+            self._written.discard(cursor)
+        if cursor != self.cursor:
+            self.cursor = cursor
+            self.state.set_sink_cursor(self.name, self.channel_id, cursor)
+            self.on_advance(self.channel_id)
+    
+    def _fail(self, sequence: int, error: Exception) -> None:
+        """Pause the lane and schedule the batch for a retry."""
+        self.failures += 1
+        self._consecutive_failures += 1
+        delay = min(self.RETRY_MAX_SECONDS, self.RETRY_BASE_SECONDS * 2 ** (self._consecutive_failures - 1))
+        self._retry = sorted(self._retry + [sequence])
+        self._blocked_on = sequence if self._blocked_on is None else min(self._blocked_on, sequence)
+        self._retry_at = time.monotonic() + delay
+        self.state.update_stats(error=True)
+        logger.warning(
+            f"Sink {self.name} failed batch {sequence} of channel {self.channel_id}, retrying in {delay:.0f}s: {error}"
+        )
+    
+    def _on_written(self, sequence: int, write: asyncio.Future) -> None:
+        """Handle the result of a submitted batch."""
+        self._in_flight -= 1
+        if write.cancelled():
+            self._fail(sequence, ArchiverError("Write was cancelled"))
+        elif write.exception() is not None:
+            self._fail(sequence, write.exception())
+        elif not write.result():
+            self._fail(sequence, ArchiverError("Sink reported a failed write"))
+        else:
+            self._mark_written(sequence)
+        self._wakeup.set()
+    
+    async def _submit(self, sequence: int) -> None:
+        """Hand one journaled batch to the sink; waits only while the sink's queue is full."""
+        messages = self.published.get(sequence)
+        if messages is None:
+            data = self.state.get_journal_batch(self.channel_id, sequence)
+            if data is None:
+                # Trimmed, so every sink already has it
+                self._mark_written(sequence)
+                return
+            messages = [MessageData(**message) for message in data]
+        try:
+            write = await self.sink.submit_batch(self.document_id, messages)
+        except Exception as e:
+            self._fail(sequence, e)
+            return
+        self._in_flight += 1
+        if write.done():
+            # Handled before the next batch is taken, so a failure stops it from going first
+            self._on_written(sequence, write)
+        else:
+            write.add_done_callback(lambda future: self._on_written(sequence, future))
+    
+    async def _apply_edits(self) -> None:
+        """Apply edits whose preceding batches are all written."""
+        while self._edits and self._edits[0][0] <= self.cursor:
+            _, messages, deleted = self._edits.pop(0)
+            try:
+                await self.sink.replace_messages(self.document_id, messages, deleted)
+            except Exception as e:
+                logger.warning(f"Sink {self.name} failed to apply edits in channel {self.channel_id}: {e}")
+    
+    async def _run(self) -> None:
+        """Submit batches as they are journaled and retry failed ones."""
+        while True:
+            self._wakeup.clear()
+            sequence = self._take()
+            if sequence is not None:
+                await self._submit(sequence)
+                continue
+            
+            await self._apply_edits()
+            # Caught up, or paused until a retry is due
+            if not self._in_flight:
+                self._idle.set()
+            timeout = max(0.0, self._retry_at - time.monotonic()) if self._retry else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def wait_idle(self) -> None:
+        """Wait until everything journaled is written or the lane is waiting for a retry."""
+        if self._task is not None and not self._task.done():
+            await self._idle.wait()
+    
+    async def stop(self) -> None:
+        """Stop delivering; undelivered batches stay in the journal."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+class SinkFanOut:
+    """Journals every batch once and delivers it to each sink through its own lane.
+    
+    A batch is durable as soon as it is journaled, so intake never waits for
+    a sink. Each sink has its own cursor per channel in the state database,
+    and a journaled batch is dropped once every sink has written it.
+    """
+    
+    # Published batches kept in memory per channel, so lanes reuse the buffered
+    # messages (and their cached rendering) instead of reloading the journal
+    MAX_PUBLISHED_BATCHES = 64
+    
+    def __init__(self, sinks: Dict[str, SinkPool], state: StateManager):
+        self.sinks = sinks
+        self.state = state
+        self.lanes: Dict[int, List[SinkLane]] = {}
+        self.published: Dict[int, Dict[int, List[MessageData]]] = {}
+    
+    def _get_lanes(self, channel_id: int, document_id: str) -> List[SinkLane]:
+        """Get or start one lane per sink for a channel."""
+        lanes = self.lanes.get(channel_id)
+        if lanes is None:
+            lanes = [
+                SinkLane(name, sink, channel_id, document_id, self.state, self._trim,
+                         self.published.setdefault(channel_id, {}))
+                for name, sink in self.sinks.items()
+            ]
+            self.lanes[channel_id] = lanes
+        for lane in lanes:
+            lane.start()
+        return lanes
+    
+    def _trim(self, channel_id: int) -> None:
+        """Drop journaled batches every sink has written."""
+        cursor = min(lane.cursor for lane in self.lanes[channel_id])
+        self.state.trim_journal(channel_id, cursor)
+        published = self.published.get(channel_id, {})
+        for sequence in [sequence for sequence in published if sequence <= cursor]:
+            del published[sequence]
+    
+    async def publish(self, channel_id: int, document_id: str, messages: List[MessageData]) -> int:
+        """Journal a batch and wake every sink's lane.
+        
+        Returns:
+            Sequence number of the batch in the channel's journal
+        """
+        sequence = self.state.append_journal_batch(channel_id, messages)
+        lanes = self._get_lanes(channel_id, document_id)
+        published = self.published[channel_id]
+        published[sequence] = list(messages)
+        while len(published) > self.MAX_PUBLISHED_BATCHES:
+            # A lagging sink reads the oldest batches back from the journal
+            del published[min(published)]
+        for lane in lanes:
+            lane.notify()
+        return sequence
+    
+    async def replace_messages(self, channel_id: int, document_id: str, messages: List[MessageData],
+                               deleted: Optional[List[Tuple[int, int]]] = None) -> None:
+        """Queue edits and deletions for every sink after the batches already journaled."""
+        for lane in self._get_lanes(channel_id, document_id):
+            lane.add_edits(messages, deleted or [])
+    
+    async def test_connection(self, document_ids: List[str]) -> bool:
+        """Check every sink; succeeds while at least one sink works."""
+        reachable = False
+        for name, sink in self.sinks.items():
+            if await sink.test_connection(document_ids):
+                reachable = True
+            else:
+                logger.error(f"Archive sink {name} is not reachable; its batches stay journaled until it recovers")
+        return reachable
+    
+    def start(self, routes: Dict[int, str]) -> None:
+        """Start every sink and let lagging ones catch up from the journal."""
+        for sink in self.sinks.values():
+            sink.start(list(routes.values()))
+        for channel_id, document_id in routes.items():
+            self._get_lanes(channel_id, document_id)
+    
+    async def flush(self, channel_ids: Optional[List[int]] = None) -> None:
+        """Wait until every sink has written what was journaled or is waiting to retry."""
+        channel_ids = self.lanes if channel_ids is None else channel_ids
+        await asyncio.gather(*(
+            lane.wait_idle() for channel_id in channel_ids for lane in self.lanes.get(channel_id, [])
+        ))
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get each sink's metrics and per-channel cursor, lag and failures."""
+        metrics = {}
+        for position, (name, sink) in enumerate(self.sinks.items()):
+            metrics[name] = {
+                'sink': sink.get_metrics(),
+                'channels': {
+                    channel_id: {
+                        'cursor': lanes[position].cursor,
+                        'lag': lanes[position].lag,
+                        'delivered': lanes[position].delivered,
+                        'failures': lanes[position].failures
+                    }
+                    for channel_id, lanes in self.lanes.items()
+                }
+            }
+        return metrics
+    
+    async def close(self) -> None:
+        """Stop the lanes and close every sink after its queued writes."""
+        await asyncio.gather(*(lane.stop() for lanes in self.lanes.values() for lane in lanes))
+        await asyncio.gather(*(sink.close() for sink in self.sinks.values()))
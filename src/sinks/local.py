@@ -0,0 +1,312 @@
+"""Local append-only archive in Markdown or JSONL segment files."""
+import asyncio
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from src.config.constants import MESSAGE_SEPARATOR
+from src.config.settings import Settings
+from src.exceptions.custom import ArchiverError
+from src.google.formatter import MESSAGE_JOINER
+from src.telegram.models import MessageData
+
+class LocalFileSink:
+    """Appends messages to rotating segment files, fsynced in groups.
+    
+    Records go through a large write buffer and the file is flushed and
+    fsynced at most once per fsync interval, so a burst of any size costs a
+    few syscalls. A crash loses at most the last interval of messages, so
+    batches submitted with submit_batch are only reported written once the
+    fsync covering them is done, and the fan-out keeps them in its journal
+    until then. Once
+    a segment reaches its size limit the next message starts a new one, so
+    segments can be uploaded to NotebookLM as separate sources. Files are
+    never rewritten: edits and deletions are appended as records.
+    
+    Records are rendered on the event loop, but every file operation runs
+    on the sink's own writer thread, which keeps them in order and off the
+    loop.
+    """
+    
+    # File suffix per output format
+    FORMATS = {'markdown': '.md', 'jsonl': '.jsonl'}
+    
+    # Write buffer of an open segment
+    BUFFER_BYTES = 1 << 20
+    
+    _joiner = MESSAGE_JOINER.encode('utf-8')
+    
+    def __init__(self, directory: Path, name: str, format: str = 'markdown',
+                 segment_bytes: int = 10_000_000, fsync_interval: float = 1.0):
+        if format not in self.FORMATS:
+            raise ArchiverError(f"Unknown local archive format: {format}")
+        self.name = name
+        self.directory = Path(directory) / re.sub(r'[^\w.-]', '_', name)
+        self.format = format
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.messages_written = 0
+        self.edits_written = 0
+        self.bytes_written = 0
+        self.segments_started = 0
+        self.fsyncs = 0
+        self._file: Optional[BinaryIO] = None
+        self._segment = 0
+        self._segment_size = 0
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
+        # Futures of submitted batches waiting for the next fsync
+        self._unsynced: List[asyncio.Future] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def segment_path(self) -> Path:
+        """Segment currently appended to."""
+        return self.directory / f"part-{self._segment:05d}{self.FORMATS[self.format]}"
+    
+    def _open_segment(self) -> None:
+        """Open the current segment for appending."""
+        self._file = open(self.segment_path, 'ab', buffering=self.BUFFER_BYTES)
+        self._segment_size = self.segment_path.stat().st_size
+    
+    def _ensure_open(self) -> None:
+        """Continue the latest segment, also after a restart."""
+        if self._file is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        numbers = [
+            int(path.stem.split('-')[1])
+            for path in self.directory.glob(f"part-*{self.FORMATS[self.format]}")
+        ]
+        self._segment = max(numbers, default=1)
+        self._open_segment()
+    
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run file operations on the writer thread and wait for them."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"local-sink-{self.directory.name}")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+    
+    def _sync(self) -> None:
+        """Flush the write buffer and fsync the segment (writer thread)."""
+        if not self._dirty or self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+        self.fsyncs += 1
+    
+    def _settle(self, waiting: List[asyncio.Future], error: Optional[BaseException] = None) -> None:
+        """Resolve the futures of batches covered by a finished fsync."""
+        for future in waiting:
+            if future.done() or future.get_loop().is_closed():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(True)
+    
+    def _sync_later(self) -> None:
+        """Hand a deferred fsync to the writer thread."""
+        self._sync_handle = None
+        self._last_sync = time.monotonic()
+        if self._executor is not None:
+            waiting, self._unsynced = self._unsynced, []
+            sync = asyncio.wrap_future(self._executor.submit(self._sync))
+            sync.add_done_callback(lambda done: self._settle(waiting, done.exception()))
+    
+    async def _schedule_sync(self) -> None:
+        """Fsync now if the interval has passed, otherwise once it does."""
+        delay = self._last_sync + self.fsync_interval - time.monotonic()
+        if delay <= 0:
+            if self._sync_handle is not None:
+                self._sync_handle.cancel()
+                self._sync_handle = None
+            self._last_sync = time.monotonic()
+            waiting, self._unsynced = self._unsynced, []
+            try:
+                await self._run(self._sync)
+            except Exception as e:
+                self._settle(waiting, e)
+                raise
+            self._settle(waiting)
+        elif self._sync_handle is None:
+            self._sync_handle = asyncio.get_running_loop().call_later(delay, self._sync_later)
+    
+    def _rotate(self) -> None:
+        """Close the full segment and start the next one."""
+        self._sync()
+        self._file.close()
+        self._segment += 1
+        self.segments_started += 1
+        self._open_segment()
+        logger.info(f"Started archive segment {self.segment_path}")
+    
+    def _append_records(self, records: List[str]) -> None:
+        """Append records to the latest segment (writer thread)."""
+        self._ensure_open()
+        for record in records:
+            self._append(record)
+    
+    def _append(self, record: str) -> None:
+        """Append one record, starting a new segment first if it would overflow."""
+        data = record.encode('utf-8')
+        if self._segment_size and self._segment_size + len(data) > self.segment_bytes:
+            self._rotate()
+        if self._segment_size and self.format == 'markdown':
+            # Joined like format_messages_for_gdocs joins a batch
+            data = self._joiner + data
+        self._file.write(data)
+        self._segment_size += len(data)
+        self.bytes_written += len(data)
+        self._dirty = True
+    
+    def _json_record(self, operation: str, data: Dict[str, Any]) -> str:
+        """Render one JSONL line."""
+        return json.dumps({'op': operation, **data}, ensure_ascii=False) + "\n"
+    
+    def _message_record(self, message: MessageData) -> str:
+        """Render a new message."""
+        if self.format == 'jsonl':
+            return self._json_record('message', message.model_dump(mode='json'))
+        return message.to_formatted_text()
+    
+    def _edit_record(self, message: MessageData) -> str:
+        """Render the new version of an edited message."""
+        if self.format == 'jsonl':
+            return self._json_record('edit', message.model_dump(mode='json'))
+        return f"✏️ Edited message {message.id}\n" + message.to_formatted_text()
+    
+    def _delete_record(self, channel_id: int, message_id: int) -> str:
+        """Render a deletion."""
+        if self.format == 'jsonl':
+            return self._json_record('delete', {'channel_id': channel_id, 'id': message_id})
+        return f"🗑 Deleted message {message_id} from channel {channel_id}\n\n{MESSAGE_SEPARATOR}\n"
+    
+    async def submit_batch(self, messages: List[MessageData]) -> asyncio.Future:
+        """Append a batch of messages and get a future resolved once they are fsynced."""
+        await self._run(self._append_records, [self._message_record(message) for message in messages])
+        self.messages_written += len(messages)
+        synced = asyncio.get_running_loop().create_future()
+        self._unsynced.append(synced)
+        await self._schedule_sync()
+        return synced
+    
+    async def write_batch(self, messages: List[MessageData]) -> bool:
+        """Append a batch of messages; it is fsynced with the next group."""
+        await self.submit_batch(messages)
+        return True
+    
+    async def replace_messages(self, messages: List[MessageData],
+                               deleted: Optional[List[Tuple[int, int]]] = None) -> int:
+        """Append the new versions of edited messages and records of deleted ones."""
+        records = [self._edit_record(message) for message in messages]
+        records.extend(self._delete_record(channel_id, message_id) for channel_id, message_id in deleted or [])
+        await self._run(self._append_records, records)
+        self.edits_written += len(records)
+        await self._schedule_sync()
+        return len(records)
+    
+    async def test_connection(self) -> bool:
+        """Check that the current segment can be opened for appending."""
+        try:
+            await self._run(self._ensure_open)
+            logger.info(f"Archiving to {self.segment_path}")
+            return True
+        except OSError as e:
+            logger.error(f"Cannot write local archive {self.directory}: {e}")
+            return False
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get written message, byte, segment and fsync counts."""
+        return {
+            'messages_written': self.messages_written,
+            'edits_written': self.edits_written,
+            'bytes_written': self.bytes_written,
+            'segment': str(self.segment_path) if self._file else None,
+            'segments_started': self.segments_started,
+            'fsyncs': self.fsyncs
+        }
+    
+    def _close_file(self) -> None:
+        """Fsync and close the current segment (writer thread)."""
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+    
+    def close(self) -> None:
+        """Fsync and close the current segment and stop the writer thread."""
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        if self._executor is not None:
+            self._executor.submit(self._close_file)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._close_file()
+        # The final fsync covered every batch still waiting for one
+        waiting, self._unsynced = self._unsynced, []
+        self._settle(waiting)
+
+class LocalSinkPool:
+    """Routes batches to one local archive per route target, written immediately.
+    
+    Submitting waits for the archive's writer thread to append the batch;
+    its future is resolved by the grouped fsync that makes it durable, so
+    the fan-out's cursor never moves past batches a crash could lose.
+    """
+    
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.sinks: Dict[str, LocalFileSink] = {}
+    
+    def get_sink(self, document_id: str) -> LocalFileSink:
+        """Get or create the archive for a route target."""
+        sink = self.sinks.get(document_id)
+        if sink is None:
+            sink = LocalFileSink(
+                self.settings.local_sink_path,
+                document_id,
+                self.settings.local_sink_format,
+                self.settings.local_sink_segment_bytes,
+                self.settings.local_sink_fsync_interval
+            )
+            self.sinks[document_id] = sink
+        return sink
+    
+    async def submit_batch(self, document_id: str, messages: List[MessageData]) -> asyncio.Future:
+        """Append a batch and get a future resolved once it is fsynced."""
+        return await self.get_sink(document_id).submit_batch(messages)
+    
+    async def write_batch(self, document_id: str, messages: List[MessageData]) -> bool:
+        """Append a batch to an archive."""
+        return await self.get_sink(document_id).write_batch(messages)
+    
+    async def replace_messages(self, document_id: str, messages: List[MessageData],
+                               deleted: Optional[List[Tuple[int, int]]] = None) -> int:
+        """Append edits and deletions to an archive."""
+        return await self.get_sink(document_id).replace_messages(messages, deleted)
+    
+    async def test_connection(self, document_ids: Optional[List[str]] = None) -> bool:
+        """Check every routed archive."""
+        results = [await self.get_sink(document_id).test_connection() for document_id in document_ids or list(self.sinks)]
+        return all(results)
+    
+    def start(self, document_ids: Optional[List[str]] = None) -> None:
+        """Nothing runs in the background."""
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get per-archive write metrics."""
+        return {document_id: sink.get_metrics() for document_id, sink in self.sinks.items()}
+    
+    async def close(self) -> None:
+        """Fsync and close every archive."""
+        for sink in self.sinks.values():
+            sink.close()
@@ -15,6 +15,8 @@ class StateManager:
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.db = None
+        # Message index tables, one per document, opened on first use
+        self._index_tables: Dict[str, SqliteDict] = {}
         self._open_db()
         logger.info(f"State manager initialized with db: {db_path}")
     
@@ -44,6 +46,163 @@ class StateManager:
         self.db[key] = message_id
         logger.debug(f"Updated last message ID for channel {channel_id}: {message_id}")
     
+    def get_document_state(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get tracked length and revision for a Google Doc."""
+        key = f"doc_state_{document_id}"
+        return self.db.get(key)
+    
+    def set_document_state(self, document_id: str, data: Dict[str, Any]) -> None:
+        """Set tracked length and revision for a Google Doc."""
+        key = f"doc_state_{document_id}"
+        self.db[key] = data
+    
+    def get_document_index(self, root_document_id: str) -> List[Dict[str, Any]]:
+        """Get ordered archive documents that continue a root document."""
+        key = f"doc_index_{root_document_id}"
+        return self.db.get(key, [])
+    
+    def set_document_index(self, root_document_id: str, documents: List[Dict[str, Any]]) -> None:
+        """Set ordered archive documents that continue a root document."""
+        key = f"doc_index_{root_document_id}"
+        self.db[key] = documents
+        logger.debug(f"Updated document index for {root_document_id}: {len(documents)} documents")
+    
+    def get_batch_checkpoint(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get progress of a partially written batch."""
+        key = f"batch_checkpoint_{document_id}"
+        return self.db.get(key)
+    
+    def save_batch_checkpoint(self, document_id: str, checkpoint: Dict[str, Any]) -> None:
+        """Save progress of a partially written batch."""
+        key = f"batch_checkpoint_{document_id}"
+        self.db[key] = checkpoint
+        logger.debug(f"Saved batch checkpoint for {document_id}: {checkpoint['chunks_committed']} chunks committed")
+    
+    def clear_batch_checkpoint(self, document_id: str) -> None:
+        """Clear progress of a partially written batch."""
+        key = f"batch_checkpoint_{document_id}"
+        if key in self.db:
+            del self.db[key]
+    
+    def get_committed_batches(self, document_id: str) -> Dict[str, Optional[str]]:
+        """Get recently committed batch IDs of a Google Doc with the revision after each."""
+        key = f"commit_log_{document_id}"
+        return self.db.get(key, {})
+    
+    def record_committed_batch(self, document_id: str, batch_id: str, revision_id: Optional[str],
+                               keep: int = 1000) -> None:
+        """Log a fully committed batch, keeping the most recent ones."""
+        key = f"commit_log_{document_id}"
+        log = self.db.get(key, {})
+        log[batch_id] = revision_id
+        self.db[key] = dict(list(log.items())[-keep:])
+    
+    def get_style_jobs(self, document_id: str) -> List[Dict[str, Any]]:
+        """Get queued style requests for text already written to a Google Doc."""
+        key = f"style_jobs_{document_id}"
+        return self.db.get(key, [])
+    
+    def add_style_job(self, document_id: str, job: Dict[str, Any]) -> None:
+        """Queue style requests for text already written to a Google Doc."""
+        key = f"style_jobs_{document_id}"
+        self.db[key] = self.db.get(key, []) + [job]
+        logger.debug(f"Queued style job {job['job_id']} with {len(job['requests'])} requests")
+    
+    def set_style_jobs(self, document_id: str, jobs: List[Dict[str, Any]]) -> None:
+        """Replace the queued style jobs of a Google Doc, e.g. after their ranges moved."""
+        key = f"style_jobs_{document_id}"
+        if jobs:
+            self.db[key] = jobs
+        elif key in self.db:
+            del self.db[key]
+    
+    def remove_style_job(self, document_id: str, job_id: str) -> None:
+        """Remove an applied or discarded style job."""
+        key = f"style_jobs_{document_id}"
+        jobs = [job for job in self.db.get(key, []) if job['job_id'] != job_id]
+        if jobs:
+            self.db[key] = jobs
+        elif key in self.db:
+            del self.db[key]
+    
+    def _message_index_table(self, document_id: str) -> SqliteDict:
+        """Table holding the message index of one document."""
+        table = self._index_tables.get(document_id)
+        if table is None:
+            table = SqliteDict(str(self.db_path), tablename=f"message_index_{document_id}", autocommit=True)
+            self._index_tables[document_id] = table
+        return table
+    
+    def get_message_index(self, document_id: str) -> Dict[str, Dict[str, Any]]:
+        """Get ranges of archived messages in a Google Doc, keyed by "channel_id:message_id".
+        
+        Every document has its own table with one row per message, so a load
+        reads only that document's messages. An index saved as a single dict
+        by earlier versions is moved into the table on first load.
+        """
+        legacy_key = f"message_index_{document_id}"
+        legacy = self.db.get(legacy_key)
+        if legacy is not None:
+            self.set_message_index_entries(document_id, legacy)
+            del self.db[legacy_key]
+        return dict(self._message_index_table(document_id).items())
+    
+    def set_message_index_entries(self, document_id: str, entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        """Save changed ranges of archived messages in a Google Doc; None removes a message."""
+        table = self._message_index_table(document_id)
+        stored = {}
+        for key, entry in entries.items():
+            if entry is not None:
+                stored[key] = entry
+            elif key in table:
+                del table[key]
+        if stored:
+            # One transaction for the whole batch
+            table.update(stored)
+    
+    def get_journal_head(self, channel_id: int) -> int:
+        """Get the sequence number of the last batch journaled for a channel."""
+        return self.db.get(f"journal_head_{channel_id}", 0)
+    
+    def get_journal_tail(self, channel_id: int) -> int:
+        """Get the sequence number of the oldest batch still in a channel's journal."""
+        return self.db.get(f"journal_tail_{channel_id}", 1)
+    
+    def append_journal_batch(self, channel_id: int, messages: List[MessageData]) -> int:
+        """Journal a batch until every sink has written it.
+        
+        Returns:
+            Sequence number of the batch
+        """
+        sequence = self.get_journal_head(channel_id) + 1
+        self.db[f"journal_{channel_id}_{sequence}"] = [msg.model_dump() for msg in messages]
+        self.db[f"journal_head_{channel_id}"] = sequence
+        return sequence
+    
+    def get_journal_batch(self, channel_id: int, sequence: int) -> Optional[List[Dict[str, Any]]]:
+        """Get a journaled batch, None if it was already trimmed."""
+        return self.db.get(f"journal_{channel_id}_{sequence}")
+    
+    def trim_journal(self, channel_id: int, sequence: int) -> None:
+        """Drop journaled batches up to a sequence number, once every sink has them."""
+        tail = self.get_journal_tail(channel_id)
+        if sequence < tail:
+            return
+        for number in range(tail, sequence + 1):
+            key = f"journal_{channel_id}_{number}"
+            if key in self.db:
+                del self.db[key]
+        self.db[f"journal_tail_{channel_id}"] = sequence + 1
+        logger.debug(f"Trimmed journal of channel {channel_id} up to batch {sequence}")
+    
+    def get_sink_cursor(self, sink: str, channel_id: int) -> Optional[int]:
+        """Get the last journaled batch of a channel written by a sink."""
+        return self.db.get(f"sink_cursor_{sink}_{channel_id}")
+    
+    def set_sink_cursor(self, sink: str, channel_id: int, sequence: int) -> None:
+        """Set the last journaled batch of a channel written by a sink."""
+        self.db[f"sink_cursor_{sink}_{channel_id}"] = sequence
+    
     def get_pending_batch(self) -> List[Dict[str, Any]]:
         """Get pending messages batch."""
         data = self.db.get("pending_batch", [])
@@ -81,12 +240,19 @@ class StateManager:
     
     def close(self) -> None:
         """Close database connection."""
-        if self.db:
+        for table in self._index_tables.values():
+            try:
+                table.close()
+            except Exception as e:
+                logger.warning(f"Error closing message index table: {e}")
+        self._index_tables = {}
+        if self.db is not None:
             try:
                 self.db.close()
                 logger.debug("State manager closed")
             except Exception as e:
                 logger.warning(f"Error closing database: {e}")
+            self.db = None
     
     def __del__(self):
         """Destructor to ensure database is closed."""
@@ -2,7 +2,7 @@
 import asyncio
 from typing import Optional, Callable, List
 from telethon import TelegramClient as TelethonClient
-from telethon.events import NewMessage
+from telethon.events import NewMessage, MessageEdited, MessageDeleted
 from telethon.tl.types import Message, MessageMediaPhoto, MessageMediaDocument, Channel, User
 from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
@@ -22,7 +22,7 @@ class TelegramClient:
             settings.telegram_api_hash
         )
         self._channel_cache = {}
-        self._handler = None
+        self._handlers: List[Callable] = []
         
     async def start(self) -> None:
         """Start Telegram client."""
@@ -40,10 +40,10 @@ class TelegramClient:
     
     async def stop(self) -> None:
         """Stop Telegram client."""
-        # Remove event handler if exists
-        if self._handler:
-            self.client.remove_event_handler(self._handler)
-            self._handler = None
+        # Remove the new, edited and deleted message handlers
+        for handler in self._handlers:
+            self.client.remove_event_handler(handler)
+        self._handlers = []
             
         await self.client.disconnect()
         logger.info("Telegram client stopped")
@@ -111,18 +111,20 @@ class TelegramClient:
             
             return None
     
-    async def parse_message(self, message: Message) -> MessageData:
+    async def parse_message(self, message: Message, channel_id: Optional[int] = None) -> MessageData:
         """Parse Telethon message to MessageData with enhanced link support."""
         try:
+            channel_id = channel_id or self.settings.telegram_channel_id
+            
             # Get channel info
-            channel_info = await self.get_channel_info(self.settings.telegram_channel_id)
+            channel_info = await self.get_channel_info(channel_id)
             
             # Basic information
             data = {
                 'id': message.id,
                 'text': message.text or '',
                 'date': message.date,
-                'channel_id': self.settings.telegram_channel_id,
+                'channel_id': channel_id,
                 'channel_name': channel_info['name'],
                 'channel_username': channel_info['username'],
             }
@@ -206,7 +208,7 @@ class TelegramClient:
                 return []
             
             async for message in self.client.iter_messages(channel_id, limit=limit, min_id=min_id):
-                msg_data = await self.parse_message(message)
+                msg_data = await self.parse_message(message, channel_id)
                 messages.append(msg_data)
             
             return messages
@@ -215,18 +217,48 @@ class TelegramClient:
             logger.error(f"Failed to get messages batch: {e}")
             return []
     
-    async def listen_channel(self, channel_id: int, callback: Callable) -> None:
-        """Listen for new messages in channel."""
-        @self.client.on(NewMessage(chats=[channel_id]))
+    async def listen_channel(self, channel_ids: List[int], callback: Callable,
+                             on_edit: Optional[Callable] = None, on_delete: Optional[Callable] = None) -> None:
+        """Listen for new, edited and deleted messages in channels.
+        
+        Args:
+            channel_ids: Channels to listen to
+            callback: Called with MessageData of each new message
+            on_edit: Called with MessageData of the new version of an edited message
+            on_delete: Called with the channel ID and a list of deleted message IDs
+        """
+        @self.client.on(NewMessage(chats=channel_ids))
         async def handler(event):
             try:
-                message_data = await self.parse_message(event.message)
+                message_data = await self.parse_message(event.message, event.chat_id)
                 await callback(message_data)
             except Exception as e:
                 logger.error(f"Error handling new message: {e}")
         
-        self._handler = handler
-        logger.info(f"Started listening to channel {channel_id}")
+        self._handlers.append(handler)
+        
+        if on_edit:
+            @self.client.on(MessageEdited(chats=channel_ids))
+            async def edit_handler(event):
+                try:
+                    message_data = await self.parse_message(event.message, event.chat_id)
+                    await on_edit(message_data)
+                except Exception as e:
+                    logger.error(f"Error handling edited message: {e}")
+            
+            self._handlers.append(edit_handler)
+        
+        if on_delete:
+            @self.client.on(MessageDeleted(chats=channel_ids))
+            async def delete_handler(event):
+                try:
+                    await on_delete(event.chat_id, list(event.deleted_ids))
+                except Exception as e:
+                    logger.error(f"Error handling deleted messages: {e}")
+            
+            self._handlers.append(delete_handler)
+        
+        logger.info(f"Started listening to channels {channel_ids}")
         
         # Keep running until disconnected
         await self.client.run_until_disconnected()
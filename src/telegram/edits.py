@@ -0,0 +1,98 @@
+"""Debouncing of edited and deleted channel messages."""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from src.telegram.models import MessageData
+
+# Called with the latest versions of edited messages and (channel_id, message_id) of deleted ones
+EditCallback = Callable[[List[MessageData], List[Tuple[int, int]]], Awaitable[None]]
+
+class EditDebouncer:
+    """Holds edits and deletions until a message has been quiet for a while.
+    
+    Channels often edit a post several times within seconds. Every event
+    restarts the message's timer and replaces what is pending for it, so a
+    burst ends up as one change with the latest text, and a deletion wins
+    over earlier edits. All changes that are due together are passed to the
+    callback in one call.
+    """
+    
+    # Changes due within this share of the delay are delivered together
+    BATCH_WINDOW = 0.2
+    
+    def __init__(self, delay: float, callback: EditCallback):
+        self.delay = delay
+        self.callback = callback
+        # (channel_id, message_id) -> (deadline, latest version or None if deleted)
+        self.pending: Dict[Tuple[int, int], Tuple[float, Optional[MessageData]]] = {}
+        self.collapsed = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def add_edit(self, message: MessageData) -> None:
+        """Schedule the latest version of an edited message."""
+        self._add((message.channel_id, message.id), message)
+    
+    def add_delete(self, channel_id: int, message_id: int) -> None:
+        """Schedule removal of a deleted message."""
+        self._add((channel_id, message_id), None)
+    
+    def _add(self, key: Tuple[int, int], message: Optional[MessageData]) -> None:
+        loop = asyncio.get_running_loop()
+        if key in self.pending:
+            self.collapsed += 1
+        self.pending[key] = (loop.time() + self.delay, message)
+        
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+    
+    def _take(self, until: Optional[float] = None) -> Tuple[List[MessageData], List[Tuple[int, int]]]:
+        """Remove changes due by until (all changes if None) from the pending set."""
+        edited = []
+        deleted = []
+        for key, (deadline, message) in list(self.pending.items()):
+            if until is not None and deadline > until:
+                continue
+            del self.pending[key]
+            if message is None:
+                deleted.append(key)
+            else:
+                edited.append(message)
+        return edited, deleted
+    
+    async def _deliver(self, edited: List[MessageData], deleted: List[Tuple[int, int]]) -> None:
+        if not edited and not deleted:
+            return
+        try:
+            await self.callback(edited, deleted)
+        except Exception as e:
+            logger.error(f"Failed to apply {len(edited)} edits and {len(deleted)} deletions: {e}")
+    
+    async def _run(self) -> None:
+        """Deliver changes as their timers run out."""
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            self._wakeup.clear()
+            due_at = min(deadline for deadline, _ in self.pending.values())
+            if due_at > loop.time():
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=due_at - loop.time())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self._deliver(*self._take(loop.time() + self.delay * self.BATCH_WINDOW))
+    
+    async def flush(self) -> None:
+        """Deliver all pending changes now."""
+        await self._deliver(*self._take())
+    
+    async def close(self) -> None:
+        """Deliver what is still pending and wait for the timer task to finish."""
+        await self.flush()
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+        self._task = None
@@ -1,8 +1,9 @@
 """Telegram data models with enhanced link handling."""
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from datetime import datetime
-from typing import Optional
-import re
+from typing import Any, Optional
+
+from src.utils.links import extract_urls
 
 class MessageData(BaseModel):
     """Represents a Telegram message with link support."""
@@ -31,6 +32,9 @@ class MessageData(BaseModel):
     original_link: Optional[str] = None
     forward_original_link: Optional[str] = None  # Ссылка на оригинальное сообщение
     
+    # Rendering cached by the archive while the message is buffered; never serialized
+    _rendered: Optional[Any] = PrivateAttr(default=None)
+    
     def generate_telegram_link(self, channel_username: str, message_id: int) -> Optional[str]:
         """Generate Telegram link from username and message ID."""
         if not channel_username or not message_id:
@@ -49,12 +53,7 @@ class MessageData(BaseModel):
     
     def extract_all_links(self) -> list:
         """Extract all URLs from message text."""
-        if not self.text:
-            return []
-        
-        # Pattern for URLs
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-        return re.findall(url_pattern, self.text)
+        return extract_urls(self.text)
     
     def to_formatted_text(self) -> str:
         """Format message for Google Docs (deprecated - use docs_client methods)."""
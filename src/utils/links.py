@@ -0,0 +1,80 @@
+"""Link tokenizer shared by the Google Docs formatter and message models."""
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+# One pass over the text: every match starts at "[" or "h", which lets the
+# regex engine skip ahead by character set. A Markdown link consumes its
+# whole [text](url) span, so the URL inside is never reported twice.
+LINK_PATTERN = re.compile(
+    r'[\[h](?:'
+    r'(?<=\[)[^\]]+\]\((?P<target>[^)]+?)\)'
+    r'|(?<=h)ttps?://[^\s<>"{}|\\^`\[\]]+'
+    r')'
+)
+
+@lru_cache(maxsize=4096)
+def clean_url(url: str) -> str:
+    """Clean and validate URL."""
+    if not url:
+        return url
+    
+    # Remove trailing punctuation and whitespace
+    url = url.rstrip('.,;!? \t\n\r')
+    
+    # Remove trailing closing parenthesis if it's not part of the URL
+    if url.endswith(')'):
+        # Check if this is a valid URL with parentheses (like GitHub URLs with parentheses in path)
+        # If it's just a trailing ), remove it
+        if not any(char in url[:-1] for char in '()'):
+            url = url[:-1]
+    
+    # Fix common URL issues
+    if url.startswith('http https://'):
+        url = url.replace('http https://', 'https://')
+    
+    # Remove any remaining problematic characters at the end
+    url = url.rstrip('.,;!? \t\n\r)')
+    
+    # Ensure URL starts with http:// or https://
+    if not url.startswith(('http://', 'https://')):
+        if url.startswith('//'):
+            url = 'https:' + url
+        else:
+            url = 'https://' + url
+    
+    return url
+
+def extract_links(text: str) -> List[Tuple[str, int, int]]:
+    """Extract links from text in a single scan.
+    
+    Spans are ordered and never overlap: a Markdown link covers its whole
+    [text](url) span, a plain URL covers the URL without trailing punctuation.
+    
+    Returns:
+        List of tuples (url, start_pos, end_pos)
+    """
+    if not text:
+        return []
+    
+    links = []
+    for match in LINK_PATTERN.finditer(text):
+        target = match.group('target')
+        start, end = match.span()
+        
+        if target is None:
+            raw = text[start:end]
+            url = clean_url(raw)
+            if raw.startswith(url):
+                # Leave trailing punctuation stripped by cleaning out of the span
+                end = start + len(url)
+        else:
+            url = clean_url(target)
+        
+        if url:  # Only add if URL is valid after cleaning
+            links.append((url, start, end))
+    return links
+
+def extract_urls(text: str) -> List[str]:
+    """Extract cleaned URLs from text in order of appearance."""
+    return [url for url, _, _ in extract_links(text)]
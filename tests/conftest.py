@@ -0,0 +1,66 @@
+"""Общие фикстуры тестов: настройки писателя и писатель на локальной замене Google Docs API.
+
+Бенчмарки используют те же настройки через writer_settings.
+"""
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, List, Optional
+
+import pytest
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.fake import FakeDocsService
+from src.storage.state import StateManager
+
+def writer_settings(**overrides: Any) -> SimpleNamespace:
+    """Settings a GoogleDocsWriter or WriterPool reads, with quotas a test never waits on."""
+    values = {
+        'google_doc_id': 'doc',
+        'google_max_workers': 1,
+        'google_read_quota_per_minute': 600,
+        'google_write_quota_per_minute': 600,
+        'google_max_requests_per_batch': 500,
+        'google_max_batch_bytes': 10 ** 6,
+        'rollover_max_chars': 0,
+        'rollover_max_words': 0,
+        'deferred_styling': False,
+        'pipeline_depth': 1,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+@pytest.fixture
+def make_settings() -> Callable[..., SimpleNamespace]:
+    """Build writer settings with overrides."""
+    return writer_settings
+
+@pytest.fixture
+def service() -> FakeDocsService:
+    """In-memory Docs service holding an empty document 'doc'."""
+    service = FakeDocsService()
+    service.create_document('doc')
+    return service
+
+@pytest.fixture
+def state(tmp_path) -> Iterator[StateManager]:
+    """State database of the test, closed after it."""
+    state = StateManager(tmp_path / "state.db")
+    yield state
+    state.close()
+
+@pytest.fixture
+def make_writer(service, state) -> Iterator[Callable[..., GoogleDocsWriter]]:
+    """Build writers on the test's service and state; every writer is closed after the test.
+    
+    Keyword arguments other than service, state and recorder override settings.
+    """
+    writers: List[GoogleDocsWriter] = []
+    
+    def make(service: FakeDocsService = service, state: Optional[StateManager] = state,
+             recorder: Any = None, **overrides: Any) -> GoogleDocsWriter:
+        writer = GoogleDocsWriter(writer_settings(**overrides), state, service=service, recorder=recorder)
+        writers.append(writer)
+        return writer
+    
+    yield make
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,149 @@
+"""Тесты для общего провайдера учётных данных Google."""
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from src.exceptions.custom import GoogleDocsError
+from src.google import auth
+from src.google.auth import (CredentialsProvider, LockedCredentials, ServiceAccountProvider, get_credentials_provider,
+                             get_credentials_providers)
+
+class StubCredentials:
+    """Credentials with the attributes the provider relies on."""
+    
+    def __init__(self, lifetime: float, failures: int = 0):
+        self.lifetime = lifetime
+        self.failures = failures
+        self.token = "token-0"
+        self.refresh_token = "refresh"
+        self.expiry = datetime.utcnow() + timedelta(seconds=lifetime)
+    
+    @property
+    def expired(self) -> bool:
+        return datetime.utcnow() >= self.expiry
+    
+    @property
+    def valid(self) -> bool:
+        return not self.expired
+    
+    def apply(self, headers, token=None) -> None:
+        headers['authorization'] = f"Bearer {token or self.token}"
+    
+    def refresh(self, request) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("network is down")
+        self.token = f"token-{int(self.token.split('-')[1]) + 1}"
+        self.expiry = datetime.utcnow() + timedelta(seconds=self.lifetime)
+
+def make_provider(tmp_path, credentials, margin):
+    token_path = tmp_path / "token.pickle"
+    with open(token_path, 'wb') as token:
+        pickle.dump(credentials, token)
+    return CredentialsProvider(tmp_path / "credentials.json", token_path, refresh_margin=margin), token_path
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_token_is_refreshed_before_expiry_and_persisted(tmp_path):
+    provider, token_path = make_provider(tmp_path, StubCredentials(lifetime=60), margin=59.8)
+    credentials = provider.load()
+    assert credentials.token == "token-0"
+    
+    provider.start()
+    try:
+        # Refreshed in place, before the token ever became invalid
+        assert wait_for(lambda: provider.refreshes >= 1)
+        assert provider.credentials is credentials
+        assert credentials.valid
+    finally:
+        provider.stop()
+    
+    with open(token_path, 'rb') as token:
+        assert pickle.load(token).token == credentials.token
+    assert not (tmp_path / "token.pickle.tmp").exists()
+
+def test_failed_refresh_is_retried_in_background(tmp_path):
+    provider, _ = make_provider(tmp_path, StubCredentials(lifetime=60, failures=2), margin=59.9)
+    provider.RETRY_SECONDS = 0.05
+    provider.load()
+    
+    provider.start()
+    try:
+        assert wait_for(lambda: provider.refreshes >= 1)
+    finally:
+        provider.stop()
+    
+    assert provider.refresh_failures == 2
+    assert provider.credentials.valid
+    assert provider.get_metrics()['expires_in'] > 0
+
+@pytest.fixture
+def providers(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, '_providers', {})
+    monkeypatch.setattr(auth, 'GOOGLE_TOKEN_PATH', str(tmp_path / "token.pickle"))
+    return auth._providers
+
+def test_shared_provider_refuses_other_settings(tmp_path, providers):
+    provider = get_credentials_provider(tmp_path / "credentials.json", 60, interactive=False)
+    assert get_credentials_provider(tmp_path / "credentials.json", 60, interactive=False) is provider
+    
+    with pytest.raises(GoogleDocsError):
+        get_credentials_provider(tmp_path / "other.json", 60, interactive=False)
+    with pytest.raises(GoogleDocsError):
+        get_credentials_provider(tmp_path / "credentials.json", 120, interactive=False)
+    with pytest.raises(GoogleDocsError):
+        get_credentials_provider(tmp_path / "credentials.json", 60, interactive=True)
+    
+    settings = SimpleNamespace(google_service_account_files=[str(tmp_path / "robot.json")],
+                               google_token_refresh_margin=60)
+    [robot] = get_credentials_providers(settings)
+    assert get_credentials_providers(settings) == [robot]
+    settings.google_token_refresh_margin = 120
+    with pytest.raises(GoogleDocsError):
+        get_credentials_providers(settings)
+
+def test_401_seen_by_several_threads_refreshes_once(tmp_path):
+    provider, _ = make_provider(tmp_path, StubCredentials(lifetime=3600), margin=60)
+    provider.load()
+    credentials = LockedCredentials(provider)
+    sent = threading.Barrier(4, timeout=5)
+    
+    def call():
+        # Every thread sends the same token and is answered with 401
+        headers = {}
+        credentials.before_request(None, 'POST', 'https://docs.googleapis.com', headers)
+        sent.wait()
+        credentials.refresh(None)
+        return headers['authorization']
+    
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert provider.refreshes == 1
+    assert provider.credentials.token == "token-1"
+    
+    # An expired token is refreshed under the lock before the next call
+    provider.credentials.expiry = datetime.utcnow() - timedelta(seconds=1)
+    headers = {}
+    credentials.before_request(None, 'POST', 'https://docs.googleapis.com', headers)
+    assert provider.refreshes == 2
+    assert headers['authorization'] == "Bearer token-2"
+
+def test_key_files_with_the_same_name_get_different_identities(tmp_path):
+    first = ServiceAccountProvider(tmp_path / "a" / "robot.json")
+    second = ServiceAccountProvider(tmp_path / "b" / "robot.json")
+    
+    assert first.name.startswith("robot-") and second.name.startswith("robot-")
+    assert first.name != second.name
+    assert ServiceAccountProvider(tmp_path / "a" / "robot.json").name == first.name
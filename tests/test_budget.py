@@ -0,0 +1,99 @@
+"""Тесты для сброса буфера по размеру отрендеренных сообщений."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.templates import MessageTemplates
+from src.sinks.budget import BatchBudget
+from src.telegram.models import MessageData
+
+TEMPLATES = MessageTemplates(GoogleDocsWriter.COLORS, GoogleDocsWriter.MEDIA_EMOJIS)
+
+def render(message):
+    text, requests, end = TEMPLATES.render(message, 1)
+    return text, requests, end - 1
+
+def make_budget(batch_size=50, chars=0, units=0, requests=0, render=render):
+    return BatchBudget(SimpleNamespace(batch_size=batch_size, batch_max_chars=chars,
+                                       batch_max_utf16_units=units, batch_max_requests=requests), render)
+
+def make_message(number, text):
+    return MessageData(id=number, text=text, date=datetime(2024, 1, 1), channel_id=7)
+
+def test_message_count_still_limits_batches():
+    budget = make_budget(batch_size=3, chars=10 ** 6)
+    for number in range(1, 3):
+        budget.add(7, make_message(number, "Короткий пост"))
+    assert not budget.is_full(7)
+    budget.add(7, make_message(3, "Короткий пост"))
+    assert budget.is_full(7)
+
+def test_long_posts_fill_the_character_budget():
+    budget = make_budget(chars=10000)
+    for number in range(1, 40):
+        budget.add(7, make_message(number, "Коротко"))
+    assert not budget.is_full(7)
+    
+    other = make_budget(chars=10000)
+    other.add(8, make_message(1, "Длинный пост. " * 400))
+    other.add(8, make_message(2, "Длинный пост. " * 400))
+    assert other.is_full(8)
+    assert other.get_usage(8)['messages'] == 2
+
+def test_utf16_units_count_emoji_twice():
+    budget = make_budget(units=2000)
+    budget.add(7, make_message(1, "🎉" * 600))
+    usage = budget.get_usage(7)
+    assert usage['utf16_units'] >= usage['chars'] + 600
+    assert not budget.is_full(7)
+    budget.add(7, make_message(2, "🎉" * 600))
+    assert budget.is_full(7)
+
+def test_links_count_towards_the_request_budget():
+    budget = make_budget(requests=30)
+    links = " ".join(f"https://example.com/{number}" for number in range(20))
+    budget.add(7, make_message(1, links))
+    assert budget.get_usage(7)['requests'] >= 22
+    budget.add(7, make_message(2, links))
+    assert budget.is_full(7)
+
+def test_removed_and_reset_messages_are_not_counted():
+    budget = make_budget(chars=10 ** 6)
+    message = make_message(1, "Пост, удалённый до сброса")
+    budget.add(7, message)
+    budget.remove(7, message)
+    assert budget.get_usage(7) == {'messages': 0, 'chars': 0, 'utf16_units': 0, 'requests': 0}
+    
+    budget.reset(7, [make_message(2, "Вернулся после ошибки")])
+    assert budget.get_usage(7)['messages'] == 1
+
+def test_size_is_not_measured_without_size_limits():
+    budget = make_budget(batch_size=5)
+    budget.add(7, make_message(1, "Длинный пост. " * 400))
+    assert budget.get_usage(7)['chars'] == 0
+    assert not budget.is_full(7)
+
+def test_size_is_not_measured_without_a_docs_sink():
+    budget = make_budget(batch_size=2, chars=10000, render=None)
+    budget.add(7, make_message(1, "Длинный пост. " * 4000))
+    assert budget.get_usage(7)['chars'] == 0
+    assert not budget.is_full(7)
+    budget.add(7, make_message(2, "Коротко"))
+    assert budget.is_full(7)
+
+def test_measured_messages_are_not_rendered_again_on_write(service, make_writer, monkeypatch):
+    writer = make_writer()
+    rendered = []
+    original = writer.templates.render
+    monkeypatch.setattr(writer.templates, 'render', lambda message, start: rendered.append(message.id) or original(message, start))
+    
+    budget = make_budget(chars=10000, render=writer.render_message)
+    messages = [make_message(number, f"Пост {number} https://example.com/{number}") for number in range(1, 4)]
+    for message in messages:
+        budget.add(7, message)
+    assert asyncio.run(writer.write_batch(messages))
+    
+    assert rendered == [1, 2, 3]
+    document = service.documents_by_id['doc']
+    assert all(f"Пост {number} https://example.com/{number}" in document.text for number in range(1, 4))
@@ -0,0 +1,87 @@
+"""Тесты для разбиения больших пакетов на части и продолжения записи после сбоя."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from tenacity import RetryError, wait_none
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.fake import FakeDocsService
+from src.telegram.models import MessageData
+
+# Small enough that ten messages need several batchUpdates
+MAX_REQUESTS = 12
+
+class MidBatchOutageDocsService(FakeDocsService):
+    """Answers batchUpdates with 503 after a number of successful ones."""
+    
+    def __init__(self, fail_after, failures=1):
+        super().__init__()
+        self.fail_after = fail_after
+        self.failures = failures
+    
+    def _batch_update(self, document_id, body):
+        if self.fail_after == 0 and self.failures:
+            self.failures -= 1
+            raise self._error(503, "Backend Error")
+        if self.fail_after:
+            self.fail_after -= 1
+        return super()._batch_update(document_id, body)
+
+def make_messages(count):
+    return [MessageData(id=number, text=f"Сообщение {number} https://example.com/{number}",
+                        date=datetime(2024, 1, 1), channel_id=7)
+            for number in range(1, count + 1)]
+
+def assert_written_once(text, count):
+    assert text.count("📦 BATCH UPDATE") == 1
+    assert text.count("✅ Batch completed") == 1
+    assert all(text.count(f"Сообщение {number} ") == 1 for number in range(1, count + 1))
+    positions = [text.index(f"Сообщение {number} ") for number in range(1, count + 1)]
+    assert positions == sorted(positions)
+
+def test_batch_over_the_request_cap_is_split_at_message_boundaries(service, make_writer):
+    writer = make_writer(google_max_requests_per_batch=MAX_REQUESTS)
+    
+    assert asyncio.run(writer.write_batch(make_messages(10)))
+    
+    assert len(service.batches) > 1
+    assert all(len(batch['requests']) <= MAX_REQUESTS for batch in service.batches)
+    assert_written_once(service.get_text('doc'), 10)
+    document = service.documents_by_id['doc']
+    assert writer.tracker.end_index == document.end_index
+    links = [document.text_at(start, end) for start, end, style in document.styles if style.get('link')]
+    assert links == [f"https://example.com/{number}" for number in range(1, 11)]
+
+def test_503_mid_batch_resumes_from_the_failed_chunk(make_writer, state, monkeypatch):
+    monkeypatch.setattr(GoogleDocsWriter.commit_batch.retry, 'wait', wait_none())
+    service = MidBatchOutageDocsService(fail_after=1)
+    service.create_document('doc')
+    writer = make_writer(service=service, google_max_requests_per_batch=MAX_REQUESTS)
+    prepared = writer.prepare_batch(make_messages(10))
+    assert len(prepared.chunks) > 2
+    
+    assert asyncio.run(writer.commit_batch(prepared))
+    
+    # The first chunk is not sent again and nothing is written twice
+    assert len(service.batches) == len(prepared.chunks)
+    assert_written_once(service.get_text('doc'), 10)
+    assert state.get_batch_checkpoint('doc') is None
+    assert writer.tracker.end_index == service.documents_by_id['doc'].end_index
+
+def test_batch_failed_partway_resumes_when_submitted_again(make_writer, monkeypatch):
+    monkeypatch.setattr(GoogleDocsWriter.commit_batch.retry, 'wait', wait_none())
+    # The outage outlasts the retries of the first attempt
+    service = MidBatchOutageDocsService(fail_after=1, failures=3)
+    service.create_document('doc')
+    writer = make_writer(service=service, google_max_requests_per_batch=MAX_REQUESTS)
+    messages = make_messages(10)
+    chunks = len(writer.prepare_batch(messages).chunks)
+    
+    with pytest.raises(RetryError):
+        asyncio.run(writer.write_batch(messages))
+    # Messages of the committed first chunk are in the index now
+    assert asyncio.run(writer.write_batch(messages))
+    
+    assert len(service.batches) == chunks
+    assert_written_once(service.get_text('doc'), 10)
@@ -0,0 +1,43 @@
+"""Тесты для отложенного применения стилей."""
+import asyncio
+from datetime import datetime
+
+from src.telegram.models import MessageData
+
+def test_batch_writes_text_only_and_queues_styles(service, make_writer):
+    writer = make_writer(deferred_styling=True)
+    messages = [MessageData(id=1, text="see https://example.com", date=datetime.now(), channel_id=1)]
+    
+    assert asyncio.run(writer.write_batch(messages))
+    assert len(service.batches) == 1
+    assert [next(iter(request)) for request in service.batches[0]['requests']] == ['insertText', 'createNamedRange', 'createNamedRange']
+    assert writer.pending_style_jobs() == 1
+    
+    assert asyncio.run(writer.apply_style_jobs()) == 1
+    assert all('updateTextStyle' in request for request in service.batches[1]['requests'])
+    assert writer.pending_style_jobs() == 0
+    
+    document = service.documents_by_id['doc']
+    links = [(start, end) for start, end, style in document.styles if style.get('link')]
+    assert [document.text_at(start, end) for start, end in links] == ["https://example.com"]
+
+def test_edit_before_queued_styles_moves_them(service, make_writer):
+    writer = make_writer(deferred_styling=True)
+    first = MessageData(id=1, text="short", date=datetime.now(), channel_id=1)
+    second = MessageData(id=2, text="see https://example.com", date=datetime.now(), channel_id=1)
+    asyncio.run(writer.write_batch([first]))
+    asyncio.run(writer.write_batch([second]))
+    assert writer.pending_style_jobs() == 2
+    
+    # The edit grows the first message; its own queued styles are replaced with the edit's
+    edited = MessageData(id=1, text="a much longer text with https://example.org", date=datetime.now(), channel_id=1)
+    assert asyncio.run(writer.replace_messages([edited])) == 1
+    
+    assert asyncio.run(writer.apply_style_jobs(limit=10)) == 2
+    document = service.documents_by_id['doc']
+    links = sorted((start, end) for start, end, style in document.styles if style.get('link'))
+    assert [document.text_at(start, end) for start, end in links] == ["https://example.org", "https://example.com"]
+    # The first batch's footer is styled where it now is, after the longer message
+    footers = [document.text_at(start, end) for start, end, style in document.styles if style.get('italic')]
+    assert len(footers) == 2
+    assert all(footer.startswith("\n─") and footer.endswith("\n\n") and "✅ Batch completed" in footer for footer in footers)
@@ -0,0 +1,15 @@
+"""Тесты для сборки сервиса Google Docs из локального discovery-документа."""
+import httplib2
+
+from src.google.discovery import build_docs_service, get_discovery_document
+
+def test_service_is_built_offline_and_reuses_its_resource():
+    document = get_discovery_document()
+    assert document['name'] == 'docs'
+    assert get_discovery_document() is document
+    
+    service = build_docs_service(httplib2.Http())
+    assert service.documents() is service.documents()
+    
+    request = service.documents().batchUpdate(documentId='doc', body={'requests': []})
+    assert request.uri.startswith('https://docs.googleapis.com/v1/documents/doc:batchUpdate')
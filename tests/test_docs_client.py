@@ -0,0 +1,118 @@
+"""Тесты для GoogleDocsWriter на локальной замене Google Docs API."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.google.fake import FakeDocsService
+from src.telegram.models import MessageData
+
+def make_messages(count, text="Новость 🚀 подробнее https://example.com/news."):
+    return [
+        MessageData(id=number, text=text, date=datetime(2024, 1, 1), channel_id=1,
+                    channel_name="Канал", original_link=f"https://t.me/channel/{number}")
+        for number in range(1, count + 1)
+    ]
+
+@pytest.fixture
+def env(service, make_writer):
+    service.create_document('doc', "Archive\n")
+    return service, make_writer(google_max_workers=2)
+
+def test_batch_with_emoji_is_styled_in_one_update(env):
+    service, writer = env
+    
+    assert asyncio.run(writer.write_batch(make_messages(3)))
+    
+    document = service.documents_by_id['doc']
+    assert len(service.batches) == 1
+    assert service.calls['rejected'] == 0
+    assert writer.tracker.end_index == document.end_index
+    
+    # Every link range covers exactly the linked text
+    links = [(start, end, style['link']['url']) for start, end, style in document.styles if style.get('link')]
+    assert (document.text_at(*links[0][:2]), links[0][2]) == ("https://example.com/news", "https://example.com/news")
+    assert document.text_at(*links[1][:2]) == "🔗 View in Telegram"
+
+def test_external_edit_is_detected_and_rebased(env):
+    service, writer = env
+    asyncio.run(writer.write_batch(make_messages(1)))
+    
+    # Someone types into the document between two archiver writes
+    asyncio.run(writer.transport.batch_update('doc', {'requests': [
+        {'insertText': {'location': {'index': 1}, 'text': "Заметка 📝\n"}}
+    ]}))
+    asyncio.run(writer.write_batch(make_messages(2)))
+    
+    document = service.documents_by_id['doc']
+    assert service.calls['rejected'] == 1
+    assert writer.tracker.end_index == document.end_index
+    assert document.text.startswith("Заметка 📝\nArchive\n")
+    assert document.text.endswith("\n\n\n")
+
+def test_fake_rejects_invalid_batches_atomically():
+    service = FakeDocsService(max_payload_bytes=2000)
+    service.create_document('doc', "😀")
+    documents = service.documents()
+    
+    with pytest.raises(HttpError) as error:
+        documents.batchUpdate(documentId='doc', body={'requests': [
+            {'insertText': {'location': {'index': 1}, 'text': "ok"}},
+            {'insertText': {'location': {'index': 4}, 'text': "split"}},
+        ]}).execute()
+    assert error.value.resp.status == 400
+    assert service.get_text('doc') == "😀\n"
+    
+    with pytest.raises(HttpError):
+        documents.batchUpdate(documentId='doc', body={'requests': [
+            {'insertText': {'location': {'index': 1}, 'text': "x" * 3000}}
+        ]}).execute()
+    
+    revision = documents.get(documentId='doc').execute()['revisionId']
+    reply = documents.batchUpdate(documentId='doc', body={
+        'requests': [{'insertText': {'location': {'index': 3}, 'text': "!"}}],
+        'writeControl': {'requiredRevisionId': revision}
+    }).execute()
+    assert reply['writeControl']['requiredRevisionId'] != revision
+    assert service.get_text('doc') == "😀!\n"
+
+def test_fake_quota_answers_429_with_retry_after():
+    service = FakeDocsService(read_quota_per_minute=1)
+    service.create_document('doc')
+    documents = service.documents()
+    
+    documents.get(documentId='doc').execute()
+    with pytest.raises(HttpError) as error:
+        documents.get(documentId='doc').execute()
+    assert error.value.resp.status == 429
+    assert int(error.value.resp['retry-after']) > 0
+
+def test_prepared_batch_is_rebased_after_a_revision_conflict(env):
+    service, writer = env
+    asyncio.run(writer.write_batch(make_messages(1)))
+    
+    # Rendered at the predicted end, then the document changes before the commit
+    prepared = writer.prepare_batch(make_messages(3)[1:], writer.tracker.insert_index)
+    revision = service.documents_by_id['doc'].revision_id
+    asyncio.run(writer.transport.batch_update('doc', {'requests': [
+        {'insertText': {'location': {'index': 1}, 'text': "Заметка 📝\n"}}
+    ]}))
+    assert service.documents_by_id['doc'].revision_id != revision
+    
+    assert asyncio.run(writer.commit_batch(prepared))
+    
+    document = service.documents_by_id['doc']
+    assert service.calls['rejected'] == 1
+    assert writer.revision_conflicts == 1
+    assert writer.tracker.end_index == document.end_index
+    assert document.text.startswith("Заметка 📝\nArchive\n")
+    # Styles and named ranges sit on the rebased text
+    links = [(document.text_at(start, end), style['link']['url']) for start, end, style in document.styles if style.get('link')]
+    assert links.count(("https://example.com/news", "https://example.com/news")) == 3
+    assert [url for text, url in links if text == "🔗 View in Telegram"] == [
+        f"https://t.me/channel/{number}" for number in (1, 2, 3)
+    ]
+    for number in (2, 3):
+        _, start, end = asyncio.run(writer.locate_message(1, number))
+        assert document.text_at(start, end).startswith("2024-01-01 00:00:00 | 📢 Канал")
@@ -0,0 +1,88 @@
+"""Тесты для синхронизации отредактированных и удалённых сообщений."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from src.google.index import MessageIndex
+from src.telegram.client import TelegramClient
+from src.telegram.edits import EditDebouncer
+from src.telegram.models import MessageData
+
+def make_message(number, text):
+    return MessageData(id=number, text=text, date=datetime(2024, 1, 1), channel_id=7, channel_name="Канал")
+
+def test_bursts_collapse_into_one_delivery():
+    deliveries = []
+    
+    async def callback(edited, deleted):
+        deliveries.append(([(message.id, message.text) for message in edited], deleted))
+    
+    async def scenario():
+        debouncer = EditDebouncer(0.05, callback)
+        debouncer.add_edit(make_message(3, "удалится"))
+        for version in range(3):
+            await asyncio.sleep(0.01)
+            debouncer.add_edit(make_message(1, f"версия {version}"))
+            debouncer.add_edit(make_message(2, f"версия {version}"))
+        debouncer.add_delete(7, 3)
+        await asyncio.sleep(0.2)
+        await debouncer.close()
+        return debouncer
+    
+    debouncer = asyncio.run(scenario())
+    
+    assert deliveries == [([(1, "версия 2"), (2, "версия 2")], [(7, 3)])]
+    assert debouncer.collapsed == 5
+
+def test_replacements_and_deletions_share_one_update(service, make_writer):
+    service.create_document('doc', "Archive\n")
+    writer = make_writer()
+    
+    messages = [make_message(number, f"Исходный текст {number}") for number in (1, 2, 3)]
+    assert asyncio.run(writer.write_batch(messages))
+    writes = len(service.batches)
+    
+    edited = [
+        make_message(1, "Исправлено 🚀 https://example.com/fixed"),
+        make_message(3, "Короче"),
+    ]
+    assert asyncio.run(writer.replace_messages(edited, [(7, 2), (7, 99)])) == 3
+    assert len(service.batches) == writes + 1
+    
+    document = service.documents_by_id['doc']
+    text = document.text
+    assert "Исходный текст" not in text
+    assert text.index("Исправлено 🚀") < text.index("Короче")
+    assert writer.tracker.end_index == document.end_index
+    
+    named = {named['name']: (named['ranges'][0]['startIndex'], named['ranges'][0]['endIndex'])
+             for named in document.named_ranges.values()
+             if MessageIndex.parse_range_name(named['name'])}
+    assert set(named) == {MessageIndex.range_name(7, 1), MessageIndex.range_name(7, 3)}
+    for number, fragment in ((1, "Исправлено 🚀"), (3, "Короче")):
+        _, start, end = asyncio.run(writer.locate_message(7, number))
+        assert (start, end) == named[MessageIndex.range_name(7, number)]
+        assert fragment in document.text_at(start, end)
+    assert asyncio.run(writer.locate_message(7, 2)) is None
+    
+    links = [(start, end) for start, end, style in document.styles if style.get('link')]
+    assert [document.text_at(start, end) for start, end in links] == ["https://example.com/fixed"]
+
+def test_stop_removes_the_edit_and_delete_handlers(tmp_path):
+    settings = SimpleNamespace(telegram_session_name=tmp_path / "session", telegram_api_id=1, telegram_api_hash="hash")
+    
+    async def ignore(*args):
+        pass
+    
+    async def scenario():
+        telegram = TelegramClient(settings)
+        # Nothing to connect to: listening returns at once
+        telegram.client.run_until_disconnected = ignore
+        telegram.client.disconnect = ignore
+        
+        await telegram.listen_channel([7], ignore, on_edit=ignore, on_delete=ignore)
+        assert len(telegram.client.list_event_handlers()) == 3
+        await telegram.stop()
+        return telegram.client.list_event_handlers()
+    
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,181 @@
+"""Тесты для доставки пакетов в несколько приёмников с независимыми курсорами."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from tenacity import wait_none
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.fake import FakeDocsService
+from src.google.pool import WriterPool
+from src.sinks.fanout import SinkFanOut, SinkLane
+from src.sinks.local import LocalSinkPool
+from src.telegram.models import MessageData
+
+class FlakySinkPool:
+    """Sink pool that fails while `down` is set and records what it wrote."""
+    
+    def __init__(self, down=False):
+        self.down = down
+        self.written = []
+        self.edits = []
+    
+    async def submit_batch(self, document_id, messages):
+        future = asyncio.get_running_loop().create_future()
+        if self.down:
+            future.set_exception(RuntimeError("sink is down"))
+        else:
+            self.written.extend(message.id for message in messages)
+            future.set_result(True)
+        return future
+    
+    async def replace_messages(self, document_id, messages, deleted=None):
+        self.edits.extend(message.id for message in messages)
+        return len(messages)
+    
+    async def test_connection(self, document_ids=None):
+        return not self.down
+    
+    def start(self, document_ids=None):
+        pass
+    
+    def get_metrics(self):
+        return {'written': len(self.written)}
+    
+    async def close(self):
+        pass
+
+class OutageDocsService(FakeDocsService):
+    """Rejects writes of one message with 503 a given number of times."""
+    
+    def __init__(self, marker, failures):
+        super().__init__()
+        self.marker = marker
+        self.failures = failures
+    
+    def _batch_update(self, document_id, body):
+        texts = [request['insertText']['text'] for request in body['requests'] if 'insertText' in request]
+        if self.failures and any(self.marker in text for text in texts):
+            self.failures -= 1
+            raise self._error(503, "Backend Error")
+        return super()._batch_update(document_id, body)
+
+def make_batch(start, count=2):
+    return [MessageData(id=number, text=f"Сообщение {number}", date=datetime(2024, 1, 1), channel_id=1)
+            for number in range(start, start + count)]
+
+def make_local(tmp_path, fsync_interval=0.05):
+    return LocalSinkPool(SimpleNamespace(
+        local_sink_path=tmp_path / "archive", local_sink_format='jsonl',
+        local_sink_segment_bytes=10 ** 6, local_sink_fsync_interval=fsync_interval
+    ))
+
+def test_failing_sink_does_not_hold_back_others_and_catches_up(tmp_path, state, monkeypatch):
+    monkeypatch.setattr(SinkLane, 'RETRY_BASE_SECONDS', 0.05)
+    docs = FlakySinkPool(down=True)
+    fanout = SinkFanOut({'gdocs': docs, 'local': make_local(tmp_path)}, state)
+    
+    async def run():
+        assert await fanout.test_connection(['doc'])
+        fanout.start({1: 'doc'})
+        for start in (1, 3, 5):
+            await fanout.publish(1, 'doc', make_batch(start))
+        await fanout.flush()
+        
+        # The local sink is done while the Docs sink waits to retry its first batch
+        metrics = fanout.get_metrics()
+        assert metrics['local']['channels'][1]['lag'] == 0
+        assert metrics['gdocs']['channels'][1]['lag'] == 3
+        assert state.get_journal_batch(1, 1) is not None
+        
+        docs.down = False
+        await asyncio.sleep(0.2)
+        await fanout.flush()
+        await fanout.close()
+    
+    asyncio.run(run())
+    assert docs.written == [1, 2, 3, 4, 5, 6]
+    assert state.get_sink_cursor('gdocs', 1) == state.get_sink_cursor('local', 1) == 3
+    # Written by every sink, so the journal is trimmed
+    assert state.get_journal_tail(1) == 4
+    assert state.get_journal_batch(1, 3) is None
+
+def test_lagging_sink_catches_up_from_journal_after_restart(tmp_path, state):
+    docs = FlakySinkPool(down=True)
+    local = make_local(tmp_path)
+    
+    async def first_run():
+        fanout = SinkFanOut({'gdocs': docs, 'local': local}, state)
+        fanout.start({1: 'doc'})
+        await fanout.publish(1, 'doc', make_batch(1))
+        await fanout.publish(1, 'doc', make_batch(3))
+        await fanout.flush()
+        await fanout.close()
+    
+    asyncio.run(first_run())
+    assert docs.written == []
+    assert state.get_sink_cursor('local', 1) == 2
+    
+    docs.down = False
+    
+    async def second_run():
+        fanout = SinkFanOut({'gdocs': docs, 'local': make_local(tmp_path)}, state)
+        fanout.start({1: 'doc'})
+        await asyncio.sleep(0.05)
+        await fanout.flush()
+        # Edits wait for the batches journaled before them
+        await fanout.replace_messages(1, 'doc', make_batch(2, 1))
+        await fanout.flush()
+        await fanout.close()
+    
+    asyncio.run(second_run())
+    assert docs.written == [1, 2, 3, 4]
+    assert docs.edits == [2]
+    assert state.get_journal_tail(1) == 3
+
+def test_failed_batch_is_retried_before_the_batches_behind_it(state, make_settings, monkeypatch):
+    monkeypatch.setattr(SinkLane, 'RETRY_BASE_SECONDS', 0.05)
+    monkeypatch.setattr(GoogleDocsWriter.commit_batch.retry, 'wait', wait_none())
+    # Batch 2 of 4 fails every attempt of its first commit
+    service = OutageDocsService("Сообщение 3\n", failures=3)
+    service.create_document('doc')
+    pool = WriterPool(make_settings(google_max_workers=2, pipeline_depth=2), state, service=service)
+    fanout = SinkFanOut({'gdocs': pool}, state)
+    
+    async def run():
+        fanout.start({1: 'doc'})
+        for start in (1, 3, 5, 7):
+            await fanout.publish(1, 'doc', make_batch(start))
+        await fanout.flush()
+        await asyncio.sleep(0.3)
+        await fanout.flush()
+        await fanout.close()
+    
+    asyncio.run(run())
+    text = service.get_text('doc')
+    positions = [text.index(f"Сообщение {number}\n") for number in range(1, 9)]
+    assert positions == sorted(positions)
+    assert all(text.count(f"Сообщение {number}\n") == 1 for number in range(1, 9))
+    assert state.get_sink_cursor('gdocs', 1) == 4
+    assert fanout.get_metrics()['gdocs']['channels'][1]['failures'] >= 1
+
+def test_cursor_waits_for_the_local_fsync(tmp_path, state):
+    local = make_local(tmp_path, fsync_interval=0.3)
+    fanout = SinkFanOut({'local': local}, state)
+    
+    async def run():
+        fanout.start({1: 'doc'})
+        await fanout.publish(1, 'doc', make_batch(1))
+        await asyncio.sleep(0.05)
+        
+        # Appended but not fsynced yet: a crash now must not lose the batch
+        assert local.sinks['doc'].fsyncs == 0
+        assert state.get_sink_cursor('local', 1) is None
+        assert state.get_journal_batch(1, 1) is not None
+        
+        await fanout.flush()
+        assert local.sinks['doc'].fsyncs == 1
+        assert state.get_sink_cursor('local', 1) == 1
+        await fanout.close()
+    
+    asyncio.run(run())
@@ -0,0 +1,59 @@
+"""Тесты для однократной записи пакетов при потерянных ответах и повторах."""
+import asyncio
+from datetime import datetime
+
+from tenacity import wait_none
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.fake import FakeDocsService
+from src.telegram.models import MessageData
+
+class LostReplyDocsService(FakeDocsService):
+    """Applies a batchUpdate and then loses the reply, like a dropped connection."""
+    
+    def __init__(self, lost_replies: int):
+        super().__init__()
+        self.lost_replies = lost_replies
+    
+    def _batch_update(self, document_id, body):
+        result = super()._batch_update(document_id, body)
+        if self.lost_replies:
+            self.lost_replies -= 1
+            raise TimeoutError("The read operation timed out")
+        return result
+
+def make_messages(*numbers):
+    return [MessageData(id=number, text=f"Пост номер {number}", date=datetime(2024, 1, 1), channel_id=7)
+            for number in numbers]
+
+def test_retry_after_lost_reply_does_not_write_twice(make_writer, monkeypatch):
+    monkeypatch.setattr(GoogleDocsWriter.commit_batch.retry, 'wait', wait_none())
+    service = LostReplyDocsService(lost_replies=1)
+    service.create_document('doc')
+    writer = make_writer(service=service)
+    
+    assert asyncio.run(writer.write_batch(make_messages(1, 2)))
+    
+    # The first batchUpdate landed; the retry found its commit marker
+    assert len(service.batches) == 1
+    text = service.get_text('doc')
+    assert text.count("Пост номер 1") == 1 and text.count("Пост номер 2") == 1
+    assert writer.duplicates_skipped == 1
+    assert writer.tracker.end_index == service.documents_by_id['doc'].end_index
+    assert writer.index.get(7, 2) is not None
+
+def test_committed_batch_is_skipped_without_api_calls(service, make_writer):
+    writer = make_writer()
+    messages = make_messages(1, 2)
+    prepared = writer.prepare_batch(messages)
+    
+    assert asyncio.run(writer.commit_batch(prepared))
+    calls = dict(service.calls)
+    assert asyncio.run(writer.commit_batch(prepared))
+    assert service.calls == calls
+    
+    # Messages fetched again by a catch-up are left out of the next batch
+    assert asyncio.run(writer.write_batch(make_messages(2, 3)))
+    text = service.get_text('doc')
+    assert text.count("Пост номер 2") == 1 and text.count("Пост номер 3") == 1
+    assert writer.get_metrics()['duplicates_skipped'] == 3
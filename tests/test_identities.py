@@ -0,0 +1,60 @@
+"""Тесты для распределения вызовов Docs API между несколькими учётными записями."""
+import asyncio
+import time
+
+import pytest
+
+from src.exceptions.custom import GoogleDocsError
+from src.google.auth import CredentialsProvider
+from src.google.fake import FakeDocsService
+from src.google.ratelimit import DocsRateLimiter
+from src.google.transport import DocsTransport, Identity
+
+def make_transport(service, count):
+    # 60 writes per minute: a burst of 6 tokens, then one per second
+    identities = [
+        Identity(f"sa-{number}", None, DocsRateLimiter(60, 60), service_factory=lambda: service)
+        for number in range(count)
+    ]
+    return DocsTransport(None, 2, identities=identities)
+
+def insert(text):
+    return {'requests': [{'insertText': {'location': {'index': 1}, 'text': text}}]}
+
+def test_writes_are_spread_across_identities():
+    service = FakeDocsService()
+    service.create_document('doc')
+    transport = make_transport(service, 2)
+    
+    async def write():
+        for number in range(12):
+            await transport.batch_update('doc', insert(f"{number}\n"))
+    
+    started = time.monotonic()
+    asyncio.run(write())
+    # Two full bursts, so nothing waited for a refill
+    assert time.monotonic() - started < 0.9
+    assert [identity.calls for identity in transport.identities] == [6, 6]
+    assert len(service.batches) == 12
+    
+    metrics = transport.get_quota_metrics()
+    assert metrics['sa-0']['calls'] == 6
+    assert metrics['sa-1']['write']['calls'] == 6
+    transport.close()
+
+def test_spare_quota_of_any_identity_counts():
+    service = FakeDocsService()
+    service.create_document('doc')
+    transport = make_transport(service, 2)
+    transport.identities[0].limiter.buckets[DocsRateLimiter.WRITE].tokens = 0
+    
+    assert transport.has_spare(DocsRateLimiter.WRITE, 0.5)
+    assert asyncio.run(transport.batch_update('doc', insert("x\n")))
+    assert transport.identities[1].calls == 1
+    transport.close()
+
+def test_headless_mode_fails_without_token(tmp_path):
+    provider = CredentialsProvider(tmp_path / "credentials.json", tmp_path / "token.pickle", interactive=False)
+    
+    with pytest.raises(GoogleDocsError, match="interactive authorization is disabled"):
+        provider.load()
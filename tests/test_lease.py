@@ -0,0 +1,123 @@
+"""Тесты для совместной записи в один документ из нескольких процессов."""
+import asyncio
+from datetime import datetime
+
+from src.google.fake import FakeDocsService
+from src.google.index import MessageIndex
+from src.google.lease import DocumentLease
+from src.google.tracker import DocumentTracker
+from src.storage.state import StateManager
+from src.telegram.models import MessageData
+
+# Quotas high enough that only the lease makes writers wait
+QUOTAS = dict(google_max_workers=2, google_read_quota_per_minute=6000, google_write_quota_per_minute=6000)
+
+def make_messages(channel_id, numbers):
+    return [MessageData(id=number, text=f"Канал {channel_id}, пост {number}", date=datetime(2024, 1, 1),
+                        channel_id=channel_id)
+            for number in numbers]
+
+async def write_concurrently(writers):
+    async def run(writer, channel_id):
+        for number in range(1, 31, 3):
+            assert await writer.write_batch(make_messages(channel_id, range(number, number + 3)))
+    await asyncio.gather(*(run(writer, channel_id) for channel_id, writer in enumerate(writers, 1)))
+
+def check_document(service, writers):
+    document = service.documents_by_id['doc']
+    text = service.get_text('doc')
+    for channel_id in range(1, len(writers) + 1):
+        for number in range(1, 31):
+            assert text.count(f"Канал {channel_id}, пост {number}\n") == 1
+    
+    # Every message range a writer indexed covers that message in the document
+    index = MessageIndex('doc')
+    index.sync_from_document(service.documents().get(documentId='doc', fields=MessageIndex.SYNC_FIELDS).execute())
+    for channel_id in range(1, len(writers) + 1):
+        for number in range(1, 31):
+            entry = index.get(channel_id, number)
+            assert f"Канал {channel_id}, пост {number}\n" in document.text_at(entry['start'], entry['end'])
+
+def test_processes_with_shared_lease_do_not_conflict(tmp_path, make_writer):
+    service = FakeDocsService(latency=0.002, jitter=0.002, seed=1)
+    service.create_document('doc')
+    # Separate state databases in one directory, like two processes on one host
+    states = [StateManager(tmp_path / f"state-{number}.db") for number in range(2)]
+    writers = [make_writer(service=service, state=state, **QUOTAS) for state in states]
+    
+    asyncio.run(write_concurrently(writers))
+    
+    check_document(service, writers)
+    assert sum(writer.revision_conflicts for writer in writers) == 0
+    assert sum(writer.get_metrics()['lease_waits'] for writer in writers) > 0
+    for writer, state in zip(writers, states):
+        writer.close()
+        state.close()
+
+def test_writers_without_shared_lease_rebase_on_conflict(tmp_path, make_writer):
+    service = FakeDocsService(latency=0.002, jitter=0.002, seed=2)
+    service.create_document('doc')
+    states = [StateManager(tmp_path / f"host-{number}" / "state.db") for number in range(2)]
+    writers = [make_writer(service=service, state=state, **QUOTAS) for state in states]
+    
+    asyncio.run(write_concurrently(writers))
+    
+    # Revision checks alone keep the content intact, at the cost of rejected writes
+    check_document(service, writers)
+    assert sum(writer.revision_conflicts for writer in writers) > 0
+    for writer, state in zip(writers, states):
+        writer.close()
+        state.close()
+
+def test_lease_invalidates_tracker_after_another_writer(tmp_path):
+    first = DocumentLease(tmp_path, 'doc')
+    second = DocumentLease(tmp_path, 'doc')
+    tracker = DocumentTracker('doc')
+    tracker.sync_from_document({'revisionId': 'rev-1', 'body': {'content': [{'endIndex': 10}]}})
+    
+    async def scenario():
+        async with first.hold(tracker):
+            # The other holder has to wait until the first write is done
+            waiting = asyncio.ensure_future(second.acquire())
+            await asyncio.sleep(0.02)
+            assert not waiting.done()
+            tracker.sync_from_document({'revisionId': 'rev-2', 'body': {'content': [{'endIndex': 20}]}})
+        assert await waiting == 'rev-2'
+        second.release('rev-3')
+        
+        async with first.hold(tracker):
+            assert not tracker.is_synced
+    
+    asyncio.run(scenario())
+    assert second.waits == 1
+    first.close()
+    second.close()
+
+def test_style_jobs_wait_for_the_lease(tmp_path, service, make_writer):
+    writer = make_writer(deferred_styling=True)
+    assert asyncio.run(writer.write_batch([MessageData(id=1, text="см. https://example.com", date=datetime(2024, 1, 1),
+                                                       channel_id=1)]))
+    assert writer.pending_style_jobs() == 1
+    other = DocumentLease(tmp_path / "leases", 'doc')
+    
+    async def scenario():
+        await other.acquire()
+        styling = asyncio.ensure_future(writer.apply_style_jobs())
+        await asyncio.sleep(0.05)
+        assert not styling.done()
+        
+        # Another process appends while it holds the lease
+        end = service.documents_by_id['doc'].end_index
+        reply = service.documents().batchUpdate(documentId='doc', body={
+            'requests': [{'insertText': {'location': {'index': end - 1}, 'text': "Другой процесс\n"}}]
+        }).execute()
+        other.release(reply['writeControl']['requiredRevisionId'])
+        return await styling
+    
+    assert asyncio.run(scenario()) == 1
+    # The writer re-read the document under the lease instead of sending a stale revision
+    assert service.calls['rejected'] == 0
+    document = service.documents_by_id['doc']
+    links = [document.text_at(start, end) for start, end, style in document.styles if style.get('link')]
+    assert links == ["https://example.com"]
+    other.close()
@@ -0,0 +1,20 @@
+"""Тесты для разбора ссылок в тексте сообщений."""
+from src.utils.links import clean_url, extract_links, extract_urls
+
+def test_markdown_link_is_reported_once():
+    text = "Читайте [статью](https://example.com/post) и https://t.me/channel/42."
+    links = extract_links(text)
+    
+    assert [url for url, _, _ in links] == ["https://example.com/post", "https://t.me/channel/42"]
+    assert links[0][1:] == (text.index("["), text.index(")") + 1)
+    
+    # Spans never overlap and the trailing period stays outside the link
+    start, end = links[1][1:]
+    assert links[0][2] <= start
+    assert text[start:end] == "https://t.me/channel/42"
+
+def test_clean_url_and_plain_text():
+    assert clean_url("example.com/a),") == "https://example.com/a"
+    assert clean_url("http https://example.com") == "https://example.com"
+    assert extract_links("") == []
+    assert extract_urls("без ссылок") == []
@@ -0,0 +1,113 @@
+"""Тесты для локального архива в файлах Markdown и JSONL."""
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.formatter import format_messages_for_gdocs
+from src.google.pool import WriterPool
+from src.sinks.base import Sink, SinkPool
+from src.sinks.local import LocalFileSink, LocalSinkPool
+from src.telegram.models import MessageData
+
+def make_messages(count, start=1):
+    return [
+        MessageData(id=number, text=f"Сообщение {number} https://example.com/{number}",
+                    date=datetime(2024, 1, 1), channel_id=1, channel_name="Канал")
+        for number in range(start, start + count)
+    ]
+
+def test_writers_implement_sink_protocols():
+    assert issubclass(GoogleDocsWriter, Sink)
+    assert issubclass(LocalFileSink, Sink)
+    assert issubclass(WriterPool, SinkPool)
+    assert issubclass(LocalSinkPool, SinkPool)
+
+def test_markdown_matches_batch_formatting_across_batches(tmp_path):
+    sink = LocalFileSink(tmp_path, 'doc')
+    messages = make_messages(5)
+    
+    async def write():
+        await sink.write_batch(messages[:2])
+        await sink.write_batch(messages[2:])
+    
+    asyncio.run(write())
+    sink.close()
+    
+    assert sink.segment_path.read_text(encoding='utf-8') == format_messages_for_gdocs(messages)
+    assert sink.get_metrics()['messages_written'] == 5
+
+def test_segments_rotate_and_restart_appends_to_latest(tmp_path):
+    sink = LocalFileSink(tmp_path, 'doc', 'jsonl', segment_bytes=1024)
+    asyncio.run(sink.write_batch(make_messages(10)))
+    sink.close()
+    
+    segments = sorted((tmp_path / 'doc').iterdir())
+    assert len(segments) > 1
+    assert all(path.stat().st_size <= 1024 for path in segments)
+    
+    restarted = LocalFileSink(tmp_path, 'doc', 'jsonl', segment_bytes=1024)
+    asyncio.run(restarted.replace_messages(make_messages(1, start=3), deleted=[(1, 4)]))
+    restarted.close()
+    
+    records = [json.loads(line) for path in sorted((tmp_path / 'doc').iterdir()) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [record['id'] for record in records if record['op'] == 'message'] == list(range(1, 11))
+    assert [(record['op'], record['id']) for record in records[-2:]] == [('edit', 3), ('delete', 4)]
+
+def test_writes_are_fsynced_in_groups(tmp_path):
+    sink = LocalFileSink(tmp_path, 'doc', fsync_interval=0.05)
+    
+    async def write():
+        for number in range(20):
+            await sink.write_batch(make_messages(1, start=number))
+        await asyncio.sleep(0.1)
+    
+    asyncio.run(write())
+    # All twenty batches share one fsync
+    assert sink.fsyncs == 1
+    assert sink.segment_path.stat().st_size == sink.bytes_written
+    sink.close()
+
+def test_file_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    sink = LocalFileSink(tmp_path, 'doc', fsync_interval=0)
+    threads = []
+    original = os.fsync
+    
+    def fsync(fd):
+        threads.append(threading.current_thread())
+        original(fd)
+    
+    monkeypatch.setattr('src.sinks.local.os.fsync', fsync)
+    
+    async def write():
+        for number in range(3):
+            await sink.write_batch(make_messages(1, start=number))
+        # Each write is fsynced before write_batch returns
+        assert len(threads) == 3
+        return threading.current_thread()
+    
+    loop_thread = asyncio.run(write())
+    sink.close()
+    assert threads and all(thread is not loop_thread for thread in threads)
+    assert sink.segment_path.stat().st_size == sink.bytes_written
+
+def test_pool_writes_one_archive_per_route(tmp_path):
+    settings = type('Settings', (), dict(
+        local_sink_path=tmp_path, local_sink_format='markdown',
+        local_sink_segment_bytes=10 ** 6, local_sink_fsync_interval=1.0
+    ))()
+    pool = LocalSinkPool(settings)
+    
+    async def run():
+        assert await pool.test_connection(['doc-a', 'doc/b'])
+        write = await pool.submit_batch('doc-a', make_messages(2))
+        # Resolved by the grouped fsync, not by the append
+        assert not write.done()
+        assert await write and pool.sinks['doc-a'].fsyncs == 1
+        await pool.close()
+    
+    asyncio.run(run())
+    assert (tmp_path / 'doc-a' / 'part-00001.md').stat().st_size > 0
+    assert (tmp_path / 'doc_b').is_dir()
@@ -0,0 +1,132 @@
+"""Тесты для индекса сообщений в документе."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlitedict import SqliteDict
+
+from src.google.fake import FakeDocsService
+from src.google.index import MessageIndex
+from src.telegram.models import MessageData
+
+def make_messages(ids):
+    return [
+        MessageData(id=number, text=f"Сообщение {number} 🚀 https://example.com/{number}",
+                    date=datetime(2024, 1, 1), channel_id=7, channel_name="Канал")
+        for number in ids
+    ]
+
+def named_ranges(document):
+    return {
+        named['name']: (named['ranges'][0]['startIndex'], named['ranges'][0]['endIndex'])
+        for named in document.named_ranges.values()
+    }
+
+def test_messages_are_indexed_and_follow_external_edits(service, make_writer):
+    service.create_document('doc', "Archive\n")
+    writer = make_writer()
+    
+    assert asyncio.run(writer.write_batch(make_messages([1, 2, 3])))
+    document = service.documents_by_id['doc']
+    assert len(service.batches) == 1
+    
+    for number in (1, 2, 3):
+        document_id, start, end = asyncio.run(writer.locate_message(7, number))
+        assert document_id == 'doc'
+        assert document.text_at(start, end).startswith("2024-01-01 00:00:00 | 📢 Канал")
+        assert f"Сообщение {number} 🚀" in document.text_at(start, end)
+        assert named_ranges(document)[MessageIndex.range_name(7, number)] == (start, end)
+    assert asyncio.run(writer.locate_message(7, 4)) is None
+    
+    # Someone edits the document above the archived messages
+    service.documents().batchUpdate(documentId='doc', body={
+        'requests': [{'insertText': {'location': {'index': 1}, 'text': "Заметка 📝\n"}}]
+    }).execute()
+    assert asyncio.run(writer.write_batch(make_messages([4])))
+    document = service.documents_by_id['doc']
+    
+    for number in (1, 2, 3, 4):
+        _, start, end = asyncio.run(writer.locate_message(7, number))
+        assert (start, end) == named_ranges(document)[MessageIndex.range_name(7, number)]
+        assert f"Сообщение {number} 🚀" in document.text_at(start, end)
+    
+    # The index survives a restart without reading the document
+    writer.close()
+    reads = service.calls['read']
+    writer = make_writer()
+    assert asyncio.run(writer.locate_message(7, 2))[1:] == named_ranges(document)[MessageIndex.range_name(7, 2)]
+    assert service.calls['read'] == reads
+
+def test_shift_matches_document_ranges():
+    service = FakeDocsService()
+    document = service.create_document('doc', "0123456789" * 4 + "\n")
+    index = MessageIndex('doc')
+    for number, (start, end) in enumerate([(1, 11), (11, 21), (21, 31), (31, 41)], start=1):
+        index.record(1, number, start, end)
+        document.apply({'createNamedRange': {'name': MessageIndex.range_name(1, number),
+                                             'range': {'startIndex': start, 'endIndex': end}}})
+    
+    edits = [
+        {'insertText': {'location': {'index': 15}, 'text': "😀😀"}},
+        {'insertText': {'location': {'index': 11}, 'text': "ab"}},
+        {'deleteContentRange': {'range': {'startIndex': 5, 'endIndex': 9}}},
+        {'deleteContentRange': {'range': {'startIndex': 25, 'endIndex': 38}}},
+    ]
+    for edit in edits:
+        assert document.apply(edit)[0] is None
+        if 'insertText' in edit:
+            index.shift(edit['insertText']['location']['index'], len(edit['insertText']['text'].encode('utf-16-le')) // 2)
+        else:
+            range_ = edit['deleteContentRange']['range']
+            index.shift(range_['startIndex'], range_['startIndex'] - range_['endIndex'])
+    
+    expected = {name: span for name, span in named_ranges(document).items() if span[0] < span[1]}
+    actual = {MessageIndex.range_name(1, int(key.split(':')[1])): (entry['start'], entry['end'])
+              for key, entry in index.entries.items()}
+    assert actual == expected
+
+def test_index_is_saved_one_message_per_key(state):
+    saved = []
+    save = state.set_message_index_entries
+    state.set_message_index_entries = lambda document_id, entries: (saved.append(dict(entries)), save(document_id, entries))
+    
+    index = MessageIndex('doc', state)
+    for number in range(1, 101):
+        index.record(-100123, number, number * 10, number * 10 + 5)
+        index.save()
+    # Only the message added since the last save is written
+    assert all(len(entries) == 1 for entries in saved)
+    
+    index.remove(-100123, 7)
+    index.save()
+    assert saved[-1] == {'-100123:7': None}
+    
+    # Documents whose ID extends this one's are kept apart
+    other = MessageIndex('doc_2', state)
+    other.record(1, 1, 1, 2)
+    other.save()
+    
+    reloaded = MessageIndex('doc', state)
+    assert len(reloaded) == 99
+    assert reloaded.get(-100123, 8) == {'start': 80, 'end': 85, 'named_range_id': None}
+    assert reloaded.get(-100123, 7) is None
+
+def test_index_saved_as_one_dict_is_migrated(state):
+    state.db['message_index_doc'] = {'7:1': {'start': 1, 'end': 5, 'named_range_id': 'kix.1'}}
+    
+    index = MessageIndex('doc', state)
+    
+    assert index.get(7, 1)['named_range_id'] == 'kix.1'
+    assert 'message_index_doc' not in state.db
+    assert MessageIndex('doc', state).get(7, 1)['end'] == 5
+
+def test_loading_an_index_reads_only_its_document(state, monkeypatch):
+    for number in range(100):
+        state.set_last_message_id(number, number)
+    index = MessageIndex('doc', state)
+    index.record(7, 1, 1, 5)
+    index.save()
+    
+    # Journal, cursor and other keys of the state DB are never scanned
+    monkeypatch.setattr(SqliteDict, 'keys', lambda self: pytest.fail("scanned every key"))
+    assert MessageIndex('doc', state).get(7, 1)['end'] == 5
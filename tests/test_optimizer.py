@@ -0,0 +1,88 @@
+"""Тесты для компактора запросов batchUpdate."""
+from src.google.optimizer import compact_requests
+
+def insert(text, index):
+    return {'insertText': {'location': {'index': index}, 'text': text}}
+
+def style(start, end, **text_style):
+    return {
+        'updateTextStyle': {
+            'range': {'startIndex': start, 'endIndex': end},
+            'textStyle': text_style,
+            'fields': ','.join(sorted(text_style))
+        }
+    }
+
+def link(start, end, url):
+    return style(start, end, link={'url': url})
+
+def test_contiguous_inserts_are_merged():
+    requests = [
+        insert("header\n", 1),
+        style(1, 7, bold=True),
+        insert("body\n", 8),
+        style(8, 12, italic=True),
+    ]
+    result, removed = compact_requests(requests)
+    
+    assert removed == 1
+    assert result[0] == insert("header\nbody\n", 1)
+    assert result[1:] == [style(1, 7, bold=True), style(8, 12, italic=True)]
+
+def test_insert_inside_styled_range_is_not_merged():
+    requests = [
+        insert("abcdef", 1),
+        style(1, 7, bold=True),
+        insert("x", 4),
+    ]
+    result, removed = compact_requests(requests)
+    
+    assert removed == 0
+    assert result == requests
+
+def test_touching_ranges_with_same_style_are_merged():
+    requests = [
+        style(1, 5, bold=True),
+        style(5, 9, bold=True),
+        style(20, 25, bold=True),
+    ]
+    result, removed = compact_requests(requests)
+    
+    assert removed == 1
+    assert result == [style(1, 9, bold=True), style(20, 25, bold=True)]
+
+def test_merge_is_blocked_by_overlapping_different_style():
+    requests = [
+        style(1, 5, bold=True),
+        style(4, 6, italic=True),
+        style(5, 9, bold=True),
+    ]
+    result, removed = compact_requests(requests)
+    
+    assert removed == 0
+    assert result == requests
+
+def test_overlapping_links_are_dropped():
+    requests = [
+        link(10, 40, "https://example.com"),
+        link(20, 39, "https://example.com"),
+        link(50, 60, "https://t.me/x/1"),
+    ]
+    result, removed = compact_requests(requests)
+    
+    assert removed == 1
+    assert result == [link(10, 40, "https://example.com"), link(50, 60, "https://t.me/x/1")]
+
+def test_other_requests_are_barriers():
+    named = {'createNamedRange': {'name': 'n', 'range': {'startIndex': 1, 'endIndex': 3}}}
+    requests = [insert("ab", 1), named, insert("cd", 3)]
+    result, removed = compact_requests(requests)
+    
+    assert removed == 0
+    assert result == requests
+
+def test_input_requests_are_not_mutated():
+    first = insert("ab", 1)
+    compact_requests([first, insert("cd", 3)])
+    
+    assert first == insert("ab", 1)
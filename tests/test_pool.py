@@ -0,0 +1,121 @@
+"""Тесты для пула писателей с отдельным актором на каждый документ."""
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from tenacity import RetryError, wait_none
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.fake import FakeDocsService
+from src.google.pool import WriterPool
+from src.telegram.models import MessageData
+
+class GatedDocsService(FakeDocsService):
+    """Counts concurrent batchUpdates per document and can hold, join or fail them."""
+    
+    def __init__(self):
+        super().__init__(latency=0.01)
+        self.barrier = None
+        self.gates = {}
+        self.failing = set()
+        self.active = Counter()
+        self.max_active = Counter()
+        self._guard = threading.Lock()
+    
+    def _batch_update(self, document_id, body):
+        with self._guard:
+            self.active[document_id] += 1
+            self.max_active[document_id] = max(self.max_active[document_id], self.active[document_id])
+        try:
+            if self.barrier is not None:
+                # Passes only once every document is inside a batchUpdate
+                self.barrier.wait()
+            if document_id in self.gates:
+                self.gates[document_id].wait(5)
+            if document_id in self.failing:
+                raise self._error(503, "Backend Error")
+            return super()._batch_update(document_id, body)
+        finally:
+            with self._guard:
+                self.active[document_id] -= 1
+
+@pytest.fixture
+def gated(make_settings, state):
+    service = GatedDocsService()
+    for document_id in ('doc', 'a', 'b'):
+        service.create_document(document_id)
+    pool = WriterPool(make_settings(google_max_workers=4, pipeline_depth=3), state, service=service)
+    return service, pool
+
+def make_batch(start, count=2, channel_id=1):
+    return [MessageData(id=number, text=f"Сообщение {number}", date=datetime(2024, 1, 1), channel_id=channel_id)
+            for number in range(start, start + count)]
+
+def test_documents_are_written_concurrently(gated):
+    service, pool = gated
+    service.barrier = threading.Barrier(2, timeout=5)
+    
+    async def run():
+        writes = [await pool.submit_batch(document_id, make_batch(1)) for document_id in ('a', 'b')]
+        results = await asyncio.gather(*writes)
+        await pool.close()
+        return results
+    
+    # Each write waits at the barrier until the other document's write arrives
+    assert asyncio.run(run()) == [True, True]
+    assert service.max_active['a'] == service.max_active['b'] == 1
+    assert all("Сообщение 1\n" in service.get_text(document_id) for document_id in ('a', 'b'))
+
+def test_writes_to_one_document_stay_serialized_and_in_order(gated):
+    service, pool = gated
+    
+    async def run():
+        writes = [await pool.submit_batch('doc', make_batch(start)) for start in (1, 3, 5, 7)]
+        results = await asyncio.gather(*writes)
+        await pool.close()
+        return results
+    
+    assert asyncio.run(run()) == [True] * 4
+    assert service.max_active['doc'] == 1
+    text = service.get_text('doc')
+    positions = [text.index(f"Сообщение {number}\n") for number in range(1, 9)]
+    assert positions == sorted(positions)
+
+def test_failing_document_does_not_stall_the_others(gated, monkeypatch):
+    monkeypatch.setattr(GoogleDocsWriter.commit_batch.retry, 'wait', wait_none())
+    service, pool = gated
+    held = threading.Event()
+    service.gates['a'] = held
+    service.failing.add('a')
+    
+    async def run():
+        stuck = await pool.submit_batch('a', make_batch(1))
+        # Document b is written while a's batchUpdate hangs
+        for start in (1, 3):
+            assert await asyncio.wait_for(await pool.submit_batch('b', make_batch(start)), 2)
+        assert not stuck.done()
+        
+        held.set()
+        with pytest.raises(RetryError):
+            await stuck
+        assert await pool.write_batch('b', make_batch(5))
+        await pool.close()
+    
+    asyncio.run(run())
+    assert "Сообщение 1\n" not in service.get_text('a')
+    assert all(f"Сообщение {number}\n" in service.get_text('b') for number in range(1, 7))
+
+def test_close_releases_every_writer(gated):
+    service, pool = gated
+    
+    async def run():
+        for document_id in ('doc', 'a', 'b'):
+            assert await pool.write_batch(document_id, make_batch(1))
+        await pool.close()
+    
+    asyncio.run(run())
+    assert len(pool.actors) == 3
+    # Every writer held its document's lease file open
+    assert all(actor.writer.lease._fd is None for actor in pool.actors.values())
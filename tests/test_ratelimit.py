@@ -0,0 +1,92 @@
+"""Тесты для ограничения частоты запросов к Google Docs API на поддельных часах."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.google import ratelimit
+from src.google.fake import FakeDocsService
+from src.google.ratelimit import DocsRateLimiter, TokenBucket
+from src.google.transport import DocsTransport
+
+class FakeClock:
+    """Monotonic time that only moves when the code under test sleeps or the test advances it."""
+    
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+    
+    def monotonic(self):
+        return self.now
+    
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(ratelimit, 'asyncio', SimpleNamespace(Lock=asyncio.Lock, sleep=clock.sleep))
+    return clock
+
+class ThrottlingDocsService(FakeDocsService):
+    """Answers the first batchUpdate with 429 and a Retry-After header."""
+    
+    def __init__(self, retry_after):
+        super().__init__()
+        self.retry_after = retry_after
+    
+    def _batch_update(self, document_id, body):
+        if self.retry_after is not None:
+            retry_after, self.retry_after = self.retry_after, None
+            raise self._error(429, "Quota exceeded", {'retry-after': retry_after})
+        return super()._batch_update(document_id, body)
+
+def test_bucket_spends_its_burst_then_refills_at_the_quota_rate(clock):
+    # 600 per minute: 10 tokens per second, bursts of 60
+    bucket = TokenBucket(600)
+    
+    async def drain():
+        return [await bucket.acquire() for _ in range(60)]
+    
+    assert asyncio.run(drain()) == [0.0] * 60
+    assert clock.sleeps == []
+    
+    assert asyncio.run(bucket.acquire()) == pytest.approx(0.1)
+    assert clock.sleeps == [pytest.approx(0.1)]
+    
+    clock.now += 1.5
+    assert bucket.available() == pytest.approx(15)
+    clock.now += 60
+    assert bucket.available() == bucket.capacity == 60
+
+def test_throttled_bucket_waits_for_retry_after_and_halves_its_rate(clock):
+    bucket = TokenBucket(600)
+    bucket.penalize(retry_after=7)
+    
+    assert bucket.rate == pytest.approx(5)
+    assert bucket.available() == 0
+    assert asyncio.run(bucket.acquire()) == pytest.approx(7)
+    assert clock.sleeps == [pytest.approx(7)]
+    
+    # Successful calls win the configured rate back step by step
+    for _ in range(10):
+        bucket.reward()
+    assert bucket.rate == pytest.approx(10)
+
+def test_transport_honours_retry_after_on_429(clock):
+    service = ThrottlingDocsService(retry_after='12')
+    service.create_document('doc')
+    limiter = DocsRateLimiter(600, 600)
+    transport = DocsTransport(None, 1, service_factory=lambda: service, limiter=limiter)
+    
+    body = {'requests': [{'insertText': {'location': {'index': 1}, 'text': "Пост\n"}}]}
+    asyncio.run(transport.batch_update('doc', body))
+    transport.close()
+    
+    assert service.get_text('doc').count("Пост") == 1
+    assert clock.sleeps == [pytest.approx(12)]
+    metrics = limiter.get_metrics()[DocsRateLimiter.WRITE]
+    assert metrics['calls'] == 2 and metrics['throttled'] == 1
+    assert metrics['max_wait'] == pytest.approx(12)
@@ -0,0 +1,77 @@
+"""Тесты для записи и воспроизведения вызовов batchUpdate."""
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from click.testing import CliRunner
+
+from src.google.fake import FakeDocsService
+from src.google.recorder import BatchRecorder, read_recordings
+from src.google.replay import BatchReplayer
+from src.google.transport import DocsTransport
+from src.main import main
+from src.telegram.models import MessageData
+
+@pytest.fixture
+def recorded(tmp_path, service, make_writer):
+    """Write a few batches and an edit with recording on."""
+    recorder = BatchRecorder(tmp_path / "recordings")
+    writer = make_writer(recorder=recorder)
+    
+    async def scenario():
+        for number in range(1, 7, 2):
+            await writer.write_batch([
+                MessageData(id=id_, text=f"Пост {id_} https://example.com/{id_}", date=datetime(2024, 1, 1), channel_id=7)
+                for id_ in (number, number + 1)
+            ])
+        await writer.replace_messages(
+            [MessageData(id=2, text="Исправленный пост 2", date=datetime(2024, 1, 1), channel_id=7)], [(7, 5)]
+        )
+    
+    asyncio.run(scenario())
+    writer.close()
+    return service, recorder
+
+def test_recorder_logs_every_batch_update(tmp_path, recorded):
+    service, recorder = recorded
+    
+    records = list(read_recordings([tmp_path / "recordings"]))
+    assert len(records) == len(service.batches) == 4
+    assert all(record['status'] == 200 and record['document_id'] == 'doc' for record in records)
+    assert records[0]['end_index'] == 2
+    assert records[0]['body']['requests'][0]['insertText']['text'].startswith("\n")
+    assert records[-1]['revision_id'] == service.documents_by_id['doc'].revision_id
+    assert recorder.path.name.endswith(".jsonl.gz")
+
+def test_unfinished_recording_is_readable(tmp_path):
+    recorder = BatchRecorder(tmp_path)
+    recorder.record('doc', {'requests': []}, 0.0, 0.1)
+    # Flushed but not closed, as after a crash
+    recorder._file.flush()
+    
+    assert len(list(read_recordings([recorder.path]))) == 1
+    recorder.close()
+
+def test_replay_onto_document_with_other_content(tmp_path, recorded):
+    recorded, _ = recorded
+    service = FakeDocsService()
+    service.create_document('copy', text="Другой документ")
+    transport = DocsTransport(None, 1, service_factory=lambda: service)
+    replayer = BatchReplayer(transport, 'copy')
+    
+    metrics = asyncio.run(replayer.replay(read_recordings([tmp_path / "recordings"])))
+    transport.close()
+    
+    # Indices were moved past the existing text, edits included
+    assert metrics['calls'] == 4 and metrics['failed'] == 0 and metrics['status_mismatches'] == 0
+    assert service.get_text('copy') == "Другой документ" + recorded.get_text('doc')
+    assert replayer.deltas == {'doc': len("Другой документ")}
+
+def test_replay_command_prints_metrics(tmp_path, recorded):
+    result = CliRunner().invoke(main, ['replay', str(tmp_path / "recordings")])
+    
+    assert result.exit_code == 0, result.output
+    metrics = json.loads(result.output[result.output.index('{'):])
+    assert metrics['calls'] == 4 and metrics['failed'] == 0
+    assert metrics['latency_ms']['replayed']['p50'] is not None
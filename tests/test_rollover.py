@@ -0,0 +1,60 @@
+"""Тесты для переключения архива на новый документ."""
+import asyncio
+
+import pytest
+
+from src.google.rollover import DocumentFactory, RolloverManager
+
+class LocalDocumentFactory(DocumentFactory):
+    """Creates numbered document IDs instead of calling Drive."""
+    
+    def __init__(self):
+        self.created = []
+    
+    async def create_document(self, title, template_text):
+        document_id = f"local-{len(self.created) + 1}"
+        self.created.append((document_id, title, template_text))
+        return document_id
+
+@pytest.fixture
+def rollover_settings(make_settings):
+    """Settings that roll 'root' over after 1000 characters."""
+    def make(**overrides):
+        values = {
+            'google_doc_id': 'root',
+            'rollover_max_chars': 1000,
+            'rollover_title_template': "Archive {number}",
+            'rollover_template_text': "Continued from {previous_id}\n",
+        }
+        values.update(overrides)
+        return make_settings(**values)
+    return make
+
+def test_rollover_switches_and_persists_index(state, rollover_settings):
+    factory = LocalDocumentFactory()
+    manager = RolloverManager(rollover_settings(), state, factory)
+    
+    assert manager.active_document_id == 'root'
+    assert not manager.needs_rollover(999)
+    assert manager.needs_rollover(1000)
+    
+    new_id = asyncio.run(manager.rollover())
+    
+    assert new_id == 'local-1'
+    assert manager.active_document_id == 'local-1'
+    assert factory.created == [('local-1', "Archive 2", "Continued from root\n")]
+    
+    # A restarted process picks up the same active document
+    reloaded = RolloverManager(rollover_settings(), state, factory)
+    assert [doc['document_id'] for doc in reloaded.get_documents()] == ['root', 'local-1']
+    assert reloaded.active_document_id == 'local-1'
+
+def test_word_threshold_and_disabled_rollover(state, rollover_settings):
+    manager = RolloverManager(rollover_settings(rollover_max_chars=0, rollover_max_words=10), state, LocalDocumentFactory())
+    
+    assert manager.enabled
+    assert not manager.needs_rollover(10 ** 9, words=9)
+    assert manager.needs_rollover(None, words=10)
+    
+    disabled = RolloverManager(rollover_settings(rollover_max_chars=0), state, LocalDocumentFactory())
+    assert not disabled.enabled
@@ -0,0 +1,51 @@
+"""Тесты для скомпилированных шаблонов сообщений."""
+from datetime import datetime
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.templates import MessageShape, MessageTemplates
+from src.telegram.models import MessageData
+
+def make_templates():
+    return MessageTemplates(GoogleDocsWriter.COLORS, GoogleDocsWriter.MEDIA_EMOJIS)
+
+def test_forwarded_media_message_layout():
+    message = MessageData(
+        id=7,
+        text="Смотрите https://example.com",
+        date=datetime(2024, 5, 1, 12, 30),
+        channel_id=1,
+        channel_name="Канал",
+        forward_from_channel_name="Источник",
+        has_media=True,
+        media_type="Photo",
+        media_caption="подпись",
+        original_link="https://t.me/channel/7",
+    )
+    text, requests, end = make_templates().render(message, 10)
+    lines = text.split("\n")
+    
+    assert lines[:5] == [
+        "2024-05-01 12:30:00 | 🔄 Источник",
+        "↪️ Forwarded from: Источник",
+        "",
+        "📷 Photo: подпись",
+        "Смотрите https://example.com",
+    ]
+    assert end == 10 + len(text.encode('utf-16-le')) // 2
+    
+    header = requests[0]['updateTextStyle']
+    assert header['range'] == {'startIndex': 10, 'endIndex': 10 + len(lines[0]) + 1}
+    assert header['fields'] == 'bold,fontSize,foregroundColor'
+    urls = [r['updateTextStyle']['textStyle']['link']['url'] for r in requests if 'link' in r['updateTextStyle']['textStyle']]
+    assert urls == ["https://example.com", "https://t.me/channel/7"]
+
+def test_templates_are_compiled_once_per_shape():
+    templates = make_templates()
+    messages = [
+        MessageData(id=number, text=f"text {number}", date=datetime(2024, 1, 1), channel_id=1)
+        for number in range(5)
+    ]
+    for message in messages:
+        templates.render(message, 1)
+    
+    assert list(templates.templates) == [MessageShape.of(messages[0])]
@@ -0,0 +1,73 @@
+"""Тесты для локального отслеживания длины и ревизии документа."""
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.google.tracker import DocumentTracker
+
+def insert(service, tracker, text):
+    """Append text at the tracked end, guarded by the tracked revision, like the writer does."""
+    body = {
+        'requests': [{'insertText': {'location': {'index': tracker.insert_index}, 'text': text}}],
+        'writeControl': tracker.write_control(),
+    }
+    reply = service.documents().batchUpdate(documentId='doc', body=body).execute()
+    tracker.apply_write(reply, text)
+
+def test_sync_reads_end_index_and_revision(service):
+    service.create_document('doc', "Archive\n")
+    tracker = DocumentTracker('doc')
+    assert not tracker.is_synced
+    with pytest.raises(ValueError):
+        tracker.insert_index
+    
+    tracker.sync_from_document(service.documents().get(documentId='doc', fields=DocumentTracker.SYNC_FIELDS).execute())
+    
+    document = service.documents_by_id['doc']
+    assert tracker.end_index == document.end_index == 10
+    assert tracker.insert_index == 9
+    assert tracker.write_control() == {'requiredRevisionId': document.revision_id}
+
+def test_inserts_advance_end_index_in_utf16_units(service):
+    tracker = DocumentTracker('doc')
+    tracker.sync_from_document(service.documents().get(documentId='doc').execute())
+    start = tracker.end_index
+    
+    # Emoji outside the BMP are surrogate pairs: two units each
+    for text in ("Пост 😀\n", "🚀🚀 и ещё 👍🏽\n", "без эмодзи\n"):
+        insert(service, tracker, text)
+        document = service.documents_by_id['doc']
+        assert tracker.end_index == document.end_index
+        assert tracker.revision_id == document.revision_id
+    
+    written = "Пост 😀\n🚀🚀 и ещё 👍🏽\nбез эмодзи\n"
+    assert tracker.end_index - start == len(written) + 5
+    assert tracker.words == 8
+
+def test_stale_revision_is_rejected_until_resynced(service):
+    tracker = DocumentTracker('doc')
+    tracker.sync_from_document(service.documents().get(documentId='doc').execute())
+    service.documents().batchUpdate(documentId='doc', body={
+        'requests': [{'insertText': {'location': {'index': 1}, 'text': "Заметка 📝\n"}}]
+    }).execute()
+    
+    with pytest.raises(HttpError) as error:
+        insert(service, tracker, "Пост\n")
+    assert error.value.resp.status == 400
+    
+    tracker.invalidate()
+    assert not tracker.is_synced
+    tracker.sync_from_document(service.documents().get(documentId='doc').execute())
+    insert(service, tracker, "Пост\n")
+    assert tracker.end_index == service.documents_by_id['doc'].end_index
+    assert service.get_text('doc').startswith("Заметка 📝\nПост\n")
+
+def test_tracked_values_survive_a_restart(service, state):
+    tracker = DocumentTracker('doc', state)
+    tracker.sync_from_document(service.documents().get(documentId='doc').execute())
+    insert(service, tracker, "Пост 😀\n")
+    
+    reloaded = DocumentTracker('doc', state)
+    assert (reloaded.end_index, reloaded.revision_id, reloaded.words) == (tracker.end_index, tracker.revision_id, 2)
+    
+    reloaded.invalidate()
+    assert not DocumentTracker('doc', state).is_synced
@@ -0,0 +1,47 @@
+"""Тесты для выполнения блокирующих вызовов Google Docs API вне цикла событий."""
+import asyncio
+import threading
+
+from src.google.fake import FakeDocsService
+from src.google.transport import DocsTransport
+
+def test_slow_call_does_not_block_other_coroutines():
+    # Every call blocks its worker thread for 0.3 seconds
+    service = FakeDocsService(latency=0.3)
+    service.create_document('doc')
+    transport = DocsTransport(None, 2, service_factory=lambda: service)
+    ticks = []
+    
+    async def tick():
+        while True:
+            ticks.append(asyncio.get_running_loop().time())
+            await asyncio.sleep(0.01)
+    
+    async def run():
+        ticker = asyncio.ensure_future(tick())
+        document = await transport.get_document('doc')
+        ticker.cancel()
+        return document
+    
+    assert asyncio.run(run())['documentId'] == 'doc'
+    # The loop kept running while the call was in flight
+    assert len(ticks) >= 10
+    assert max(later - earlier for earlier, later in zip(ticks, ticks[1:])) < 0.15
+    
+    transport.close()
+
+def test_close_joins_worker_threads():
+    service = FakeDocsService(latency=0.05)
+    service.create_document('doc')
+    existing = set(threading.enumerate())
+    transport = DocsTransport(None, 2, service_factory=lambda: service)
+    
+    async def run():
+        await asyncio.gather(*(transport.get_document('doc') for _ in range(4)))
+    
+    asyncio.run(run())
+    workers = set(threading.enumerate()) - existing
+    assert workers
+    
+    transport.close()
+    assert not any(thread.is_alive() for thread in workers)
@@ -0,0 +1,92 @@
+"""Тесты для UTF-16 арифметики индексов Google Docs."""
+from datetime import datetime
+from types import SimpleNamespace
+
+from hypothesis import given, settings, strategies as st
+
+from src.google.docs_client import GoogleDocsWriter
+from src.google.templates import MessageTemplates
+from src.google.utf16 import line_spans, utf16_len, utf16_offsets
+from src.telegram.models import MessageData
+
+class LocalDocument:
+    """Local model of a Docs body: UTF-16 code units, body starting at index 1."""
+    
+    def __init__(self, text: str = ""):
+        self.units = (text + "\n").encode('utf-16-le')
+    
+    @property
+    def end_index(self) -> int:
+        return len(self.units) // 2 + 1
+    
+    def insert(self, index: int, text: str) -> None:
+        offset = (index - 1) * 2
+        self.units = self.units[:offset] + text.encode('utf-16-le') + self.units[offset:]
+    
+    def text_at(self, start: int, end: int) -> str:
+        # Strict decoding fails if a range splits a surrogate pair
+        return self.units[(start - 1) * 2:(end - 1) * 2].decode('utf-16-le')
+
+# Text with emoji, other astral characters, Cyrillic and links
+texts = st.lists(
+    st.sampled_from(list("ab ю\n.)") + ["😀", "🔗", "𝒳", "✅", " https://t.me/c/1 ", "[x](https://a.io)"]),
+    max_size=20
+).map("".join)
+
+def make_writer():
+    writer = GoogleDocsWriter.__new__(GoogleDocsWriter)
+    writer.settings = SimpleNamespace()
+    writer.templates = MessageTemplates(GoogleDocsWriter.COLORS, GoogleDocsWriter.MEDIA_EMOJIS)
+    return writer
+
+@given(st.lists(texts, max_size=8), st.integers(min_value=1, max_value=50))
+def test_line_spans_match_encoded_text(lines, start):
+    spans, end = line_spans(lines, start)
+    
+    assert end - start == utf16_len("\n".join(lines))
+    for line, (line_start, line_end) in zip(lines, spans):
+        assert line_end - line_start == len(line.encode('utf-16-le')) // 2
+
+@given(texts, st.data())
+def test_offsets_match_prefix_lengths(text, data):
+    offsets = data.draw(st.lists(st.integers(min_value=0, max_value=len(text)), max_size=5))
+    assert utf16_offsets(text, offsets) == [utf16_len(text[:offset]) for offset in offsets]
+
+@settings(max_examples=50, deadline=None)
+@given(texts, texts, st.booleans(), st.booleans())
+def test_message_ranges_cover_their_text(prefix, text, forwarded, has_media):
+    document = LocalDocument(prefix)
+    message = MessageData(
+        id=1,
+        text=text,
+        date=datetime(2024, 1, 1),
+        channel_id=1,
+        channel_name="Канал 📢",
+        forward_from_channel_name="Источник 🔄" if forwarded else None,
+        forward_original_date=datetime(2023, 1, 1) if forwarded else None,
+        has_media=has_media,
+        media_type="Photo" if has_media else None,
+        original_link="https://t.me/c/1/1",
+    )
+    writer = make_writer()
+    start = document.end_index - 1
+    start, end, formatted_text, requests = writer._create_message_segment(message, start)
+    
+    document.insert(requests[0]['insertText']['location']['index'], requests[0]['insertText']['text'])
+    assert document.end_index - 1 == end
+    
+    named_range = requests[-1]['createNamedRange']['range']
+    assert (named_range['startIndex'], named_range['endIndex']) == (start, end)
+    
+    lines = formatted_text.split("\n")
+    styles = [r for r in requests if 'updateTextStyle' in r]
+    styled = [document.text_at(r['updateTextStyle']['range']['startIndex'], r['updateTextStyle']['range']['endIndex'])
+              for r in styles]
+    assert styled[0] == lines[0]
+    assert "🔗 View in Telegram" in styled
+    for request, fragment in zip(styles, styled):
+        url = request['updateTextStyle']['textStyle'].get('link', {}).get('url', '')
+        if url.startswith("https://t.me/c/1") and fragment != "🔗 View in Telegram":
+            assert fragment == "https://t.me/c/1"
+        elif url == "https://a.io":
+            assert fragment == "[x](https://a.io)"